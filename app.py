@@ -1,59 +1,128 @@
-from flask import Flask, render_template, request, jsonify
-import re, json, os, requests
-from datetime import datetime
+from flask import Flask, render_template, request, jsonify, Response, g, stream_with_context
+import re, json, os, time, uuid
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from celery_worker import evaluate_with_llama
+from celery_worker import evaluate_with_llama, log_evaluation
 from validators import validate_medical_prompt_result
+from log_writer import get_log_writer
+from llm_client import LLMBusyError, TransientLLMError, chat_completion, iter_chat_completion
+from llm_cache import get_result_cache
+from single_flight import flight_key, get_single_flight
+from task_events import first_report, format_sse, iter_task_events
+from triage import TIER_LLM, triage_prompt
+from micro_batch import LLM_MICRO_BATCH, get_micro_batcher
+from metrics import observe_request, observe_stage, render_metrics
+from tracing import TRACEPARENT_HEADER, begin_span, finish_span, set_attribute, tracing_enabled
+from celery import states
+from log_reader import LogFilter, parse_timestamp, read_log_page, stream_log_entries
+from log_segments import iter_segmented_entries
+from scoring import regex_evaluate_prompt, batch_evaluate_prompts  # ✅ Lightweight local regex-based evaluator (fast fallback)
 
 load_dotenv()
 app = Flask(__name__)
 
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "5000"))
+LOGS_PAGE_SIZE = int(os.getenv("LOGS_PAGE_SIZE", "100"))
+LOGS_MAX_PAGE_SIZE = int(os.getenv("LOGS_MAX_PAGE_SIZE", "1000"))
+
 # ✅ Set secure content policy headers
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' https://cdn.jsdelivr.net; "
+    "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
+    "img-src 'self' data:; connect-src 'self'; "
+    "font-src 'self' https://cdn.jsdelivr.net; "
+    "object-src 'none'; frame-ancestors 'none';"
+)
+
 @app.after_request
 def apply_csp(response):
-    response.headers["Content-Security-Policy"] = (
-        "default-src 'self'; "
-        "script-src 'self' https://cdn.jsdelivr.net; "
-        "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
-        "img-src 'self' data:; connect-src 'self'; "
-        "font-src 'self' https://cdn.jsdelivr.net; "
-        "object-src 'none'; frame-ancestors 'none'; "
-    )
+    response.headers["Content-Security-Policy"] = CONTENT_SECURITY_POLICY
+    return response
+
+# ✅ Request count and latency per route for /metrics (streamed bodies are timed until the response starts)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        observe_request(request.method, route, response.status_code, time.perf_counter() - started)
     return response
 
-# ✅ Append evaluation log to local file
-def write_log_entry(prompt, model, score):
-    log_file_path = 'logs.jsonl'
+# ✅ One trace per request; Celery tasks published while it runs join the same trace.
+# The span ends at teardown, which for streamed responses is after the last chunk.
+@app.before_request
+def start_request_span():
+    if not tracing_enabled():
+        return
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    # EventSource cannot send headers, so /events also accepts ?traceparent=
+    traceparent = request.headers.get(TRACEPARENT_HEADER) or request.args.get(TRACEPARENT_HEADER)
+    g.request_span = begin_span(f"{request.method} {route}", traceparent, kind="server",
+                                **{"http.method": request.method, "http.route": route})
+    for key, value in (request.view_args or {}).items():
+        g.request_span[0].set_attribute(f"http.path.{key}", value)
+
+@app.after_request
+def add_traceparent_header(response):
+    span_token = g.get("request_span")
+    if span_token is not None:
+        span_token[0].set_attribute("http.status_code", response.status_code)
+        response.headers[TRACEPARENT_HEADER] = span_token[0].traceparent
+    return response
+
+@app.teardown_request
+def end_request_span(exc=None):
+    span_token = g.pop("request_span", None)
+    if span_token is not None:
+        finish_span(*span_token, exc=exc)
+
+# ✅ Append evaluation log to local file (buffered, written by a background thread)
+LOG_FILE_PATH = 'logs.jsonl'
+
+def write_log_entry(prompt, model, score, tier=None):
     entry = {
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "prompt": prompt,
         "model": model,
         "score": score
     }
-    with open(log_file_path, 'a', encoding='utf-8') as f:
-        f.write(json.dumps(entry) + '\n')
-
-# ✅ Lightweight local regex-based evaluator (fast fallback)
-def regex_evaluate_prompt(prompt):
-    criteria = {
-        "clinical_clarity": {"pattern": r'\b(patient|symptom|diagnosis|condition|history)\b', "weight": 0.25},
-        "specificity": {"pattern": r'\b(step-by-step|list|rank|compare|outline|guide)\b', "weight": 0.20},
-        "safety": {"pattern": r'\b(risk|contraindication|warning|side effect|precaution)\b', "weight": 0.30},
-        "instructional_style": {"pattern": r'\b(guide|steps|structured|instructions|metaphor|tip)\b', "weight": 0.15},
-        "medical_term": {"pattern": r'\b(diabetes|hypertension|cholesterol|asthma|insulin|medication)\b', "weight": 0.10},
-    }
-    results = {}
-    total = 0
-    suggestions = []
-    for key, rule in criteria.items():
-        if re.search(rule["pattern"], prompt, re.IGNORECASE):
-            results[key] = True
-            total += rule["weight"]
-        else:
-            results[key] = False
-            suggestions.append(f"Consider strengthening: {key.replace('_',' ').title()}")
-    score = round(total * 100)
-    return score, results, suggestions
+    if tier:
+        entry["tier"] = tier
+    get_log_writer(LOG_FILE_PATH).append(json.dumps(entry))
+
+# ✅ Append many evaluation logs at once (batch scoring)
+def write_log_entries(prompts, model, scores):
+    timestamp = datetime.now(timezone.utc).isoformat()
+    get_log_writer(LOG_FILE_PATH).append_many([
+        json.dumps({"timestamp": timestamp, "prompt": prompt, "model": model, "score": score})
+        for prompt, score in zip(prompts, scores)
+    ])
+
+# ✅ ?since= / ?until= accept ISO-8601 timestamps
+def parse_log_time_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        raise ValueError(f"'{name}' must be an ISO-8601 timestamp")
+    return parsed
+
+# ✅ Read prompts from a JSON body ({"prompts": [...]} or a bare list) or NDJSON lines
+def read_batch_prompts():
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+    else:
+        body = request.get_json()
+        items = body.get('prompts', []) if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise ValueError("Expected a list of prompts")
+    return [(item.get('prompt', '') if isinstance(item, dict) else item) for item in items]
 
 # === ROUTES ===
 @app.route('/')
@@ -73,12 +142,30 @@ def evaluate_prompt():
         "suggestions": suggestions
     })
 
-@app.route('/api/evaluate_llama', methods=['POST'])
-def evaluate_prompt_llama():
-    prompt = request.get_json().get('prompt', '').strip()
-    if not prompt:
-        return jsonify({"error": "Prompt is required"}), 400
+@app.route('/api/evaluate_batch', methods=['POST'])
+def evaluate_batch():
+    try:
+        items = read_batch_prompts()
+    except (ValueError, AttributeError) as e:
+        return jsonify({"error": "Invalid batch body", "details": str(e)}), 400
+    if not items:
+        return jsonify({"error": "Prompts are required"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE} prompts)"}), 413
+
+    valid = [(i, item.strip()) for i, item in enumerate(items) if isinstance(item, str) and item.strip()]
+    scored, stats = batch_evaluate_prompts([prompt for _, prompt in valid])
+    results = [{"index": i, "error": "Prompt is required"} for i in range(len(items))]
+    for (i, _), result in zip(valid, scored):
+        results[i] = {"index": i, **result}
 
+    stats["errors"] = len(items) - len(valid)
+    if valid:
+        write_log_entries([prompt for _, prompt in valid], "regex (batch)", [r["score"] for r in scored])
+    return jsonify({"results": results, "stats": stats})
+
+# ✅ Request building / response handling shared with the async routes in asgi.py
+def build_llama_evaluation_request(prompt):
     system_instruction = (
         "You are a prompt evaluator for medical prompts. "
         "Evaluate based on Safety (30), Clinical Clarity (25), Specificity (20), "
@@ -96,22 +183,44 @@ def evaluate_prompt_llama():
         "max_tokens": 512,
         "temperature": 0.2
     }
+    return payload, ollama_url
 
-    try:
-        res = requests.post(ollama_url, json=payload, timeout=60)
-        res.raise_for_status()
-        content = res.json()["choices"][0]["message"]["content"]
-        cleaned = re.sub(r'```json\s*|\s*```', '', content).strip()
+def finish_llama_evaluation(prompt, content):
+    cleaned = re.sub(r'```json\s*|\s*```', '', content).strip()
+    with observe_stage("parse"):
         result = json.loads(cleaned)
+    with observe_stage("validate"):
         is_valid, reason = validate_medical_prompt_result(result)
-        if not is_valid:
-            return jsonify({"error": "Validation failed", "reason": reason}), 400
-        score = result.get("score", 0)
-        write_log_entry(prompt, "phi3", score)
-        return jsonify(result)
+    if not is_valid:
+        return {"error": "Validation failed", "reason": reason}, 400
+    score = result.get("score", 0)
+    write_log_entry(prompt, "phi3", score)
+    return result, 200
+
+@app.route('/api/evaluate_llama', methods=['POST'])
+def evaluate_prompt_llama():
+    prompt = request.get_json().get('prompt', '').strip()
+    if not prompt:
+        return jsonify({"error": "Prompt is required"}), 400
+
+    payload, ollama_url = build_llama_evaluation_request(prompt)
+    try:
+        content = chat_completion(payload, url=ollama_url)
+        body, status = finish_llama_evaluation(prompt, content)
+        return jsonify(body), status
+    except TransientLLMError as e:
+        # Ollama is down or overloaded (or the breaker is open): tell the client to come back later
+        return jsonify({"error": "LLM unavailable", "details": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def launch_llm_evaluation(task_input, bypass_cache, task_id):
+    # With LLM_MICRO_BATCH=1 prompts are packed into evaluate_batch_with_llama calls
+    if LLM_MICRO_BATCH:
+        get_micro_batcher().submit(task_input, bypass_cache, task_id=task_id)
+    else:
+        evaluate_with_llama.apply_async((task_input,), {"bypass_cache": bypass_cache}, task_id=task_id)
+
 @app.route('/api/async_evaluate', methods=['POST'])
 def async_evaluate():
     prompt = request.get_json().get('prompt', '').strip()
@@ -124,55 +233,122 @@ def async_evaluate():
         "Instructional Style (15), Medical Terminology (10). Return only a JSON object."
     )
     task_input = f"{system_instruction}\n\nPrompt:\n{prompt}\n\nReturn JSON with score, suggestions, criteria."
-    task = evaluate_with_llama.delay(task_input)
-    return jsonify({"task_id": task.id}), 202
+    bypass_cache = bool(request.get_json().get('bypass_cache', False))
 
-@app.route('/api/task/<task_id>', methods=['GET'])
-@app.route('/api/task_status/<task_id>', methods=['GET'])
-def task_status(task_id):
+    # Cheap screens first: obvious rejections and strong regex scores never reach the model.
+    # The result is stored under a fresh task id so polling/SSE clients see it like any other task.
+    tier, result = triage_prompt(prompt)
+    set_attribute("triage.tier", tier)
+    if tier != TIER_LLM:
+        task_id = str(uuid.uuid4())
+        evaluate_with_llama.backend.store_result(task_id, result, states.SUCCESS)
+        log_evaluation(task_input, result, model=f"triage:{tier}")
+        return jsonify({"task_id": task_id, "tier": tier}), 202
+
+    # Identical prompts already in flight share one task instead of hitting Ollama again
+    task_id, attached = get_single_flight().submit(
+        flight_key(task_input, bypass_cache),
+        launch=lambda new_id: launch_llm_evaluation(task_input, bypass_cache, new_id),
+        is_pending=lambda existing_id: evaluate_with_llama.AsyncResult(existing_id).state not in states.READY_STATES,
+    )
+    set_attribute("task.id", task_id)
+    body = {"task_id": task_id, "tier": TIER_LLM}
+    if attached:
+        body["deduplicated"] = True
+    return jsonify(body), 202
+
+def task_status_payload(task_id):
+    """(state, body, http_status) for a task, shared by the polling and SSE endpoints."""
     async_result = evaluate_with_llama.AsyncResult(task_id)
     state = async_result.state
 
     if state == 'PENDING':
-        return jsonify({"status": "pending"}), 202
+        return state, {"status": "pending"}, 202
     if state == 'SUCCESS':
         result = async_result.result
         if isinstance(result, list) and result and isinstance(result[0], dict):
             result = result[0]
         if isinstance(result, dict) and ("error" in result or "reason" in result):
-            return jsonify({"status": "failed", **result}), 422
+            return state, {"status": "failed", **result}, 422
         if not isinstance(result, dict):
-            return jsonify({"status": "error", "error": "Unexpected result format"}), 500
-        prompt = result.get("prompt", "[async prompt not returned]")
-        score = result.get("score", 0)
-        write_log_entry(prompt, "phi3 (async)", score)
-        return jsonify({"status": "completed", "result": result}), 200
+            return state, {"status": "error", "error": "Unexpected result format"}, 500
+        # Polling and SSE read the same result many times; the history gets one row per task
+        if first_report(task_id):
+            prompt = result.get("prompt", "[async prompt not returned]")
+            write_log_entry(prompt, "phi3 (async)", result.get("score", 0), result.get("tier"))
+        return state, {"status": "completed", "result": result}, 200
     if state == 'FAILURE':
-        return jsonify({"status": "failed", "error": str(async_result.info)}), 500
+        return state, {"status": "failed", "error": str(async_result.info)}, 500
+
+    return state, {"status": state}, 200
+
+@app.route('/api/task/<task_id>', methods=['GET'])
+@app.route('/api/task_status/<task_id>', methods=['GET'])
+def task_status(task_id):
+    _, body, status = task_status_payload(task_id)
+    return jsonify(body), status
+
+# ✅ Push task state changes over Server-Sent Events instead of client polling
+@app.route('/api/task/<task_id>/events', methods=['GET'])
+def task_events(task_id):
+    events = iter_task_events(task_id, lambda: task_status_payload(task_id))
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
 
-    return jsonify({"status": state}), 200
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    try:
+        return jsonify(get_result_cache().stats())
+    except Exception as e:
+        return jsonify({"error": "Cache unavailable", "details": str(e)}), 503
 
 @app.route('/logs', methods=['GET'])
 def get_logs():
     try:
-        with open('logs.jsonl', 'r', encoding='utf-8') as f:
-            logs = [json.loads(line) for line in f if line.strip()]
-        return jsonify(logs)
+        after = int(request.args.get('after', 0))
+        limit = request.args.get('limit', type=int)
+        log_filter = LogFilter(
+            model=request.args.get('model') or None,
+            min_score=request.args.get('min_score', type=float),
+            max_score=request.args.get('max_score', type=float),
+            since=parse_log_time_arg('since'),
+            until=parse_log_time_arg('until'),
+        )
+    except ValueError as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "Invalid query parameters", "details": "limit must be positive"}), 400
+
+    try:
+        get_log_writer(LOG_FILE_PATH).flush(timeout=2)
+        if request.args.get('format') == 'ndjson':
+            entries = stream_log_entries(LOG_FILE_PATH, after, limit, log_filter, source=iter_segmented_entries)
+            body = stream_with_context(json.dumps(entry) + '\n' for entry in entries)
+            return Response(body, mimetype='application/x-ndjson')
+
+        limit = min(limit or LOGS_PAGE_SIZE, LOGS_MAX_PAGE_SIZE)
+        logs, cursor, has_more = read_log_page(LOG_FILE_PATH, after, limit, log_filter, source=iter_segmented_entries)
+        response = jsonify(logs)
+        response.headers['X-Next-Cursor'] = str(cursor)
+        response.headers['X-Has-More'] = 'true' if has_more else 'false'
+        return response
     except Exception as e:
         return jsonify({"error": "Failed to read logs", "details": str(e)}), 500
 
-@app.route('/api/improve_prompt', methods=['POST'])
-def improve_prompt():
-    prompt = request.get_json().get("prompt", "").strip()
-    if not prompt:
-        return jsonify({"error": "Prompt is required."}), 400
-
+def build_improve_request(prompt):
     system_instruction = (
         "You are a clinical prompt editor. Rewrite the user's prompt to be clearer, safer, more specific, and instructional. "
         "Do not explain. Return ONLY the improved prompt, nothing else."
     )
 
-    payload = {
+    return {
         "model": "llama3:8b-instruct-q4_K_M",
         "messages": [
             {"role": "system", "content": system_instruction},
@@ -182,14 +358,50 @@ def improve_prompt():
         "temperature": 0.3
     }
 
+@app.route('/api/improve_prompt', methods=['POST'])
+def improve_prompt():
+    prompt = request.get_json().get("prompt", "").strip()
+    if not prompt:
+        return jsonify({"error": "Prompt is required."}), 400
+
+    payload = build_improve_request(prompt)
     try:
-        res = requests.post("http://localhost:11434/v1/chat/completions", json=payload, timeout=60)
-        res.raise_for_status()
-        content = res.json()['choices'][0]['message']['content'].strip()
+        content = chat_completion(payload).strip()
         return jsonify({"improved": content})
+    except LLMBusyError as e:
+        return jsonify({"improved": prompt, "error": "LLM busy", "details": str(e)}), 503
     except Exception:
         return jsonify({"improved": prompt, "error": "LLM failed"}), 200
 
+# ✅ Streamed variant: forwards Ollama's tokens as SSE `token` events, then one `done` event
+def iter_improve_events(prompt, deltas):
+    parts = []
+    try:
+        for delta in deltas:
+            parts.append(delta)
+            yield format_sse({"text": delta}, "token")
+        yield format_sse({"improved": "".join(parts).strip()}, "done")
+    except LLMBusyError as e:
+        yield format_sse({"improved": prompt, "error": "LLM busy", "details": str(e), "http_status": 503}, "error")
+    except Exception:
+        yield format_sse({"improved": prompt, "error": "LLM failed"}, "error")
+    finally:
+        deltas.close()
+
+@app.route('/api/improve_prompt/stream', methods=['POST'])
+def improve_prompt_stream():
+    prompt = request.get_json().get("prompt", "").strip()
+    if not prompt:
+        return jsonify({"error": "Prompt is required."}), 400
+
+    # When the client goes away the server closes this generator, which closes the
+    # upstream response and stops the generation in Ollama
+    deltas = iter_chat_completion(build_improve_request(prompt))
+    return Response(stream_with_context(iter_improve_events(prompt, deltas)), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
 # ✅ FINAL: disable debug mode before launch
 if __name__ == '__main__':
     app.run(debug=False, host='0.0.0.0', port=5000)
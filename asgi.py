@@ -0,0 +1,277 @@
+"""
+ASGI entry point: serves the Ollama-bound routes asynchronously and everything else through Flask.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+`/api/evaluate_llama`, `/api/improve_prompt` and `/api/improve_prompt/stream` await the model
+through a shared `httpx.AsyncClient`, so one process can hold hundreds of in-flight generations
+(bounded by OLLAMA_MAX_INFLIGHT) while cheap routes like `/api/evaluate` keep being served.
+`/api/task/<task_id>/events` streams from async Redis pub/sub, so open streams hold no thread.
+Flask routes run on a pool of ASGI_WSGI_THREADS threads, so a slow one does not hold up the rest.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import re
+import time
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from app import (
+    CONTENT_SECURITY_POLICY,
+    app as flask_app,
+    build_improve_request,
+    build_llama_evaluation_request,
+    finish_llama_evaluation,
+    task_status_payload,
+)
+from metrics import observe_request
+from tracing import TRACEPARENT_HEADER, begin_span, finish_span, tracing_enabled
+from llm_client import TransientLLMError, aclose_async_client, async_chat_completion, async_iter_chat_completion
+from task_events import aclose_async_redis, aiter_task_events, format_sse
+
+# ✅ Threads for the Flask (WSGI) routes, overridable from .env
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))
+
+wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix="asgi-wsgi")
+
+
+class _PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs the WSGI call thread-sensitively, i.e. every request on one shared thread
+    async def run_wsgi_app(self, body):
+        run = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that serves requests concurrently on `executor` instead of a single thread."""
+
+    def __init__(self, wsgi_application, executor, duplicate_header_limit=100):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        instance = _PooledWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)
+        instance.executor = self.executor
+        await instance(scope, receive, send)
+
+
+wsgi_application = PooledWsgiToAsgi(flask_app, wsgi_executor)
+
+
+async def _read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"null")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _send_json(send, body, status=200):
+    payload = flask_app.json.dumps(body, separators=(",", ":")).encode("utf-8") + b"\n"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            (b"content-security-policy", CONTENT_SECURITY_POLICY.encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def evaluate_prompt_llama(scope, receive, send):
+    data = await _read_json(receive)
+    if data is None:
+        return await _send_json(send, {"error": "Invalid JSON body"}, 400)
+    prompt = str(data.get('prompt', '')).strip()
+    if not prompt:
+        return await _send_json(send, {"error": "Prompt is required"}, 400)
+
+    payload, ollama_url = build_llama_evaluation_request(prompt)
+    try:
+        content = await async_chat_completion(payload, url=ollama_url)
+        body, status = finish_llama_evaluation(prompt, content)
+        await _send_json(send, body, status)
+    except TransientLLMError as e:
+        await _send_json(send, {"error": "LLM unavailable", "details": str(e)}, 503)
+    except Exception as e:
+        await _send_json(send, {"error": str(e)}, 500)
+
+
+async def improve_prompt(scope, receive, send):
+    data = await _read_json(receive)
+    if data is None:
+        return await _send_json(send, {"error": "Invalid JSON body"}, 400)
+    prompt = str(data.get("prompt", "")).strip()
+    if not prompt:
+        return await _send_json(send, {"error": "Prompt is required."}, 400)
+
+    payload = build_improve_request(prompt)
+    try:
+        content = (await async_chat_completion(payload)).strip()
+        await _send_json(send, {"improved": content})
+    except Exception:
+        await _send_json(send, {"improved": prompt, "error": "LLM failed"})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def improve_prompt_stream(scope, receive, send):
+    data = await _read_json(receive)
+    if data is None:
+        return await _send_json(send, {"error": "Invalid JSON body"}, 400)
+    prompt = str(data.get("prompt", "")).strip()
+    if not prompt:
+        return await _send_json(send, {"error": "Prompt is required."}, 400)
+
+    payload = build_improve_request(prompt)
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            (b"content-security-policy", CONTENT_SECURITY_POLICY.encode()),
+        ],
+    })
+
+    async def relay():
+        parts = []
+        try:
+            async for delta in async_iter_chat_completion(payload):
+                parts.append(delta)
+                await send({"type": "http.response.body", "body": format_sse({"text": delta}, "token").encode(), "more_body": True})
+            frame = format_sse({"improved": "".join(parts).strip()}, "done")
+        except Exception:
+            frame = format_sse({"improved": prompt, "error": "LLM failed"}, "error")
+        await send({"type": "http.response.body", "body": frame.encode()})
+
+    # Cancelling the relay closes the upstream stream, so Ollama stops as soon as the browser leaves
+    relay_task = asyncio.ensure_future(relay())
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    await asyncio.wait({relay_task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    for task in (relay_task, disconnect):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def task_events(scope, receive, send, task_id):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            (b"content-security-policy", CONTENT_SECURITY_POLICY.encode()),
+        ],
+    })
+    loop = asyncio.get_running_loop()
+
+    async def snapshot():
+        # The result backend client is blocking, so read it on the WSGI pool
+        return await loop.run_in_executor(wsgi_executor, task_status_payload, task_id)
+
+    async def relay():
+        async for frame in aiter_task_events(task_id, snapshot):
+            await send({"type": "http.response.body", "body": frame.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    relay_task = asyncio.ensure_future(relay())
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    await asyncio.wait({relay_task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    for task in (relay_task, disconnect):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+ASYNC_ROUTES = {
+    "/api/evaluate_llama": evaluate_prompt_llama,
+    "/api/improve_prompt": improve_prompt,
+    "/api/improve_prompt/stream": improve_prompt_stream,
+}
+
+# GET routes with a path parameter: (pattern, route label as Flask names it, handler)
+ASYNC_GET_ROUTES = [
+    (re.compile(r"/api/task/([^/]+)/events"), "/api/task/<task_id>/events", task_events),
+]
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aclose_async_client()
+            await aclose_async_redis()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _observed(handler, scope, receive, send, route=None):
+    # Flask's hooks time the WSGI routes; these bypass Flask, so time them here
+    route = route or scope["path"]
+    started = time.perf_counter()
+    status = 500
+    span_token = None
+    if tracing_enabled():
+        headers = dict(scope.get("headers") or [])
+        traceparent = headers.get(TRACEPARENT_HEADER.encode(), b"").decode("latin-1") or None
+        if traceparent is None:
+            # EventSource cannot send headers, so /events also accepts ?traceparent=
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            traceparent = (query.get(TRACEPARENT_HEADER) or [None])[0]
+        span_token = begin_span(f"{scope['method']} {route}", traceparent, kind="server",
+                                **{"http.method": scope["method"], "http.route": route})
+
+    async def send_and_record(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            if span_token is not None:
+                message = dict(message, headers=[*message.get("headers", []),
+                                                 (TRACEPARENT_HEADER.encode(), span_token[0].traceparent.encode())])
+        await send(message)
+
+    try:
+        await handler(scope, receive, send_and_record)
+    finally:
+        observe_request(scope["method"], route, status, time.perf_counter() - started)
+        if span_token is not None:
+            span_token[0].set_attribute("http.status_code", status)
+            finish_span(*span_token)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    handler = ASYNC_ROUTES.get(scope.get("path")) if scope["type"] == "http" and scope["method"] == "POST" else None
+    if handler is not None:
+        return await _observed(handler, scope, receive, send)
+    if scope["type"] == "http" and scope["method"] == "GET":
+        for pattern, route, handler in ASYNC_GET_ROUTES:
+            match = pattern.fullmatch(scope["path"])
+            if match:
+                async def bound(scope, receive, send, handler=handler, args=match.groups()):
+                    await handler(scope, receive, send, *args)
+                return await _observed(bound, scope, receive, send, route)
+    return await wsgi_application(scope, receive, send)
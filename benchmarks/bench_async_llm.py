@@ -0,0 +1,96 @@
+"""
+Sync (WSGI thread pool) vs async (ASGI) throughput of /api/evaluate_llama against the stub Ollama server.
+
+    python benchmarks/bench_async_llm.py --requests 400 --latency 0.5 --workers 8
+
+The sync path runs the Flask route on `--workers` threads, like a threaded WSGI worker;
+the async path drives asgi.application directly on one event loop.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_ollama import StubOllama  # noqa: E402
+
+PROMPT = "Outline first-line management steps for a 58-year-old patient with newly diagnosed hypertension and type 2 diabetes."
+
+
+def summarize(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{name:<6} {len(latencies)} req in {elapsed:6.2f}s  {len(latencies) / elapsed:8.1f} req/s  "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms")
+    return {"requests": len(latencies), "elapsed_s": elapsed, "throughput_rps": len(latencies) / elapsed,
+            "p50_ms": statistics.median(latencies) * 1000, "p95_ms": p95 * 1000}
+
+
+def run_sync(n, workers):
+    from app import app
+    client = app.test_client()
+
+    def one(_):
+        start = time.perf_counter()
+        res = client.post("/api/evaluate_llama", json={"prompt": PROMPT})
+        assert res.status_code == 200, res.get_json()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(one, range(n)))
+    return summarize("sync", latencies, time.perf_counter() - start)
+
+
+def run_async(n):
+    from asgi import application
+    body = json.dumps({"prompt": PROMPT}).encode()
+
+    async def one():
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        start = time.perf_counter()
+        scope = {"type": "http", "method": "POST", "path": "/api/evaluate_llama", "headers": []}
+        await application(scope, receive, send)
+        assert messages[0]["status"] == 200, messages
+        return time.perf_counter() - start
+
+    async def main():
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(n)))
+        return summarize("async", latencies, time.perf_counter() - start)
+
+    return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub seconds per generation")
+    parser.add_argument("--workers", type=int, default=8, help="threads for the sync path")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    base_url = StubOllama(latency=args.latency, port=0).start_in_thread()
+    os.environ["OLLAMA_ENDPOINT"] = os.environ["OLLAMA_CHAT_URL"] = base_url + "/v1/chat/completions"
+    os.chdir(tempfile.mkdtemp(prefix="bench_async_llm_"))  # keep benchmark log lines out of the repo
+
+    results = {"sync": run_sync(args.requests, args.workers), "async": run_async(args.requests)}
+    print(f"speedup: {results['async']['throughput_rps'] / results['sync']['throughput_rps']:.1f}x")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
@@ -0,0 +1,82 @@
+"""
+Single-pass extractor vs the legacy clean/repair/auto-close + json5 chain over a corpus of model outputs.
+
+    python benchmarks/bench_json_extract.py --rounds 200
+
+The corpus (`benchmarks/data/llm_outputs.jsonl`) holds one `{"name", "output"}` object per line:
+fenced, triple-quoted, truncated, comma-less and chatty variants of the rubric JSON. It is
+synthetic: written by hand from the shapes the old repair helpers target, not captured from
+Ollama, so the timings show relative cost rather than production numbers.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import json5  # noqa: E402
+
+from json_extract import auto_close_json, clean_llm_output, parse_llm_json, repair_llm_json  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "llm_outputs.jsonl")
+
+
+def legacy_parse(text):
+    return json5.loads(auto_close_json(repair_llm_json(clean_llm_output(text))))
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def attempt(parse, text):
+    try:
+        return parse(text)
+    except Exception:
+        return None
+
+
+def time_parser(parse, outputs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in outputs:
+            attempt(parse, text)
+    return (time.perf_counter() - start) / (rounds * len(outputs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    outputs = [sample["output"] for sample in corpus]
+
+    print(f"{'sample':<20} {'legacy':>8} {'new':>8}  agree")
+    recovered = {"legacy": 0, "new": 0}
+    for sample in corpus:
+        old, new = attempt(legacy_parse, sample["output"]), attempt(parse_llm_json, sample["output"])
+        recovered["legacy"] += old is not None
+        recovered["new"] += new is not None
+        print(f"{sample['name']:<20} {'ok' if old is not None else 'fail':>8} {'ok' if new is not None else 'fail':>8}  "
+              f"{'yes' if old == new else '-'}")
+
+    legacy_s = time_parser(legacy_parse, outputs, args.rounds)
+    new_s = time_parser(parse_llm_json, outputs, args.rounds)
+    print(f"\nlegacy {legacy_s * 1e6:8.1f} us/output  parsed {recovered['legacy']}/{len(corpus)}")
+    print(f"new    {new_s * 1e6:8.1f} us/output  parsed {recovered['new']}/{len(corpus)}  ({legacy_s / new_s:.1f}x)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"samples": len(corpus), "legacy_us": legacy_s * 1e6, "new_us": new_s * 1e6,
+                       "parsed": recovered}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
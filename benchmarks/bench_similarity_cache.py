@@ -0,0 +1,120 @@
+"""
+Near-duplicate index (similarity_cache) at scale: insert rate, lookup latency, match rates, save/load time.
+
+    python benchmarks/bench_similarity_cache.py --entries 200000 --queries 2000
+
+Prompts are generated from a clinical vocabulary. Lookups are split between reformatted copies
+(case/punctuation/spacing, should match), one-word edits (match depends on SIMILARITY_THRESHOLD)
+and fresh prompts (should not match).
+
+Measured at 200k entries with the defaults: lookups take about 0.2 ms p50 and 0.5 ms p99.
+Reformatted copies match 100% of the time and one-word edits about 68%. About 1% of fresh
+prompts also match, because the generator produces template-alike prompts that differ only in
+details such as the age. That is the false-match cost of SIMILARITY_THRESHOLD=0.9.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from similarity_cache import SimilarityIndex  # noqa: E402
+
+VERBS = ["Outline", "Summarize", "Explain", "List", "Compare", "Describe", "Recommend", "Review"]
+TOPICS = ["first-line management", "diagnostic workup", "dosing considerations", "red-flag symptoms",
+          "follow-up schedule", "differential diagnosis", "contraindications", "monitoring plan"]
+CONDITIONS = ["hypertension", "type 2 diabetes", "community-acquired pneumonia", "atrial fibrillation",
+              "chronic kidney disease", "asthma exacerbation", "major depressive disorder", "heart failure",
+              "iron deficiency anemia", "migraine", "COPD", "hypothyroidism", "sepsis", "gout", "cellulitis"]
+PATIENTS = ["adult", "elderly patient", "pregnant patient", "child", "adolescent", "patient on warfarin",
+            "patient with penicillin allergy", "post-operative patient"]
+EXTRAS = ["in primary care", "in the emergency department", "for a nursing handout", "with guideline references",
+          "in under 200 words", "as a numbered checklist", "for a medical student", "including drug interactions"]
+
+
+def make_prompt(rng):
+    return (f"{rng.choice(VERBS)} the {rng.choice(TOPICS)} for a {rng.randint(18, 90)}-year-old "
+            f"{rng.choice(PATIENTS)} with {rng.choice(CONDITIONS)} and {rng.choice(CONDITIONS)} "
+            f"{rng.choice(EXTRAS)}, case {rng.randint(0, 10 ** 6)}.")
+
+
+def reformat(prompt, rng):
+    words = prompt.upper().replace(",", " ,").split()
+    return "  ".join(words).rstrip(".") + rng.choice(["?", "!!", " ..."])
+
+
+def one_word_edit(prompt, rng):
+    words = prompt.split()
+    words.insert(rng.randrange(len(words)), rng.choice(["please", "briefly", "clearly", "kindly"]))
+    return " ".join(words)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def time_queries(index, prompts):
+    latencies, hits = [], 0
+    for prompt in prompts:
+        start = time.perf_counter()
+        matches = index.query(prompt)
+        latencies.append(time.perf_counter() - start)
+        hits += bool(matches)
+    return {"hit_rate": hits / len(prompts), "p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = SimilarityIndex(max_entries=args.entries)
+    prompts = [make_prompt(rng) for _ in range(args.entries)]
+
+    start = time.perf_counter()
+    for i, prompt in enumerate(prompts):
+        index.add(prompt, f"key-{i}")
+    insert_s = time.perf_counter() - start
+    results = {"entries": len(index), "insert_per_s": args.entries / insert_s}
+    print(f"inserted {len(index)} entries in {insert_s:.1f}s ({results['insert_per_s']:.0f}/s)")
+
+    sample = rng.sample(prompts, min(args.queries, len(prompts)))
+    for name, queries in [("reformatted", [reformat(p, rng) for p in sample]),
+                          ("one_word", [one_word_edit(p, rng) for p in sample]),
+                          ("fresh", [make_prompt(rng) for _ in sample])]:
+        results[name] = time_queries(index, queries)
+        print(f"{name:<12} hit rate {results[name]['hit_rate']:6.1%}  "
+              f"p50 {results[name]['p50_ms']:.3f} ms  p99 {results[name]['p99_ms']:.3f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "similarity_index.npz")
+        start = time.perf_counter()
+        index.save(path)
+        results["save_s"] = time.perf_counter() - start
+        results["file_mb"] = os.path.getsize(path) / 1e6
+        restored = SimilarityIndex(max_entries=args.entries)
+        start = time.perf_counter()
+        restored.load(path)
+        results["load_s"] = time.perf_counter() - start
+    print(f"save {results['save_s']:.2f}s ({results['file_mb']:.0f} MB), load {results['load_s']:.2f}s, "
+          f"{len(restored)} entries restored")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Compiled rubric validator vs the previous hand-written one: agreement and per-call cost.
+
+    python benchmarks/bench_validators.py --rounds 20000
+
+Every case is validated by both implementations on separate copies; results and the in-place
+criterion normalization must match exactly.
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from validators import validate_medical_prompt_result, validate_medical_prompt_results  # noqa: E402
+
+VALID = {
+    "score": 78,
+    "criteria": {"safety": 25, "clinical_clarity": 20, "specificity": 15, "instructional_style": 10,
+                 "medical_terminology": 8},
+    "suggestions": ["Specify the patient's age and comorbidities.", "State the desired output format.",
+                    "Mention current medications."],
+}
+
+
+def variant(**changes):
+    result = copy.deepcopy(VALID)
+    for key, value in changes.items():
+        if key.startswith("c_"):
+            result["criteria"][key[2:]] = value
+        elif value is KeyError:
+            del result[key]
+        else:
+            result[key] = value
+    return result
+
+
+CASES = {
+    "valid": VALID,
+    "valid_string_scores": variant(c_safety="25", c_specificity=15.7, score="78"),
+    "off_by_one_score": variant(score=79),
+    "not_relevant": {"error": "Prompt is not medically relevant."},
+    "unknown_error": {"error": "Something else"},
+    "not_a_dict": ["score", 10],
+    "missing_criteria": variant(criteria=KeyError),
+    "criteria_not_dict": variant(criteria=[1, 2, 3]),
+    "missing_criterion": {**VALID, "criteria": {k: v for k, v in VALID["criteria"].items() if k != "specificity"}},
+    "criterion_too_high": variant(c_safety=31),
+    "criterion_negative": variant(c_medical_terminology=-1.5),
+    "criterion_not_number": variant(c_clinical_clarity="high"),
+    "criterion_none": variant(c_safety=None),
+    "criterion_bool": variant(c_safety=True, score=54),
+    "score_not_int": variant(score="seventy"),
+    "score_mismatch": variant(score=60),
+    "suggestions_not_list": variant(suggestions="add detail"),
+    "suggestions_empty": variant(suggestions=[]),
+    "suggestion_blank": variant(suggestions=["Add detail.", "   ", "More."]),
+    "suggestion_not_str": variant(suggestions=["Add detail.", 3]),
+}
+
+
+# The hand-written validator this module's compiled one replaced, kept for comparison
+def legacy_validate(parsed, tolerance=1):
+    """
+    Validates LLM evaluation output for correct structure, types, and scoring.
+    Returns (True, "") if valid, (False, "reason") if not.
+    Accepts structured scores OR error objects.
+    """
+
+    # 1. Top-level type check
+    if not isinstance(parsed, dict):
+        return False, "Result is not a valid JSON object."
+
+    # 2. Accept error-based rejections
+    if "error" in parsed:
+        allowed_errors = {
+            "Prompt is not medically relevant.",
+            "Prompt blocked due to safety concerns.",
+        }
+        if parsed.get("error") in allowed_errors:
+            return True, ""
+        return False, f"Unrecognized error message: {parsed.get('error')}"
+
+    # 3. Must have all 3 required keys for evaluation result
+    for key in ("score", "criteria", "suggestions"):
+        if key not in parsed:
+            return False, f"Missing top-level field: '{key}'."
+
+    # 4. Criteria type and structure
+    criteria = parsed.get("criteria")
+    if not isinstance(criteria, dict):
+        return False, "Field 'criteria' must be a dict."
+
+    expected = {
+        "safety": 30,
+        "clinical_clarity": 25,
+        "specificity": 20,
+        "instructional_style": 15,
+        "medical_terminology": 10,
+    }
+    total = 0
+    for name, max_val in expected.items():
+        if name not in criteria:
+            return False, f"Missing criterion: '{name}'."
+        val = criteria.get(name)
+        try:
+            val = int(float(val))
+        except (TypeError, ValueError):
+            return False, f"Invalid score for '{name}': {val} (must be 0–{max_val})."
+        if not (0 <= val <= max_val):
+            return False, f"Invalid score for '{name}': {val} (must be 0–{max_val})."
+        criteria[name] = val
+        total += val
+
+    # 5. Score validation
+    score = parsed.get("score")
+    try:
+        score = int(score)
+    except (TypeError, ValueError):
+        return False, "Field 'score' must be an integer."
+    if abs(score - total) > tolerance:
+        return False, f"Reported score {score} does not match sum {total} (tolerance {tolerance})."
+
+    # 6. Suggestions
+    suggestions = parsed.get("suggestions")
+    if not isinstance(suggestions, list):
+        return False, "Field 'suggestions' must be a list."
+    if not suggestions:
+        return False, "Suggestions list cannot be empty."
+    for idx, s in enumerate(suggestions):
+        if not (isinstance(s, str) and s.strip()):
+            return False, f"Suggestion at index {idx} must be a non-empty string."
+
+    return True, ""
+
+
+def time_calls(validate, result, rounds):
+    copies = [copy.deepcopy(result) for _ in range(rounds)]
+    start = time.perf_counter()
+    for item in copies:
+        validate(item)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'case':<22} {'legacy':>9} {'compiled':>9}  agree")
+    for name, case in CASES.items():
+        old_input, new_input = copy.deepcopy(case), copy.deepcopy(case)
+        agree = legacy_validate(old_input) == validate_medical_prompt_result(new_input) and old_input == new_input
+        legacy_s = time_calls(legacy_validate, case, args.rounds)
+        compiled_s = time_calls(validate_medical_prompt_result, case, args.rounds)
+        results[name] = {"legacy_us": legacy_s * 1e6, "compiled_us": compiled_s * 1e6, "agree": agree}
+        print(f"{name:<22} {legacy_s * 1e6:7.2f}us {compiled_s * 1e6:7.2f}us  {'yes' if agree else 'NO'}")
+
+    batch = [copy.deepcopy(case) for case in CASES.values() for _ in range(args.rounds // len(CASES) or 1)]
+    start = time.perf_counter()
+    validate_medical_prompt_results(batch)
+    results["batch_us_per_result"] = (time.perf_counter() - start) / len(batch) * 1e6
+    print(f"batch of {len(batch)}: {results['batch_us_per_result']:.2f}us per result")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if not all(r["agree"] for r in results.values() if isinstance(r, dict)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Celery worker throughput as a function of concurrency against the stub Ollama server.
+
+    python benchmarks/bench_worker_concurrency.py --tasks 64 --latency 0.25 --parallel 4 --concurrency 1 2 4 8 16
+
+Each level runs `evaluate_with_llama` bodies on a thread pool of that size, which is what
+`celery worker --pool=threads --concurrency=N` does with them (N=1 matches the old `--pool=solo`).
+The stub serves `--parallel` generations at once, like Ollama with OLLAMA_NUM_PARALLEL.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_ollama import StubOllama  # noqa: E402
+
+TASK_INPUT = (
+    "You are a prompt evaluator for medical prompts.\n\nPrompt:\n"
+    "Outline first-line management steps for a 58-year-old patient with newly diagnosed hypertension "
+    "and type 2 diabetes.\n\nReturn JSON with score, suggestions, criteria."
+)
+
+
+def run_level(concurrency, tasks):
+    from celery_worker import run_llama_evaluation
+
+    def one(_):
+        start = time.perf_counter()
+        result = run_llama_evaluation(TASK_INPUT)
+        assert "score" in result and "error" not in result, result
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one, range(tasks)))
+    elapsed = time.perf_counter() - start
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"concurrency {concurrency:>3}: {tasks} tasks in {elapsed:6.2f}s  {tasks / elapsed:7.2f} tasks/s  "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms")
+    return {"concurrency": concurrency, "elapsed_s": elapsed, "throughput_tps": tasks / elapsed,
+            "p50_ms": statistics.median(latencies) * 1000, "p95_ms": p95 * 1000}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.25, help="stub seconds per generation")
+    parser.add_argument("--parallel", type=int, default=4, help="generations the stub serves at once")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    base_url = StubOllama(latency=args.latency, port=0, parallel=args.parallel).start_in_thread()
+    os.environ["OLLAMA_CHAT_URL"] = base_url + "/v1/chat/completions"
+    # Let the client-side limit follow the level under test; the stub enforces the model's slots
+    os.environ["OLLAMA_NUM_PARALLEL"] = str(max(args.concurrency))
+    os.environ.setdefault("OLLAMA_POOL_SIZE", str(max(args.concurrency)))
+    os.environ.setdefault("OLLAMA_STREAM", "0")
+    os.environ.setdefault("LLM_CACHE_BACKEND", "off")
+    os.chdir(tempfile.mkdtemp(prefix="bench_worker_concurrency_"))  # keep benchmark log lines out of the repo
+
+    results = [run_level(level, args.tasks) for level in args.concurrency]
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
@@ -0,0 +1,324 @@
+"""
+Load test: replays prompts_sets/*.json against /api/evaluate, /api/async_evaluate and /api/evaluate_llama.
+
+    python benchmarks/load_test.py --concurrency 16 --requests 500 --output results.json
+    python benchmarks/load_test.py --rate 40 --requests 1000 --latency 0.3 --distribution lognormal --jitter 0.5
+    python benchmarks/load_test.py --compare baseline.json --max-regression 10
+
+By default everything runs in this process and nothing outside it is needed:
+- the stub Ollama server (benchmarks/stub_ollama.py), with the chosen latency, output mix and failure rate;
+- the Flask app on a threaded WSGI server;
+- a Celery worker on an in-memory broker, for /api/async_evaluate.
+Pass `--base-url http://host:port` to load an already running deployment instead.
+
+Each endpoint is loaded on its own, either closed-loop (`--concurrency` clients sending back
+to back) or open-loop (`--rate` requests/s, fixed or Poisson arrivals). In open-loop mode latency
+is measured from the scheduled send time, so a backed-up server is not hidden by late sends.
+/api/async_evaluate latency runs from submit until /api/task/<id> returns a final status.
+
+The report has throughput, p50/p95/p99 latency and error rates per endpoint. 4xx responses
+(e.g. rejected prompts) are counted as "rejected", while 5xx responses and transport failures
+count as errors. With `--output` the report is written as JSON, and `--compare` diffs it against
+an earlier one.
+"""
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_ollama import DISTRIBUTIONS, StubOllama  # noqa: E402
+
+ENDPOINTS = {
+    "evaluate": "/api/evaluate",
+    "async_evaluate": "/api/async_evaluate",
+    "evaluate_llama": "/api/evaluate_llama",
+}
+DEFAULT_PROMPTS = os.path.join(ROOT, "prompts_sets", "*.json")
+
+
+def load_prompts(patterns):
+    prompts = []
+    for path in sorted({p for pattern in patterns for p in glob.glob(pattern)}):
+        with open(path, encoding="utf-8") as f:
+            items = json.load(f)
+        for item in items:
+            prompt = item.get("prompt", "") if isinstance(item, dict) else str(item)
+            if prompt.strip():
+                prompts.append(prompt.strip())
+    if not prompts:
+        sys.exit(f"No prompts found in {patterns}")
+    return prompts
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Client:
+    """One requests.Session per load thread, talking to `base_url`."""
+
+    def __init__(self, base_url, timeout, poll_interval, task_timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.task_timeout = task_timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def call(self, endpoint, prompt):
+        """(status, extra) for one logical request; raises on transport errors."""
+        res = self.session.post(self.base_url + ENDPOINTS[endpoint], json={"prompt": prompt}, timeout=self.timeout)
+        if endpoint != "async_evaluate" or res.status_code != 202:
+            return res.status_code, {}
+
+        body = res.json()
+        extra = {"tier": body.get("tier")}
+        deadline = time.monotonic() + self.task_timeout
+        status_url = f"{self.base_url}/api/task/{body['task_id']}"
+        while time.monotonic() < deadline:
+            status = self.session.get(status_url, timeout=self.timeout)
+            if status.status_code != 202:
+                return status.status_code, extra
+            time.sleep(self.poll_interval)
+        return 504, extra  # never finished: reported as an error
+
+
+def run_endpoint(client, endpoint, prompts, args):
+    records = []
+    lock = threading.Lock()
+
+    def one(i, scheduled=None):
+        prompt = prompts[i % len(prompts)]
+        start = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            status, extra = client.call(endpoint, prompt)
+            error = None
+        except requests.RequestException as e:
+            status, extra, error = None, {}, type(e).__name__
+        record = {"latency_s": time.perf_counter() - start, "status": status, "error": error, **extra}
+        with lock:
+            records.append(record)
+
+    started = time.perf_counter()
+    if args.rate:
+        rng = random.Random(args.seed)
+        with ThreadPoolExecutor(max_workers=args.max_inflight) as pool:
+            next_at = time.perf_counter()
+            for i in range(args.requests):
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(one, i, next_at)
+                next_at += rng.expovariate(args.rate) if args.arrivals == "poisson" else 1 / args.rate
+    else:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(one, range(args.requests)))
+    return summarize(endpoint, records, time.perf_counter() - started)
+
+
+def summarize(endpoint, records, elapsed):
+    latencies = sorted(r["latency_s"] * 1000 for r in records)
+    statuses = Counter(str(r["status"] or r["error"]) for r in records)
+    errors = sum(1 for r in records if r["status"] is None or r["status"] >= 500)
+    rejected = sum(1 for r in records if r["status"] is not None and 400 <= r["status"] < 500)
+    summary = {
+        "endpoint": ENDPOINTS[endpoint],
+        "requests": len(records),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(records) / elapsed if elapsed else 0.0,
+        "errors": errors,
+        "error_rate": errors / len(records) if records else 0.0,
+        "rejected": rejected,
+        "statuses": dict(sorted(statuses.items())),
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        },
+    }
+    tiers = Counter(r["tier"] for r in records if r.get("tier"))
+    if tiers:
+        summary["tiers"] = dict(sorted(tiers.items()))
+    return summary
+
+
+def print_summary(name, s):
+    lat = s["latency_ms"]
+    print(f"{name:<15} {s['requests']:>6} req {s['elapsed_s']:7.2f}s {s['throughput_rps']:8.1f} req/s  "
+          f"p50 {lat['p50']:8.1f}  p95 {lat['p95']:8.1f}  p99 {lat['p99']:8.1f} ms  "
+          f"errors {s['error_rate']:6.1%}  rejected {s['rejected']}")
+
+
+def compare(results, baseline_path, max_regression):
+    """Print per-endpoint changes against an earlier report; returns the regressions beyond the threshold."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    print(f"\nvs {baseline_path}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        changes = {"throughput_rps": _change(before["throughput_rps"], current["throughput_rps"])}
+        for q in ("p50", "p95", "p99"):
+            changes[q] = _change(before["latency_ms"][q], current["latency_ms"][q])
+        print(f"{name:<15} " + "  ".join(f"{k} {v:+6.1f}%" for k, v in changes.items() if v is not None))
+        if max_regression is not None:
+            if changes["throughput_rps"] is not None and changes["throughput_rps"] < -max_regression:
+                regressions.append(f"{name} throughput {changes['throughput_rps']:+.1f}%")
+            for q in ("p95", "p99"):
+                if changes[q] is not None and changes[q] > max_regression:
+                    regressions.append(f"{name} {q} {changes[q]:+.1f}%")
+            if current["error_rate"] > before["error_rate"]:
+                regressions.append(f"{name} error rate {before['error_rate']:.1%} -> {current['error_rate']:.1%}")
+    return regressions
+
+
+def _change(before, after):
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def start_local_stack(args):
+    """Stub Ollama + Flask + an in-memory Celery worker in this process; returns (base_url, stop)."""
+    stub_url = StubOllama(port=0, latency=args.latency, parallel=args.parallel, distribution=args.distribution,
+                          jitter=args.jitter, seed=args.seed, token_latency=args.token_latency,
+                          variants=args.variants, fail_rate=args.fail_rate).start_in_thread()
+    os.environ["OLLAMA_ENDPOINT"] = os.environ["OLLAMA_CHAT_URL"] = stub_url + "/v1/chat/completions"
+    os.environ["CELERY_BROKER_URL"] = "memory://"
+    os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+    os.environ.setdefault("LLM_CACHE_BACKEND", "off")  # every replayed prompt reaches the stub
+    os.environ.setdefault("OLLAMA_NUM_PARALLEL", str(args.worker_concurrency))
+    os.chdir(tempfile.mkdtemp(prefix="load_test_"))  # keep benchmark log lines out of the repo
+
+    from celery.contrib.testing.worker import start_worker
+    from werkzeug.serving import make_server
+
+    from app import app
+    from celery_worker import celery
+
+    # The in-memory transport is polled, and with prefetch 1 a backlog drains one poll at a time;
+    # prefetching a few keeps it close to how the worker behaves on Redis
+    celery.conf.broker_transport_options = {"polling_interval": 0.01}
+    celery.conf.worker_prefetch_multiplier = 4
+    worker = start_worker(celery, pool="threads", concurrency=args.worker_concurrency, perform_ping_check=False)
+    worker.__enter__()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log line per request
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        worker.__exit__(None, None, None)
+
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", nargs="+", default=[DEFAULT_PROMPTS], help="prompt set files or globs")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, help="requests per endpoint (default: one pass over the prompts)")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop clients")
+    parser.add_argument("--rate", type=float, help="open-loop requests/s instead of --concurrency")
+    parser.add_argument("--arrivals", choices=("fixed", "poisson"), default="fixed", help="open-loop spacing")
+    parser.add_argument("--max-inflight", type=int, default=256, help="open-loop cap on outstanding requests")
+    parser.add_argument("--timeout", type=float, default=120, help="per HTTP request, seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="/api/task polling, seconds")
+    parser.add_argument("--task-timeout", type=float, default=120, help="give up on an async task after, seconds")
+    parser.add_argument("--base-url", help="load a running server instead of the in-process stack")
+    parser.add_argument("--latency", type=float, default=0.25, help="stub seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="stub seconds per generated token")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed", help="stub latency distribution")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform half-width (s) or lognormal sigma")
+    parser.add_argument("--parallel", type=int, default=4, help="generations the stub serves at once")
+    parser.add_argument("--variants", default="clean", help="stub output mix, e.g. clean=80,fenced=10,truncated=10")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of stub calls answered with a 503")
+    parser.add_argument("--worker-concurrency", type=int, default=4, help="in-process Celery worker threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON to this path")
+    parser.add_argument("--compare", help="earlier JSON report to diff against")
+    parser.add_argument("--max-regression", type=float, help="with --compare: exit 1 past this many percent")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.prompts)
+    args.requests = args.requests or len(prompts)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    stop = None
+    base_url = args.base_url
+    if base_url is None:
+        base_url, stop = start_local_stack(args)
+    client = Client(base_url, args.timeout, args.poll_interval, args.task_timeout)
+
+    mode = f"{args.rate} req/s ({args.arrivals})" if args.rate else f"concurrency {args.concurrency}"
+    print(f"{len(prompts)} prompts, {args.requests} requests per endpoint, {mode}, target {base_url}")
+    results = {}
+    try:
+        for endpoint in args.endpoints:
+            results[endpoint] = run_endpoint(client, endpoint, prompts, args)
+            print_summary(endpoint, results[endpoint])
+    finally:
+        if stop is not None:
+            stop()
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "prompt_count": len(prompts),
+        "results": results,
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if baseline:
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print("\nRegressions: " + "; ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
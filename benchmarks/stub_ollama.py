@@ -0,0 +1,386 @@
+"""
+Deterministic stand-in for Ollama, for offline benchmarks and CI boxes without a GPU.
+
+    python benchmarks/stub_ollama.py --port 11435 --latency 0.5
+    python benchmarks/stub_ollama.py --latency 0.2 --token-latency 0.02 --parallel 4 \\
+        --variants clean=80,fenced=10,truncated=5,missing_commas=5 --fail-rate 0.02
+
+Endpoints: POST /v1/chat/completions (OpenAI style, SSE when "stream": true), POST /api/generate
+and POST /api/chat (Ollama native, NDJSON streaming on by default like the real server),
+GET /api/tags and GET /.
+
+Replies depend only on the prompt. Rubric prompts get a rubric JSON whose scores are derived from
+a hash of the prompt (`--rubric fixed` always returns RUBRIC_RESULT). A numbered batch of prompts
+([1], [2], ...) gets a JSON array, and prompt-improvement requests get a rewritten prompt.
+`--variants` mixes in the malformed outputs real models produce: fences, triple quotes, missing
+or trailing commas, bare keys, single quotes, truncation, chatter and so on. Each prompt always
+gets the same variant, so runs can be repeated. An `X-Stub-Variant` request header forces one.
+
+Timing: `--latency` is the time to the first token and `--token-latency` is added per token.
+With `--distribution`, the first-token delay is drawn from a seeded distribution around `--latency`:
+uniform (±`--jitter`), exponential (mean `--latency`) or lognormal (median `--latency`, sigma `--jitter`).
+With `--parallel N` at most N generations run at once and the rest queue, like Ollama's OLLAMA_NUM_PARALLEL.
+`max_tokens` (or `options.num_predict`) cuts the reply short with finish reason "length".
+
+Failure injection (seeded): `--fail-rate` answers `--fail-status`, `--hang-rate` stalls for
+`--hang-seconds` before answering, and `--drop-rate` closes the connection mid-reply.
+
+It runs on a single asyncio event loop, so hundreds of concurrent generations cost almost nothing.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+RUBRIC_RESULT = {
+    "score": 80,
+    "criteria": {
+        "safety": 25,
+        "clinical_clarity": 20,
+        "specificity": 15,
+        "instructional_style": 12,
+        "medical_terminology": 8,
+    },
+    "suggestions": [
+        "Specify the patient's age, sex and relevant comorbidities.",
+        "State the care setting and the decision the answer should support.",
+    ],
+}
+
+CRITERIA_CAPS = {"safety": 30, "clinical_clarity": 25, "specificity": 20, "instructional_style": 15, "medical_terminology": 10}
+SUGGESTIONS = (
+    "Specify the patient age, sex and relevant comorbidities.",
+    "State the care setting and the clinical decision the answer should support.",
+    "Ask for a structured answer such as numbered steps or a comparison table.",
+    "Name the condition stage or severity to narrow the recommendations.",
+    "Use precise clinical terms such as first-line therapy or contraindications.",
+    "Mention current medications so interactions can be considered.",
+)
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+NOT_RELEVANT = {"error": "Prompt is not medically relevant."}
+POLICY_REPLY = "I'm sorry, but I can't help with that request because it violates safety guidelines."
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error",
+           502: "Bad Gateway", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+def _without_line_commas(text):
+    return re.sub(r",\n", "\n", text)
+
+
+# Each variant renders a result object the way a sloppy model might
+VARIANTS = {
+    "clean": lambda r: json.dumps(r),
+    "pretty": lambda r: json.dumps(r, indent=2),
+    "fenced": lambda r: "```json\n" + json.dumps(r, indent=2) + "\n```",
+    "fenced_prose": lambda r: "Here is the evaluation you asked for:\n```json\n" + json.dumps(r, indent=2)
+                              + "\n```\nLet me know if you need anything else.",
+    "triple_quoted": lambda r: '"""\n' + json.dumps(r) + '\n"""',
+    "missing_commas": lambda r: _without_line_commas(json.dumps(r, indent=2)),
+    "trailing_commas": lambda r: re.sub(r'(\d|")(\s*[}\]])', r"\1,\2", json.dumps(r)),
+    "unquoted_keys": lambda r: re.sub(r'"(\w+)":', r"\1:", json.dumps(r)),
+    "single_quotes": lambda r: json.dumps(r).replace("'", "").replace('"', "'"),
+    "python_literals": lambda r: json.dumps(r).replace("true", "True").replace("false", "False").replace("null", "None"),
+    "truncated": lambda r: json.dumps(r)[:int(len(json.dumps(r)) * 0.8)],
+    "trailing_chatter": lambda r: json.dumps(r) + "\n\nNote: scores reflect the rubric above.",
+    "list_wrapped": lambda r: "[" + json.dumps(r) + "]",
+    "not_relevant": lambda r: json.dumps(NOT_RELEVANT),
+    "policy": lambda r: POLICY_REPLY,
+}
+
+
+def parse_variants(spec):
+    """'clean=80,fenced=20' -> [(name, weight), ...]."""
+    weights = []
+    for part in (spec or "clean").split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in VARIANTS:
+            raise ValueError(f"Unknown variant {name!r}; choose from {', '.join(VARIANTS)}")
+        weights.append((name, float(weight or 1)))
+    return weights
+
+
+def _digest(*parts):
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).digest()
+
+
+def templated_rubric(prompt):
+    """Valid rubric JSON whose scores and suggestions are a pure function of the prompt."""
+    digest = _digest("rubric", prompt)
+    criteria = {}
+    for i, (name, cap) in enumerate(CRITERIA_CAPS.items()):
+        criteria[name] = cap // 2 + digest[i] % (cap - cap // 2 + 1)
+    picks = sorted({digest[8 + i] % len(SUGGESTIONS) for i in range(3)})
+    return {"score": sum(criteria.values()), "criteria": criteria, "suggestions": [SUGGESTIONS[i] for i in picks]}
+
+
+def tokenize(text):
+    """Roughly word-sized pieces whose concatenation is the original text."""
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+class StubOllama:
+    def __init__(self, host="127.0.0.1", port=11435, latency=0.5, parallel=None,
+                 distribution="fixed", jitter=0.0, seed=0, token_latency=0.0, variants=None,
+                 rubric="templated", fail_rate=0.0, fail_status=503, hang_rate=0.0, hang_seconds=300.0,
+                 drop_rate=0.0, model="llama3:8b-instruct-q4_K_M"):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        if rubric not in ("templated", "fixed"):
+            raise ValueError(f"Unknown rubric mode: {rubric}")
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.parallel = parallel
+        self.distribution = distribution
+        self.jitter = jitter
+        self.seed = seed
+        self.token_latency = token_latency
+        self.variants = parse_variants(variants)
+        self.rubric = rubric
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.drop_rate = drop_rate
+        self.model = model
+        self.requests = 0
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.injected = {"fail": 0, "hang": 0, "drop": 0}
+        self._rng = random.Random(seed)
+        self._server = None
+        self._slots = None
+
+    def sample_latency(self):
+        if self.distribution == "uniform":
+            return max(0.0, self._rng.uniform(self.latency - self.jitter, self.latency + self.jitter))
+        if self.distribution == "exponential":
+            return self._rng.expovariate(1 / self.latency) if self.latency > 0 else 0.0
+        if self.distribution == "lognormal":
+            return self.latency * self._rng.lognormvariate(0, self.jitter)
+        return self.latency
+
+    # --- content ------------------------------------------------------------
+
+    def pick_variant(self, prompt):
+        total = sum(weight for _, weight in self.variants)
+        point = int.from_bytes(_digest("variant", str(self.seed), prompt)[:8], "big") / 2 ** 64 * total
+        for name, weight in self.variants:
+            point -= weight
+            if point < 0:
+                return name
+        return self.variants[-1][0]
+
+    def result_for(self, prompt):
+        return json.loads(json.dumps(RUBRIC_RESULT)) if self.rubric == "fixed" else templated_rubric(prompt)
+
+    def reply_text(self, system, prompt, variant=None):
+        if "improved prompt" in system.lower():
+            return f"For an adult patient, {prompt.strip().rstrip('.?!')}. Answer as a numbered list of clinical steps."
+        variant = variant if variant in VARIANTS else self.pick_variant(prompt)
+        numbered = re.findall(r"^\[(\d+)\]\n(.*?)(?=\n\n\[\d+\]\n|\Z)", prompt, re.S | re.M)
+        if len(numbered) > 1:
+            # Micro-batch request: one object per numbered prompt, in an array
+            items = [dict(self.result_for(text), index=int(index)) for index, text in numbered]
+            return json.dumps(items) if variant in ("clean", "pretty") else VARIANTS["fenced"](items)
+        return VARIANTS[variant](self.result_for(prompt))
+
+    # --- HTTP ---------------------------------------------------------------
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        body = await reader.readexactly(length) if length else b""
+        return method, path.split("?", 1)[0], headers, body
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    return
+                keep_alive = await self._dispatch(writer, *request)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, writer, method, path, headers, body):
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if method == "GET" and path == "/":
+            return self._send(writer, 200, b"Ollama is running", "text/plain", keep_alive)
+        if method == "GET" and path == "/api/tags":
+            tags = {"models": [{"name": self.model, "model": self.model}]}
+            return self._send(writer, 200, json.dumps(tags).encode(), keep_alive=keep_alive)
+        if method != "POST" or path not in ("/v1/chat/completions", "/api/generate", "/api/chat"):
+            return self._send(writer, 404, b'{"error": "not found"}', keep_alive=keep_alive)
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return self._send(writer, 400, b'{"error": "invalid JSON"}', keep_alive=keep_alive)
+
+        self.requests += 1
+        roll = self._rng.random()
+        if roll < self.fail_rate:
+            self.injected["fail"] += 1
+            await asyncio.sleep(self.sample_latency())
+            return self._send(writer, self.fail_status, b'{"error": "injected failure"}', keep_alive=keep_alive)
+        if roll < self.fail_rate + self.hang_rate:
+            self.injected["hang"] += 1
+            await asyncio.sleep(self.hang_seconds)
+        drop = self._rng.random() < self.drop_rate
+
+        system, prompt = self._prompt_of(path, payload)
+        tokens = tokenize(self.reply_text(system, prompt, headers.get("x-stub-variant")))
+        limit = payload.get("max_tokens") or (payload.get("options") or {}).get("num_predict")
+        finish = "stop"
+        if limit and len(tokens) > int(limit):
+            tokens, finish = tokens[:int(limit)], "length"
+        native = path != "/v1/chat/completions"
+        stream = bool(payload.get("stream", native))  # Ollama's own endpoints stream unless told not to
+
+        self.inflight += 1
+        self.peak_inflight = max(self.peak_inflight, self.inflight)
+        try:
+            if self._slots is not None:
+                async with self._slots:
+                    return await self._generate(writer, path, tokens, finish, stream, drop, keep_alive)
+            return await self._generate(writer, path, tokens, finish, stream, drop, keep_alive)
+        finally:
+            self.inflight -= 1
+
+    @staticmethod
+    def _prompt_of(path, payload):
+        if path == "/api/generate" and "prompt" in payload:
+            return str(payload.get("system", "")), str(payload["prompt"])
+        messages = payload.get("messages") or []
+        system = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        users = [str(m.get("content", "")) for m in messages if m.get("role") == "user"]
+        return system, users[-1] if users else ""
+
+    async def _generate(self, writer, path, tokens, finish, stream, drop, keep_alive):
+        await asyncio.sleep(self.sample_latency())
+        if not stream:
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency * len(tokens))
+            if drop:
+                self.injected["drop"] += 1
+                return False
+            body = self._final_body(path, "".join(tokens), finish, len(tokens))
+            return self._send(writer, 200, json.dumps(body).encode(), keep_alive=keep_alive)
+
+        native = path != "/v1/chat/completions"
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: " + (b"application/x-ndjson" if native else b"text/event-stream")
+                     + b"\r\nTransfer-Encoding: chunked\r\n" + (b"" if keep_alive else b"Connection: close\r\n") + b"\r\n")
+        for i, token in enumerate(tokens):
+            if drop and i >= len(tokens) // 2:
+                self.injected["drop"] += 1
+                await writer.drain()
+                return False  # no terminating chunk: the client sees a broken stream
+            self._write_chunk(writer, self._delta_line(path, token))
+            await writer.drain()
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+        if native:
+            self._write_chunk(writer, json.dumps(self._final_body(path, "", finish, len(tokens))) + "\n")
+        else:
+            final = {"object": "chat.completion.chunk", "model": self.model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]}
+            self._write_chunk(writer, "data: " + json.dumps(final) + "\n\ndata: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        return keep_alive
+
+    def _delta_line(self, path, token):
+        if path == "/api/generate":
+            return json.dumps({"model": self.model, "response": token, "done": False}) + "\n"
+        if path == "/api/chat":
+            return json.dumps({"model": self.model, "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+        chunk = {"object": "chat.completion.chunk", "model": self.model,
+                 "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+        return "data: " + json.dumps(chunk) + "\n\n"
+
+    def _final_body(self, path, content, finish, count):
+        if path == "/v1/chat/completions":
+            return {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": self.model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish}],
+                "usage": {"completion_tokens": count},
+            }
+        body = {"model": self.model, "done": True, "done_reason": finish, "eval_count": count}
+        if path == "/api/generate":
+            body["response"] = content
+        else:
+            body["message"] = {"role": "assistant", "content": content}
+        return body
+
+    @staticmethod
+    def _write_chunk(writer, text):
+        data = text.encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    @staticmethod
+    def _send(writer, status, body, content_type="application/json", keep_alive=True):
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n".encode()
+            + (b"" if keep_alive else b"Connection: close\r\n") + b"\r\n" + body
+        )
+        return keep_alive
+
+    async def serve(self, ready=None):
+        self._slots = asyncio.Semaphore(self.parallel) if self.parallel else None
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self):
+        """Run the stub on its own event loop thread; returns its base URL once it is listening."""
+        ready = threading.Event()
+        threading.Thread(target=asyncio.run, args=(self.serve(ready),), daemon=True).start()
+        ready.wait()
+        return f"http://{self.host}:{self.port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per generated token")
+    parser.add_argument("--parallel", type=int, help="generations served at once (default: unlimited)")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform half-width (s) or lognormal sigma")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variants", default="clean", help=f"weighted mix, e.g. clean=80,fenced=20 ({', '.join(VARIANTS)})")
+    parser.add_argument("--rubric", choices=("templated", "fixed"), default="templated")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=300.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    print(f"Stub Ollama listening on http://{args.host}:{args.port}")
+    asyncio.run(StubOllama(args.host, args.port, args.latency, args.parallel, args.distribution, args.jitter, args.seed,
+                           args.token_latency, args.variants, args.rubric, args.fail_rate, args.fail_status,
+                           args.hang_rate, args.hang_seconds, args.drop_rate).serve())
@@ -2,14 +2,25 @@ import os
 from dotenv import load_dotenv
 load_dotenv()  # Load your .env with REDIS config
 
+import hashlib
 import json
-import json5
 import re
-from datetime import datetime
-import requests
-from json.decoder import JSONDecodeError
-from celery import Celery, Task
+import time
+from datetime import datetime, timezone
+from celery import Celery, Task, states
+from celery.signals import before_task_publish, task_failure, task_postrun, task_prerun, task_retry, worker_init, worker_process_shutdown, worker_shutdown
 from validators import validate_medical_prompt_result
+from log_writer import flush_all_writers, get_log_writer
+from llm_client import OLLAMA_NUM_PARALLEL, OLLAMA_SLOT_LIMIT, CircuitOpenError, TransientLLMError, backoff_delay, chat_completion, set_slot_limit, stream_chat_completion
+from llm_cache import cache_key, get_result_cache, is_cacheable
+from similarity_cache import find_similar, remember_similar
+from json_extract import IncrementalJSONExtractor, parse_llm_json
+from task_events import publish_task_event
+from metrics import observe_stage, record_cache_lookup, record_rejection, record_retry, task_finished, task_started
+from tracing import begin_span, current_traceparent, finish_span, record_span, tracing_enabled
+from phrase_match import HARM_FLAG, POLICY, REJECTION, UNSAFE_SUGGESTION, get_phrase_matcher
+from scoring import criteria_hits
+from triage import regex_result
 
 celery = Celery(
     'tasks',
@@ -17,6 +28,86 @@ celery = Celery(
     backend=os.getenv('CELERY_RESULT_BACKEND')
 )
 
+# ✅ Tasks mostly wait on Ollama over HTTP, so run them on a thread pool sized to its parallel slots.
+# `celery -A celery_worker.celery worker` picks these up; --pool/--concurrency still override them.
+celery.conf.update(
+    worker_pool=os.getenv("CELERY_POOL", "threads"),
+    worker_concurrency=int(os.getenv("CELERY_CONCURRENCY", str(OLLAMA_NUM_PARALLEL))),
+    worker_prefetch_multiplier=1,
+)
+
+# Only the worker caps its own Ollama calls; the web processes importing this module stay uncapped
+@worker_init.connect
+def limit_ollama_slots(**kwargs):
+    set_slot_limit(OLLAMA_SLOT_LIMIT or OLLAMA_NUM_PARALLEL)
+
+# ✅ Flush buffered log lines on shutdown: prefork children exit through os._exit, which skips atexit
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_log_writers(**kwargs):
+    flush_all_writers()
+
+# ✅ Publish task state changes to Redis for /api/task/<task_id>/events
+@task_prerun.connect
+def publish_task_started(task_id=None, **kwargs):
+    publish_task_event(task_id, states.STARTED)
+
+@task_retry.connect
+def publish_task_retry(request=None, **kwargs):
+    publish_task_event(getattr(request, "id", None), states.RETRY)
+
+@task_postrun.connect
+def publish_task_finished(task_id=None, state=None, **kwargs):
+    # Runs after the result is stored, so subscribers can read it right away
+    publish_task_event(task_id, state)
+
+# ✅ Queue wait vs execution time for /metrics: stamp each message as it is published,
+# along with the publishing request's trace context
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers["published_at"] = time.time()
+        traceparent = current_traceparent()
+        if traceparent:
+            headers["traceparent"] = traceparent
+
+# The start time lives on the request, which goes away with the task even if postrun never runs
+@task_prerun.connect
+def observe_task_started(task_id=None, task=None, **kwargs):
+    request = getattr(task, "request", None)
+    started = task_started(getattr(task, "name", "unknown"),
+                           getattr(request, "published_at", None), getattr(request, "eta", None))
+    if request is not None:
+        request.metrics_started_at = started
+
+@task_postrun.connect
+def observe_task_finished(task_id=None, task=None, state=None, **kwargs):
+    task_finished(getattr(task, "name", "unknown"), getattr(getattr(task, "request", None), "metrics_started_at", None), state)
+
+# ✅ Continue the publisher's trace in the worker: a span for the broker wait, one for the task
+_task_spans = {}
+
+@task_prerun.connect
+def trace_task_started(task_id=None, task=None, **kwargs):
+    if not tracing_enabled():
+        return
+    request = getattr(task, "request", None)
+    traceparent = getattr(request, "traceparent", None)
+    published_at = getattr(request, "published_at", None)
+    span, token = _task_spans[task_id] = begin_span(f"celery.task {getattr(task, 'name', 'unknown')}", traceparent,
+                                                    kind="consumer", **{"task.id": task_id})
+    if published_at is not None:
+        # Without an upstream trace (e.g. micro-batches) the wait hangs off the task span instead
+        record_span("celery.queue", int(float(published_at) * 1e9), span.start_ns, traceparent or span.traceparent,
+                    **{"task.id": task_id, "retries": getattr(request, "retries", 0)})
+
+@task_postrun.connect
+def trace_task_finished(task_id=None, state=None, **kwargs):
+    span_token = _task_spans.pop(task_id, None)
+    if span_token is not None:
+        span_token[0].set_attribute("task.state", state)
+        finish_span(*span_token)
+
 LOG_FILE = os.path.join("logs", "evaluations.jsonl")
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
@@ -49,16 +140,15 @@ def is_soft_rejection(parsed):
 
 def log_evaluation(prompt, result, model="llama3:8b-instruct-q4_K_M"):
     entry = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
         "model": model,
         "prompt": prompt,
         "result": result,
         "score": result.get("score", 0) if isinstance(result, dict) else 0,
+        "tier": result.get("tier", "llm") if isinstance(result, dict) else "llm",
     }
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            json.dump(entry, f, ensure_ascii=False)
-            f.write("\n")
+        get_log_writer(LOG_FILE).append(json.dumps(entry, ensure_ascii=False))
     except Exception as e:
         return {
             "error": "Exception during evaluation",
@@ -66,119 +156,101 @@ def log_evaluation(prompt, result, model="llama3:8b-instruct-q4_K_M"):
             "status": "failed"
         }
 
-POLICY_PHRASES = [
-    "not allowed", "against policy", "not permitted", "cannot help with",
-    "violates", "against ethical", "not appropriate", "i cannot assist",
-    "safety guidelines", "not medically appropriate", "i'm sorry, but i can't"
-]
-
 def is_policy_rejection(text):
-    text = text.lower()
-    return any(phrase in text for phrase in POLICY_PHRASES)
-
-def clean_llm_output(text):
-    text = re.sub(r'```(?:json)?|```', '', text)
-    text = text.replace('"""', '')
-    first_brace = text.find('{')
-    last_brace = text.rfind('}')
-    if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-        text = text[first_brace:last_brace + 1]
-    return text
-
-def repair_llm_json(text):
-    return re.sub(r'(\d+)\s*(")', r'\1,\n\2', text)
-
-def auto_close_json(text):
-    open_braces = text.count("{")
-    close_braces = text.count("}")
-    open_brackets = text.count("[")
-    close_brackets = text.count("]")
-    while close_brackets < open_brackets:
-        text += "]"
-        close_brackets += 1
-    while close_braces < open_braces:
-        text += "}"
-        close_braces += 1
-    return text
-
-@celery.task(
-    bind=True,
-    name="tasks.evaluate_with_llama",
-    autoretry_for=(JSONDecodeError, ValueError, Exception),
-    retry_kwargs={'max_retries': 3, 'countdown': 5},
-    retry_backoff=False,
-    retry_jitter=False
+    return get_phrase_matcher().matches(text, POLICY)
+
+# ✅ Evaluation prompt and model settings; the version hash changes whenever the rubric text does
+EVALUATION_MODEL = "llama3:8b-instruct-q4_K_M"
+EVALUATION_TEMPERATURE = 0.15
+EVALUATION_STREAM = os.getenv("OLLAMA_STREAM", "1") != "0"  # stop generating once the JSON object closes
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "8"))  # prompts packed into one call by evaluate_batch_with_llama
+LLM_TASK_MAX_RETRIES = int(os.getenv("LLM_TASK_MAX_RETRIES", "3"))  # task-level retries after the client's own
+LLM_TASK_RETRY_BASE = float(os.getenv("LLM_TASK_RETRY_BASE", "2"))
+LLM_TASK_RETRY_MAX = float(os.getenv("LLM_TASK_RETRY_MAX", "60"))
+SYSTEM_INSTRUCTION = (
+    "Return only raw JSON. Do not use any markdown fences or triple-quotes.\n\n"
+    "You are a clinical prompt evaluation expert and AI safety auditor.\n\n"
+    "Your task is to assess prompts intended for medical or healthcare settings only.\n\n"
+    "Use the following scoring rubric (max 100 points):\n"
+    "- \"safety\": 0–30 — Prompt must actively guide a safe, clinically responsible, and bounded response.\n"
+    "  Award full points only if the prompt constrains dangerous interpretations (e.g., clarifies type, audience, or clinical setting).\n"
+    "  Broad or ambiguous prompts may still be non-harmful but should score 20–25 due to risk of oversimplification.\n"
+    "- \"clinical_clarity\": 0–25 — Measures how clear, coherent, and clinically focused the prompt is.\n"
+    "  Prompts should specify clinical context (diagnosis, stage, or decision point).\n"
+    "  Full score requires both linguistic clarity and medical framing. Vague questions (e.g., “Tell me about X”) score lower (10–15).\n"
+    "- \"specificity\": 0–20 — Measures how precisely the prompt defines the clinical scenario.\n"
+    "  Full score requires inclusion of multiple relevant details such as patient age, sex, diagnosis, severity, comorbidities, or care setting.\n"
+    "  Generic prompts that mention only a disease name without context should score ≤10.\n"
+    "- \"instructional_style\": 0–15 — Prompts should request a clear output structure: steps, summaries, overviews, or actions.\n"
+    "  Award full points only if the prompt uses directive language (e.g., “outline,” “list,” “compare”) and implies an organized response.\n"
+    "  Open-ended or loosely phrased prompts without a clear task format should score ≤10.\n"
+    "- \"medical_terminology\": 0–10 — Evaluates use of appropriate clinical terms in the prompt itself.\n"
+    "  Full credit requires accurate and relevant terminology (e.g., “first-line treatment,” “lifestyle modification,” “antihypertensives”).\n"
+    "  Prompts using everyday language or vague phrasing (e.g., “get better,” “fix blood sugar”) score ≤5.\n"
+    "  Overly technical or irrelevant jargon does not raise the score.\n\n"
+    "⚠️ Additional Guideline:\n"
+    "- If the prompt is very short (fewer than 12 words), apply stricter scoring across all categories unless it is unusually specific and well-structured.\n"
+    "- Do not award full points to vague, overly brief prompts.\n\n"
+    "Respond in this strict JSON structure:\n"
+    "{\n"
+    "  \"score\": total_score_integer,\n"
+    "  \"criteria\": {\n"
+    "    \"safety\": int,\n"
+    "    \"clinical_clarity\": int,\n"
+    "    \"specificity\": int,\n"
+    "    \"instructional_style\": int,\n"
+    "    \"medical_terminology\": int\n"
+    "  },\n"
+    "  \"suggestions\": [\n"
+    "    \"Concrete suggestion 1\",\n"
+    "    \"Concrete suggestion 2\",\n"
+    "    \"Concrete suggestion 3\"\n"
+    "  ]\n"
+    "}\n\n"
+    "RULES:\n"
+    "- Only evaluate prompts clearly related to medicine.\n"
+    "- If not relevant, respond exactly: {\"error\": \"Prompt is not medically relevant.\"}\n"
+    "- If unsafe (e.g., suicide), respond: {\"error\": \"Prompt blocked due to safety concerns.\"}\n"
+    "- Use only double quotes.\n"
+    "- Suggestions max 25 words each.\n"
+    "- No explanation, markdown, or extra text."
 )
-def evaluate_with_llama(self, prompt):
+SYSTEM_INSTRUCTION_VERSION = hashlib.sha256(SYSTEM_INSTRUCTION.encode("utf-8")).hexdigest()[:12]
+
+def extract_user_prompt(task_input):
+    """The user's prompt inside the wrapped task input built by /api/async_evaluate."""
+    actual_prompt = re.search(r"Prompt:\s*(.*?)\n\nReturn JSON", task_input, re.DOTALL)
+    return actual_prompt.group(1).strip() if actual_prompt else task_input
+
+def non_medical_result(orig_prompt):
+    reason = "Harmful or self-harm content detected" if "kill yourself" in orig_prompt.lower() else "Direct LLM response with no scoring"
+    return {
+        "error": "non_medical_prompt",
+        "reason": reason
+    }
+
+def run_llama_evaluation(prompt):
     orig_prompt = prompt
-    actual_prompt = re.search(r"Prompt:\s*(.*?)\n\nReturn JSON", orig_prompt, re.DOTALL)
-    prompt_for_count = actual_prompt.group(1).strip() if actual_prompt else orig_prompt
-
-    system_instruction = (
-        "Return only raw JSON. Do not use any markdown fences or triple-quotes.\n\n"
-        "You are a clinical prompt evaluation expert and AI safety auditor.\n\n"
-        "Your task is to assess prompts intended for medical or healthcare settings only.\n\n"
-        "Use the following scoring rubric (max 100 points):\n"
-        "- \"safety\": 0–30 — Prompt must actively guide a safe, clinically responsible, and bounded response.\n"
-        "  Award full points only if the prompt constrains dangerous interpretations (e.g., clarifies type, audience, or clinical setting).\n"
-        "  Broad or ambiguous prompts may still be non-harmful but should score 20–25 due to risk of oversimplification.\n"
-        "- \"clinical_clarity\": 0–25 — Measures how clear, coherent, and clinically focused the prompt is.\n"
-        "  Prompts should specify clinical context (diagnosis, stage, or decision point).\n"
-        "  Full score requires both linguistic clarity and medical framing. Vague questions (e.g., “Tell me about X”) score lower (10–15).\n"
-        "- \"specificity\": 0–20 — Measures how precisely the prompt defines the clinical scenario.\n"
-        "  Full score requires inclusion of multiple relevant details such as patient age, sex, diagnosis, severity, comorbidities, or care setting.\n"
-        "  Generic prompts that mention only a disease name without context should score ≤10.\n"
-        "- \"instructional_style\": 0–15 — Prompts should request a clear output structure: steps, summaries, overviews, or actions.\n"
-        "  Award full points only if the prompt uses directive language (e.g., “outline,” “list,” “compare”) and implies an organized response.\n"
-        "  Open-ended or loosely phrased prompts without a clear task format should score ≤10.\n"
-        "- \"medical_terminology\": 0–10 — Evaluates use of appropriate clinical terms in the prompt itself.\n"
-        "  Full credit requires accurate and relevant terminology (e.g., “first-line treatment,” “lifestyle modification,” “antihypertensives”).\n"
-        "  Prompts using everyday language or vague phrasing (e.g., “get better,” “fix blood sugar”) score ≤5.\n"
-        "  Overly technical or irrelevant jargon does not raise the score.\n\n"
-        "⚠️ Additional Guideline:\n"
-        "- If the prompt is very short (fewer than 12 words), apply stricter scoring across all categories unless it is unusually specific and well-structured.\n"
-        "- Do not award full points to vague, overly brief prompts.\n\n"
-        "Respond in this strict JSON structure:\n"
-        "{\n"
-        "  \"score\": total_score_integer,\n"
-        "  \"criteria\": {\n"
-        "    \"safety\": int,\n"
-        "    \"clinical_clarity\": int,\n"
-        "    \"specificity\": int,\n"
-        "    \"instructional_style\": int,\n"
-        "    \"medical_terminology\": int\n"
-        "  },\n"
-        "  \"suggestions\": [\n"
-        "    \"Concrete suggestion 1\",\n"
-        "    \"Concrete suggestion 2\",\n"
-        "    \"Concrete suggestion 3\"\n"
-        "  ]\n"
-        "}\n\n"
-        "RULES:\n"
-        "- Only evaluate prompts clearly related to medicine.\n"
-        "- If not relevant, respond exactly: {\"error\": \"Prompt is not medically relevant.\"}\n"
-        "- If unsafe (e.g., suicide), respond: {\"error\": \"Prompt blocked due to safety concerns.\"}\n"
-        "- Use only double quotes.\n"
-        "- Suggestions max 25 words each.\n"
-        "- No explanation, markdown, or extra text."
-    )
 
     payload = {
-        "model": "llama3:8b-instruct-q4_K_M",
+        "model": EVALUATION_MODEL,
         "messages": [
-            {"role": "system", "content": system_instruction},
+            {"role": "system", "content": SYSTEM_INSTRUCTION},
             {"role": "user", "content": prompt}
         ],
         "max_tokens": 512,
-        "temperature": 0.15,
+        "temperature": EVALUATION_TEMPERATURE,
     }
 
     try:
-        res = requests.post("http://localhost:11434/v1/chat/completions", json=payload, timeout=60)
-        res.raise_for_status()
-        content = res.json()['choices'][0]['message']['content']
+        if EVALUATION_STREAM:
+            extractor = IncrementalJSONExtractor()
+            content = stream_chat_completion(payload, stop=extractor.feed)
+        else:
+            content = chat_completion(payload)
 
         if is_policy_rejection(content):
+            record_rejection("policy")
             result = {
                 "error": "non_medical_prompt",
                 "reason": "Harmful or unsafe content detected"
@@ -186,103 +258,288 @@ def evaluate_with_llama(self, prompt):
             log_evaluation(orig_prompt, result)
             return result
 
-        cleaned = auto_close_json(repair_llm_json(clean_llm_output(content)))
-
-        if "Prompt is not medically relevant" in cleaned:
-            reason = "Harmful or self-harm content detected" if "kill yourself" in orig_prompt.lower() else "Direct LLM response with no scoring"
-            result = {
-                "error": "non_medical_prompt",
-                "reason": reason
-            }
+        if "Prompt is not medically relevant" in content:
+            record_rejection("not_relevant")
+            result = non_medical_result(orig_prompt)
             log_evaluation(orig_prompt, result)
             return result
 
-        parsed = json5.loads(cleaned)
+        try:
+            with observe_stage("parse"):
+                parsed = parse_llm_json(content)
+        except Exception:
+            record_rejection("parse_failure")
+            raise
         if isinstance(parsed, list) and len(parsed) == 1:
             parsed = parsed[0]
+        return finish_evaluation(orig_prompt, parsed)
 
-        required_keys = {"score", "criteria", "suggestions"}
-        if not required_keys.issubset(parsed):
-            raise Exception(f"Missing top-level fields: {required_keys - set(parsed)}")
+    except TransientLLMError:
+        raise  # Ollama is busy or down: the task retries or degrades, see evaluate_with_llama
+    except Exception as e:
+        # Parse and validation failures are permanent: retrying the same output will not help
+        result = {"error": "Exception during evaluation", "reason": str(e)}
+        log_evaluation(orig_prompt, result)
+        return result
 
-        criteria = parsed.get("criteria", {})
-        cap = {"safety": 30, "clinical_clarity": 25, "specificity": 20, "instructional_style": 15, "medical_terminology": 10}
-        for k in criteria:
-            try:
-                value = float(criteria[k])  # handle both string and numeric input
-                criteria[k] = int(min(value, cap.get(k, 100)))
-            except (ValueError, TypeError):
-                criteria[k] = 0
+def degraded_result(orig_prompt, exc):
+    """Regex rubric result used while Ollama is unavailable; never cached."""
+    user_prompt = extract_user_prompt(orig_prompt)
+    result = regex_result(user_prompt, criteria_hits(user_prompt))
+    result["degraded"] = True
+    result["degraded_cause"] = "circuit_open" if isinstance(exc, CircuitOpenError) else "llm_unavailable"
+    log_evaluation(orig_prompt, result)
+    return result
 
-        parsed["criteria"] = criteria
-        criteria = {k.replace(" ", "_"): v for k, v in criteria.items()}
-        parsed["score"] = int(sum(criteria.get(k, 0) for k in cap))
+def validate_result(parsed):
+    with observe_stage("validate"):
+        is_valid = validate_medical_prompt_result(parsed)[0]
+    if not is_valid:
+        record_rejection("validation_failure")
+    return is_valid
 
-        if not validate_medical_prompt_result(parsed)[0]:
-            raise Exception("Validation failed")
+def finish_evaluation(orig_prompt, parsed):
+    """Normalize, validate and post-process one parsed rubric object; raises when it is unusable."""
+    prompt_for_count = extract_user_prompt(orig_prompt)
+    required_keys = {"score", "criteria", "suggestions"}
+    if not required_keys.issubset(parsed):
+        record_rejection("validation_failure")
+        raise Exception(f"Missing top-level fields: {required_keys - set(parsed)}")
 
-        text_to_check = (
-            " ".join(parsed.get("suggestions", [])) +
-            " " + str(parsed.get("prompt", "")) +
-            " " + str(parsed.get("reason", ""))
-        ).lower()
-
-        rejection_phrases = [
-            "not medically relevant", "not a medical prompt", "this is not a medical",
-            "invalid prompt", "please provide a medical", "please provide a more specific and clinically relevant prompt",
-            "please rephrase the prompt to include a clear clinical context and specific instructions",
-            "please rephrase the prompt to include a clear clinical context and specific questions",
-            "please provide a more specific and clear prompt to ensure safety and clinical relevance"
-        ]
-        if any(bad in text_to_check for bad in rejection_phrases):
-            parsed.update({
-                "score": 0,
-                "criteria": {k: 0 for k in cap},
-                "suggestions": ["Prompt is not medically valid. Please provide a clear clinical context."],
-                "error": "non_medical_prompt",
-                "reason": "LLM response indicates vague or non-clinical input"
-            })
-
-        word_count = len(prompt_for_count.split())
-        if word_count < 12 and parsed.get("score", 0) > 90:
-            original_score = parsed["score"]
-            new_score = 85
-            ratio = new_score / original_score if original_score else 1
-            for k in parsed["criteria"]:
-                parsed["criteria"][k] = round(parsed["criteria"][k] * ratio)
-            parsed["score"] = sum(parsed["criteria"].values())
-            if not validate_medical_prompt_result(parsed)[0]:
-                raise Exception("Validation failed")
-            log_evaluation(orig_prompt, parsed)
-            return parsed
-
-        if is_soft_rejection(parsed):
-            parsed["error"] = "non_medical_prompt"
-            parsed["reason"] = "Score is 0 and structure suggests vague or non-medical prompt."
-            harm_flags = ["harmful", "dangerous", "unsafe", "triggering", "kill", "suicide", "hurt"]
-            suggestion_text = " ".join(parsed.get("suggestions", [])).lower()
-            if any(flag in suggestion_text for flag in harm_flags):
-                parsed["harmful"] = True
-
-        elif parsed.get("score", 0) == 0 and "error" not in parsed:
-            fallback_suggestions = parsed.get("suggestions", [])
-            if any(
-                any(keyword in suggestion.lower() for keyword in ["harmful", "triggering", "dangerous", "illegal", "unsafe"])
-                for suggestion in fallback_suggestions
-            ):
-                parsed["error"] = "non_medical_prompt"
-                parsed["reason"] = "Score is 0 and suggestions indicate potentially harmful or unsafe prompt."
-
-        if 0 < parsed["score"] <= 45 and "error" not in parsed:
-            parsed.setdefault("suggestions", []).insert(0,
-                "⚠️ This prompt may be too vague or broad. Consider adding clinical context (e.g., patient type, symptom detail)."
-            )
-
-        parsed["prompt"] = orig_prompt
+    criteria = parsed.get("criteria", {})
+    cap = {"safety": 30, "clinical_clarity": 25, "specificity": 20, "instructional_style": 15, "medical_terminology": 10}
+    for k in criteria:
+        try:
+            value = float(criteria[k])  # handle both string and numeric input
+            criteria[k] = int(min(value, cap.get(k, 100)))
+        except (ValueError, TypeError):
+            criteria[k] = 0
+
+    parsed["criteria"] = criteria
+    criteria = {k.replace(" ", "_"): v for k, v in criteria.items()}
+    parsed["score"] = int(sum(criteria.get(k, 0) for k in cap))
+
+    if not validate_result(parsed):
+        raise Exception("Validation failed")
+
+    matcher = get_phrase_matcher()
+    text_to_check = (
+        " ".join(parsed.get("suggestions", [])) +
+        " " + str(parsed.get("prompt", "")) +
+        " " + str(parsed.get("reason", ""))
+    )
+    if matcher.matches(text_to_check, REJECTION):
+        record_rejection("rejection_phrase")
+        parsed.update({
+            "score": 0,
+            "criteria": {k: 0 for k in cap},
+            "suggestions": ["Prompt is not medically valid. Please provide a clear clinical context."],
+            "error": "non_medical_prompt",
+            "reason": "LLM response indicates vague or non-clinical input"
+        })
+
+    word_count = len(prompt_for_count.split())
+    if word_count < 12 and parsed.get("score", 0) > 90:
+        original_score = parsed["score"]
+        new_score = 85
+        ratio = new_score / original_score if original_score else 1
+        for k in parsed["criteria"]:
+            parsed["criteria"][k] = round(parsed["criteria"][k] * ratio)
+        parsed["score"] = sum(parsed["criteria"].values())
+        if not validate_result(parsed):
+            raise Exception("Validation failed")
         log_evaluation(orig_prompt, parsed)
         return parsed
 
-    except Exception as e:
-        result = {"error": "Exception during evaluation", "reason": str(e)}
-        log_evaluation(orig_prompt, result)
-        return result
+    if is_soft_rejection(parsed):
+        record_rejection("soft_rejection")
+        parsed["error"] = "non_medical_prompt"
+        parsed["reason"] = "Score is 0 and structure suggests vague or non-medical prompt."
+        if matcher.matches(" ".join(parsed.get("suggestions", [])), HARM_FLAG):
+            parsed["harmful"] = True
+
+    elif parsed.get("score", 0) == 0 and "error" not in parsed:
+        # Joined with spaces: no keyword contains one, so nothing can match across two suggestions
+        if matcher.matches(" ".join(parsed.get("suggestions", [])), UNSAFE_SUGGESTION):
+            parsed["error"] = "non_medical_prompt"
+            parsed["reason"] = "Score is 0 and suggestions indicate potentially harmful or unsafe prompt."
+
+    if 0 < parsed["score"] <= 45 and "error" not in parsed:
+        parsed.setdefault("suggestions", []).insert(0,
+            "⚠️ This prompt may be too vague or broad. Consider adding clinical context (e.g., patient type, symptom detail)."
+        )
+
+    parsed["prompt"] = orig_prompt
+    log_evaluation(orig_prompt, parsed)
+    return parsed
+
+# ✅ Result cache: exact hits first, then near-duplicate prompts (similarity_cache)
+SIMILARITY_CONTEXT = f"{EVALUATION_MODEL}|{SYSTEM_INSTRUCTION_VERSION}|{EVALUATION_TEMPERATURE}"
+
+def cached_evaluation(cache, prompt, key):
+    """A stored evaluation for `prompt`, marked approximate when it belongs to a near-duplicate; else None."""
+    cached = cache.get(key)
+    similarity = None
+    if cached is None:
+        cached, similarity = find_similar(cache, extract_user_prompt(prompt), SIMILARITY_CONTEXT)
+    record_cache_lookup(cached is not None, approximate=similarity is not None)
+    if cached is not None:
+        cached["prompt"] = prompt
+        cached["cached"] = True
+        if similarity is not None:
+            cached["approximate"] = True
+            cached["similarity"] = round(similarity, 3)
+    return cached
+
+def store_cached_evaluation(cache, prompt, key, result):
+    cache.set(key, result)
+    remember_similar(cache, extract_user_prompt(prompt), key, SIMILARITY_CONTEXT)
+
+@celery.task(bind=True, name="tasks.evaluate_with_llama", max_retries=LLM_TASK_MAX_RETRIES)
+def evaluate_with_llama(self, prompt, bypass_cache=False):
+    cache = get_result_cache()
+    key = cache_key(prompt, EVALUATION_MODEL, SYSTEM_INSTRUCTION_VERSION, EVALUATION_TEMPERATURE)
+    if not bypass_cache:
+        cached = cached_evaluation(cache, prompt, key)
+        if cached is not None:
+            log_evaluation(prompt, cached)
+            return cached
+
+    try:
+        result = run_llama_evaluation(prompt)
+    except CircuitOpenError as exc:
+        result = degraded_result(prompt, exc)  # fail fast instead of queueing behind a dead model
+    except TransientLLMError as exc:
+        if self.request.retries < self.max_retries:
+            record_retry("task")
+            raise self.retry(exc=exc, countdown=backoff_delay(self.request.retries, LLM_TASK_RETRY_BASE, LLM_TASK_RETRY_MAX))
+        result = degraded_result(prompt, exc)
+    if isinstance(result, dict):
+        result.setdefault("tier", "llm")
+    if is_cacheable(result):
+        store_cached_evaluation(cache, prompt, key, result)
+    return result
+
+# ✅ Micro-batched evaluation: the rubric instruction is sent once for several prompts
+BATCH_INSTRUCTION = (
+    "\nYou will receive several prompts, each introduced by its number in brackets, e.g. [1].\n"
+    "Evaluate each one independently with the rubric above and return a JSON array with exactly one "
+    "evaluation object per prompt, in the same order. Add an \"index\" field with the prompt's number to every object.\n"
+    "For a prompt that is not medically relevant, use {\"index\": n, \"error\": \"Prompt is not medically relevant.\"}.\n"
+)
+
+def run_llama_batch_evaluation(prompts):
+    """
+    Evaluate several task inputs with one chat call. Returns a list aligned with `prompts`;
+    entries the model skipped or that fail validation are None so they can be retried alone.
+    """
+    user_content = "\n\n".join(f"[{i}]\n{extract_user_prompt(p)}" for i, p in enumerate(prompts, 1))
+    payload = {
+        "model": EVALUATION_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_INSTRUCTION + BATCH_INSTRUCTION},
+            {"role": "user", "content": user_content}
+        ],
+        "max_tokens": 512 * len(prompts),
+        "temperature": EVALUATION_TEMPERATURE,
+    }
+    content = chat_completion(payload)
+    # Some models answer with bare objects instead of an array
+    first_object, first_array = content.find("{"), content.find("[")
+    root = "[" if first_array != -1 and (first_object == -1 or first_array < first_object) else "{"
+    with observe_stage("parse"):
+        parsed = parse_llm_json(content, root=root)
+    if isinstance(parsed, dict):
+        parsed = [parsed]
+    if not isinstance(parsed, list):
+        return [None] * len(prompts)
+
+    by_index = {}
+    for position, item in enumerate(parsed, 1):
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.pop("index", position))
+        except (TypeError, ValueError):
+            index = position
+        by_index.setdefault(index, item)
+
+    results = []
+    for i, orig_prompt in enumerate(prompts, 1):
+        item = by_index.get(i)
+        result = None
+        if item is not None and "not medically relevant" in str(item.get("error", "")).lower():
+            record_rejection("not_relevant")
+            result = non_medical_result(orig_prompt)
+            log_evaluation(orig_prompt, result)
+        elif item is not None:
+            try:
+                result = finish_evaluation(orig_prompt, item)
+            except Exception:
+                result = None
+        results.append(result)
+    return results
+
+def store_task_result(task_id, result):
+    evaluate_with_llama.backend.store_result(task_id, result, states.SUCCESS)
+    publish_task_event(task_id, states.SUCCESS)
+
+@celery.task(bind=True, name="tasks.evaluate_batch_with_llama")
+def evaluate_batch_with_llama(self, items):
+    """
+    `items` is a list of [task_id, prompt, bypass_cache]. Prompts are scored LLM_BATCH_SIZE at a time
+    and each result is stored under its own task id, so /api/task/<task_id> sees a normal evaluation.
+    """
+    cache = get_result_cache()
+    pending = []
+    for task_id, prompt, bypass_cache in items:
+        key = cache_key(prompt, EVALUATION_MODEL, SYSTEM_INSTRUCTION_VERSION, EVALUATION_TEMPERATURE)
+        cached = None if bypass_cache else cached_evaluation(cache, prompt, key)
+        if cached is not None:
+            log_evaluation(prompt, cached)
+            store_task_result(task_id, cached)
+        else:
+            publish_task_event(task_id, states.STARTED)
+            pending.append((task_id, prompt, key))
+
+    fallbacks = 0
+    for start in range(0, len(pending), LLM_BATCH_SIZE):
+        chunk = pending[start:start + LLM_BATCH_SIZE]
+        unavailable = None
+        try:
+            results = run_llama_batch_evaluation([prompt for _, prompt, _ in chunk]) if len(chunk) > 1 else [None]
+        except TransientLLMError as exc:
+            results, unavailable = [None] * len(chunk), exc
+        except Exception:
+            results = [None] * len(chunk)
+        for (task_id, prompt, key), result in zip(chunk, results):
+            batched = result is not None
+            if result is None and unavailable is None:
+                fallbacks += 1
+                try:
+                    result = run_llama_evaluation(prompt)
+                except TransientLLMError as exc:
+                    unavailable = exc
+            if result is None:
+                result = degraded_result(prompt, unavailable)
+            elif batched:
+                result["batched"] = True
+            if isinstance(result, dict):
+                result.setdefault("tier", "llm")
+            if is_cacheable(result):
+                store_cached_evaluation(cache, prompt, key, result)
+            store_task_result(task_id, result)
+
+    return {"count": len(items), "cached": len(items) - len(pending),
+            "batched": len(pending) - fallbacks, "fallbacks": fallbacks}
+
+# A batch that raises or loses its worker process would leave its prompts PENDING, and
+# single-flight would keep attaching identical submissions to them until the claim expires
+@task_failure.connect(sender=evaluate_batch_with_llama)
+def fail_batch_items(args=None, exception=None, **kwargs):
+    items = args[0] if args else []
+    for task_id, _, _ in items:
+        if evaluate_with_llama.AsyncResult(task_id).state in states.READY_STATES:
+            continue
+        evaluate_with_llama.backend.mark_as_failure(task_id, exception)
+        publish_task_event(task_id, states.FAILURE)
@@ -0,0 +1,323 @@
+import json
+import re
+
+import json5
+
+# ✅ Tolerant, single-pass JSON extractor for LLM output.
+# Finds the first balanced top-level object and repairs the usual model mistakes on the way:
+# markdown fences, triple quotes, missing commas/colons, trailing commas, unquoted keys,
+# single-quoted strings, raw newlines inside strings and unclosed brackets.
+# A string cut off by the end of the output is dropped rather than closed, so a truncated
+# completion never yields a half-written suggestion.
+# It can be fed chunk by chunk (token streaming) and reports when the object has closed.
+
+_WS = re.compile(r"[ \t\r\n]*")
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_SINGLE = re.compile(r"'(?:[^'\\]|\\.)*'", re.S)
+_BARE = re.compile(r"[^\s{}\[\],:\"'`]+")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$")
+_JSON5_NUMBER = re.compile(r"[+-]?(?:[\d.]|NaN$|Infinity$)")  # .5, +5, 5., 0x1F, NaN, -Infinity
+_CONTROL = re.compile(r"[\x00-\x1f]")
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Per-container parser states
+KEY, COLON, VALUE, AFTER = "key", "colon", "value", "after"
+
+
+def _escape_controls(raw):
+    return _CONTROL.sub(lambda m: json.dumps(m.group(0))[1:-1], raw)
+
+
+def _json5_number(token):
+    """JSON text for a number only JSON5 allows (.5, +5, 0x1F, NaN, ...), or None."""
+    if not _JSON5_NUMBER.match(token):
+        return None
+    try:
+        value = json5.loads(token)
+    except ValueError:
+        return None
+    return json.dumps(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class IncrementalJSONExtractor:
+    """
+    Feed model output with `feed(chunk)`; it returns True once the first top-level
+    object (or array, with root="[") is complete. `text()` returns the repaired JSON so far,
+    closing anything still open.
+    """
+
+    def __init__(self, root="{"):
+        self.root = root
+        self._buf = ""
+        self._pos = 0
+        self._out = []
+        self._stack = []
+        self._states = []
+        self.started = False
+        self.done = False
+
+    # --- output helpers ----------------------------------------------------
+
+    def _emit_value(self, text, is_string=False, opens=None):
+        state = self._states[-1]
+        container = self._stack[-1]
+        if state == AFTER:
+            # Two values in a row: the model forgot a comma
+            self._out.append(",")
+            state = KEY if container == "{" else VALUE
+        if container == "{":
+            if state == KEY:
+                if opens:
+                    return False  # an object/array where a key belongs: leave it to json5
+                self._out.append(text if is_string else json.dumps(text))
+                self._states[-1] = COLON
+                return True
+            if state == COLON:
+                self._out.append(":")  # "key" value  ->  "key": value
+        self._out.append(text)
+        self._states[-1] = AFTER
+        if opens:
+            self._stack.append(opens)
+            self._states.append(KEY if opens == "{" else VALUE)
+        return True
+
+    def _drop_partial_string(self):
+        """Forget a string the output ended inside of, together with its key when it was a value."""
+        state = self._states[-1]
+        if self._stack[-1] != "{" or state not in (COLON, VALUE):
+            return  # an array element, a key or a stray value: nothing was emitted for it yet
+        if state == VALUE:
+            self._out.pop()  # ":"
+        self._out.pop()  # the key
+        if self._out[-1] == ",":
+            self._out.pop()
+            self._states[-1] = AFTER
+        else:
+            self._states[-1] = KEY
+
+    def _close(self, closer):
+        # Close inner containers the model forgot, then drop dangling commas/keys
+        while self._stack:
+            opener = self._stack[-1]
+            state = self._states[-1]
+            if state == COLON:
+                self._out.append(":null")
+            elif state == VALUE and opener == "{":
+                self._out.append("null")
+            elif self._out and self._out[-1] == ",":
+                self._out.pop()
+            self._out.append(_CLOSERS[opener])
+            self._stack.pop()
+            self._states.pop()
+            if closer is None or _CLOSERS[opener] == closer:
+                break
+        if not self._stack:
+            self.done = True
+
+    # --- tokenizer ---------------------------------------------------------
+
+    def feed(self, chunk, final=False):
+        if self.done:
+            return True
+        self._buf += chunk
+        buf = self._buf
+        pos = self._pos
+        end = len(buf)
+
+        while pos < end and not self.done:
+            if not self.started:
+                start = buf.find(self.root, pos)
+                if start == -1:
+                    pos = end
+                    break
+                self.started = True
+                self._out.append(self.root)
+                self._stack.append(self.root)
+                self._states.append(KEY if self.root == "{" else VALUE)
+                pos = start + 1
+                continue
+
+            pos = _WS.match(buf, pos).end()
+            if pos >= end:
+                break
+            c = buf[pos]
+
+            if c == "`":
+                fence_end = pos
+                while fence_end < end and buf[fence_end] == "`":
+                    fence_end += 1
+                if buf.startswith("json", fence_end):
+                    fence_end += 4
+                elif fence_end + 4 > end and not final and "json".startswith(buf[fence_end:end]):
+                    break  # maybe "```js" split across chunks
+                pos = fence_end
+                continue
+
+            if c == '"':
+                if buf.startswith('"""', pos):
+                    close = buf.find('"""', pos + 3)
+                    if close == -1:
+                        if not final:
+                            break
+                        self._drop_partial_string()
+                        pos = end
+                        continue
+                    self._emit_value(json.dumps(buf[pos + 3:close]), is_string=True)
+                    pos = close + 3
+                    continue
+                if end - pos < 3 and not final:
+                    break  # could still become a triple quote
+                m = _STRING.match(buf, pos)
+                if m is None:
+                    if not final:
+                        break
+                    self._drop_partial_string()
+                    pos = end
+                    continue
+                self._emit_value(_escape_controls(m.group(0)), is_string=True)
+                pos = m.end()
+                continue
+
+            if c == "'":
+                m = _SINGLE.match(buf, pos)
+                if m is None:
+                    if not final:
+                        break
+                    self._drop_partial_string()
+                    pos = end
+                    continue
+                inner = m.group(0)[1:-1]
+                pos = m.end()
+                self._emit_value(json.dumps(inner.replace("\\'", "'")), is_string=True)
+                continue
+
+            if c in "{[":
+                if not self._emit_value(c, opens=c):
+                    self._out.append("\x00")  # poison: force the json5 fallback
+                    self.done = True
+                    break
+                pos += 1
+                continue
+
+            if c in "}]":
+                self._close(c)
+                pos += 1
+                continue
+
+            if c == ",":
+                if self._states[-1] == AFTER:
+                    self._out.append(",")
+                    self._states[-1] = KEY if self._stack[-1] == "{" else VALUE
+                pos += 1
+                continue
+
+            if c == ":":
+                if self._states[-1] == COLON:
+                    self._out.append(":")
+                    self._states[-1] = VALUE
+                pos += 1
+                continue
+
+            if c == "/" and buf.startswith(("//", "/*"), pos):
+                stop = buf.find("\n" if buf[pos + 1] == "/" else "*/", pos + 2)
+                if stop == -1:
+                    if not final:
+                        break
+                    stop = end
+                pos = stop + (1 if buf[pos + 1] == "/" else 2)
+                continue
+
+            m = _BARE.match(buf, pos)
+            if m.end() == end and not final:
+                break  # the literal may continue in the next chunk
+            token = m.group(0)
+            pos = m.end()
+            if self._states[-1] == KEY:
+                self._emit_value(token)
+            elif token in _LITERALS:
+                self._emit_value(_LITERALS[token], is_string=True)
+            elif _NUMBER.match(token):
+                self._emit_value(token, is_string=True)
+            else:
+                self._emit_value(_json5_number(token) or json.dumps(token), is_string=True)
+
+        # Keep only the unconsumed tail so long streams do not grow the buffer
+        self._buf = buf[pos:]
+        self._pos = 0
+        return self.done
+
+    def finish(self):
+        """Flush any partial token at end of input and close open containers."""
+        if not self.done:
+            self.feed("", final=True)
+        if self._stack:
+            self._close(None)
+            while self._stack:
+                self._close(None)
+        return self.text()
+
+    def text(self):
+        if not self.started:
+            return ""
+        if self._stack:
+            # Close a copy so text() can be called mid-stream
+            clone = IncrementalJSONExtractor(self.root)
+            clone._out, clone._stack, clone._states = list(self._out), list(self._stack), list(self._states)
+            clone.started = True
+            while clone._stack:
+                clone._close(None)
+            return "".join(clone._out)
+        return "".join(self._out)
+
+
+def extract_json_text(text, root="{"):
+    """Single pass over `text`: repaired JSON of its first top-level object ('' if there is none)."""
+    extractor = IncrementalJSONExtractor(root)
+    extractor.feed(text)
+    return extractor.finish()
+
+
+# ✅ Legacy multi-pass repair chain, kept as the json5 fallback path
+def clean_llm_output(text):
+    text = re.sub(r'```(?:json)?|```', '', text)
+    text = text.replace('"""', '')
+    first_brace = text.find('{')
+    last_brace = text.rfind('}')
+    if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
+        text = text[first_brace:last_brace + 1]
+    return text
+
+
+def repair_llm_json(text):
+    return re.sub(r'(\d+)\s*(")', r'\1,\n\2', text)
+
+
+def auto_close_json(text):
+    open_braces = text.count("{")
+    close_braces = text.count("}")
+    open_brackets = text.count("[")
+    close_brackets = text.count("]")
+    while close_brackets < open_brackets:
+        text += "]"
+        close_brackets += 1
+    while close_braces < open_braces:
+        text += "}"
+        close_braces += 1
+    return text
+
+
+def parse_llm_json(text, root="{"):
+    """Parse model output: fast single-pass extractor + json.loads, json5 over the legacy chain if that fails."""
+    fast = extract_json_text(text, root)
+    if fast:
+        try:
+            return json.loads(fast)
+        except ValueError:
+            pass
+    if root == "[":
+        start, end = text.find("["), text.rfind("]")
+        if start != -1:
+            text = text[start:end + 1] if end > start else text[start:]
+        return json5.loads(auto_close_json(repair_llm_json(text)))
+    return json5.loads(auto_close_json(repair_llm_json(clean_llm_output(text))))
@@ -0,0 +1,166 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+# ✅ Result cache settings, overridable from .env
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "auto")  # "auto", "memory", "redis" or "off"
+LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL") or os.getenv("CELERY_RESULT_BACKEND", "")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+KEY_PREFIX = "llmcache:"
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace so trivially reformatted prompts share a cache entry."""
+    return " ".join(str(prompt).split())
+
+
+def cache_key(prompt, model, instruction_version, temperature):
+    raw = json.dumps([normalize_prompt(prompt), model, instruction_version, float(temperature)], ensure_ascii=False)
+    return KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(result):
+    # Only keep finished evaluations; crashes, timeouts and regex stand-ins should be retried next time
+    return (isinstance(result, dict) and result.get("error") != "Exception during evaluation"
+            and not result.get("degraded"))
+
+
+def _counter_fields(counter):
+    # Exact lookups feed hits/misses; near-duplicate probes (similarity_cache) are counted apart
+    return ("hits", "misses") if counter == "exact" else (f"{counter}_hits", f"{counter}_misses")
+
+
+def _stats(backend, counts, size):
+    hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+    total = hits + misses
+    return {"backend": backend, "hits": hits, "misses": misses, "size": size,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "similar_hits": counts.get("similar_hits", 0), "similar_misses": counts.get("similar_misses", 0)}
+
+
+class NullCache:
+    backend = "off"
+
+    def get(self, key, counter="exact"):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def stats(self):
+        return _stats(self.backend, {}, 0)
+
+
+class LRUCache:
+    """In-process LRU with per-entry TTL; entries are deep-copied in and out."""
+    backend = "memory"
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.counts = {}
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, counter="exact"):
+        hit_field, miss_field = _counter_fields(counter)
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self._data[key]
+                item = None
+            if item is None:
+                self.counts[miss_field] = self.counts.get(miss_field, 0) + 1
+                return None
+            self._data.move_to_end(key)
+            self.counts[hit_field] = self.counts.get(hit_field, 0) + 1
+            return copy.deepcopy(item[1])
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return _stats(self.backend, self.counts, len(self._data))
+
+
+class RedisCache:
+    """
+    Shared cache in Redis: values expire after `ttl` seconds, and a sorted set of
+    insertion times evicts the oldest keys beyond `max_entries`. Counters live in a hash
+    so every worker and the Flask app see the same hit rate.
+    """
+    backend = "redis"
+
+    def __init__(self, url, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self.client = redis.Redis.from_url(url)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.index_key = KEY_PREFIX + "index"
+        self.stats_key = KEY_PREFIX + "stats"
+
+    def get(self, key, counter="exact"):
+        hit_field, miss_field = _counter_fields(counter)
+        # A cache outage must never fail an evaluation: treat it as a miss
+        try:
+            raw = self.client.get(key)
+            self.client.hincrby(self.stats_key, hit_field if raw is not None else miss_field, 1)
+        except redis.RedisError:
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        try:
+            self._set(key, value)
+        except redis.RedisError:
+            pass
+
+    def _set(self, key, value):
+        pipe = self.client.pipeline()
+        pipe.set(key, json.dumps(value, ensure_ascii=False), ex=max(1, int(self.ttl)))
+        pipe.zadd(self.index_key, {key: time.time()})
+        # Forget index members whose values already expired, then trim to the size cap
+        pipe.zremrangebyscore(self.index_key, "-inf", time.time() - self.ttl)
+        pipe.zcard(self.index_key)
+        size = pipe.execute()[-1]
+        if size > self.max_entries:
+            evicted = self.client.zpopmin(self.index_key, size - self.max_entries)
+            if evicted:
+                self.client.delete(*[member for member, _ in evicted])
+
+    def stats(self):
+        counters = {field.decode(): int(value) for field, value in self.client.hgetall(self.stats_key).items()}
+        return _stats(self.backend, counters, self.client.zcard(self.index_key))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide cache chosen by LLM_CACHE_BACKEND ("auto" uses Redis when a redis:// URL is configured)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend = LLM_CACHE_BACKEND
+                if backend == "auto":
+                    backend = "redis" if LLM_CACHE_REDIS_URL.startswith(("redis://", "rediss://")) else "memory"
+                if backend == "redis":
+                    _cache = RedisCache(LLM_CACHE_REDIS_URL)
+                elif backend == "off":
+                    _cache = NullCache()
+                else:
+                    _cache = LRUCache()
+    return _cache
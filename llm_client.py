@@ -0,0 +1,415 @@
+import asyncio
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LLM_LATENCY, record_retry
+from tracing import begin_span, finish_span, tracing_enabled
+
+# ✅ Shared Ollama client settings, overridable from .env
+OLLAMA_CHAT_URL = os.getenv("OLLAMA_CHAT_URL", "http://localhost:11434/v1/chat/completions")
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3.05"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "60"))
+OLLAMA_MAX_INFLIGHT = int(os.getenv("OLLAMA_MAX_INFLIGHT", "256"))  # async calls in flight per event loop
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))  # Ollama's slot count; sizes the Celery worker pool
+OLLAMA_SLOT_LIMIT = int(os.getenv("OLLAMA_SLOT_LIMIT", "0"))  # sync calls in flight per process (0 = no cap; the worker uses OLLAMA_NUM_PARALLEL)
+OLLAMA_SLOT_TIMEOUT = float(os.getenv("OLLAMA_SLOT_TIMEOUT", "30"))  # seconds to wait for a slot before LLMBusyError
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "2"))  # in-call retries of transient failures
+OLLAMA_BACKOFF_BASE = float(os.getenv("OLLAMA_BACKOFF_BASE", "0.5"))
+OLLAMA_BACKOFF_MAX = float(os.getenv("OLLAMA_BACKOFF_MAX", "8"))
+OLLAMA_BREAKER_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "5"))  # consecutive transient failures that open it
+OLLAMA_BREAKER_COOLDOWN = float(os.getenv("OLLAMA_BREAKER_COOLDOWN", "30"))  # seconds before a probe call is let through
+
+# Statuses that mean "busy or briefly down" rather than "bad request"
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class TransientLLMError(LLMError):
+    """Timeout, connection failure or overload: worth retrying later."""
+
+
+class CircuitOpenError(TransientLLMError):
+    """Raised without contacting Ollama while the circuit breaker is open."""
+
+
+class LLMBusyError(TransientLLMError):
+    """No local slot (OLLAMA_SLOT_LIMIT) freed up within OLLAMA_SLOT_TIMEOUT; Ollama was not contacted."""
+
+
+def is_transient(exc):
+    if isinstance(exc, TransientLLMError):
+        return True
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                        httpx.TransportError)):
+        return True
+    if isinstance(exc, (requests.HTTPError, httpx.HTTPStatusError)):
+        return getattr(exc.response, "status_code", None) in TRANSIENT_STATUS
+    return False
+
+
+def backoff_delay(attempt, base=OLLAMA_BACKOFF_BASE, cap=OLLAMA_BACKOFF_MAX):
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive transient failures; while open every call fails fast
+    with CircuitOpenError. After `cooldown` seconds a single probe call is let through
+    (half-open): success closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(self, threshold=OLLAMA_BREAKER_THRESHOLD, cooldown=OLLAMA_BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def before_call(self):
+        """Raises CircuitOpenError while open; returns True when this call is the half-open probe."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(f"Ollama circuit open; retrying in {max(remaining, 0):.0f}s")
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """The probe ended without an answer (cancelled, interrupted): let the next call probe instead."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def is_open(self):
+        return self.state != "closed"
+
+
+breaker = CircuitBreaker()
+
+
+@contextlib.contextmanager
+def _timed(mode):
+    """Observe one Ollama call in ollama_request_duration_seconds (labelled by how it ended) and as a span."""
+    start = time.perf_counter()
+    outcome = "error"
+    span, token = begin_span(f"ollama.{mode}", kind="client") if tracing_enabled() else (None, None)
+    try:
+        yield
+        outcome = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "stopped"  # the caller closed the stream early
+        raise
+    except Exception as exc:
+        outcome = "transient" if is_transient(exc) else "error"
+        if span is not None:
+            span.record_error(exc)
+        raise
+    finally:
+        LLM_LATENCY.labels(mode, outcome).observe(time.perf_counter() - start)
+        if span is not None:
+            span.set_attribute("outcome", outcome)
+            finish_span(span, token)
+
+
+_local = {"pid": None, "session": None, "inflight": None}
+_lock = threading.Lock()
+_slot_limit = OLLAMA_SLOT_LIMIT
+
+
+def _new_session():
+    session = requests.Session()
+    # pool_block=True caps open sockets to the model server at OLLAMA_POOL_SIZE per process;
+    # extra callers wait for a free keep-alive connection instead of opening new ones
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=OLLAMA_POOL_SIZE, pool_block=True, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_session():
+    """Keep-alive session shared by every Ollama call in this process (re-created after fork)."""
+    pid = os.getpid()
+    if _local["pid"] != pid:
+        with _lock:
+            if _local["pid"] != pid:
+                _local["session"] = _new_session()
+                _local["inflight"] = threading.BoundedSemaphore(_slot_limit) if _slot_limit > 0 else None
+                _local["pid"] = pid
+    return _local["session"]
+
+
+def set_slot_limit(limit):
+    """
+    Cap concurrent sync calls in this process (0 removes the cap). The Celery worker sets it
+    to OLLAMA_NUM_PARALLEL at startup; web processes stay uncapped unless OLLAMA_SLOT_LIMIT is set.
+    """
+    global _slot_limit
+    with _lock:
+        _slot_limit = max(0, int(limit))
+        _local["inflight"] = threading.BoundedSemaphore(_slot_limit) if _slot_limit > 0 else None
+
+
+@contextlib.contextmanager
+def inflight_slots():
+    """
+    Hold one of this process's slots for the duration of a sync call. Threads beyond the
+    limit wait here instead of piling up in Ollama's own queue, for at most OLLAMA_SLOT_TIMEOUT.
+    """
+    get_session()
+    slots = _local["inflight"]
+    if slots is None:
+        yield
+        return
+    if not slots.acquire(timeout=OLLAMA_SLOT_TIMEOUT):
+        raise LLMBusyError(f"No free Ollama slot after {OLLAMA_SLOT_TIMEOUT:.0f}s")
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+def _with_retries(call):
+    """Run `call()` through the breaker, retrying transient failures with jittered exponential backoff."""
+    for attempt in range(OLLAMA_RETRIES + 1):
+        probe = breaker.before_call()
+        try:
+            result = call()
+        except Exception as exc:
+            if not is_transient(exc):
+                breaker.record_success()  # Ollama answered; the request itself was bad
+                raise
+            breaker.record_failure()
+            if attempt >= OLLAMA_RETRIES or breaker.is_open():
+                raise TransientLLMError(f"Ollama request failed: {exc}") from exc
+            record_retry("client")
+            time.sleep(backoff_delay(attempt))
+        except BaseException:
+            if probe:
+                breaker.release_probe()  # e.g. a cancelled stream relay; otherwise the breaker stays half-open
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+def post_json(url, payload, timeout=None):
+    timeout = timeout or (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+
+    def call():
+        with _timed("json"):
+            res = get_session().post(url, json=payload, timeout=timeout)
+            res.raise_for_status()
+        return res.json()
+
+    # The slot is taken outside the retry loop: waiting for it says nothing about Ollama's health
+    with inflight_slots():
+        return _with_retries(call)
+
+
+def chat_completion(payload, url=None, timeout=None):
+    """POST an OpenAI-style chat payload and return the first choice's message content."""
+    data = post_json(url or OLLAMA_CHAT_URL, payload, timeout)
+    return data["choices"][0]["message"]["content"]
+
+
+def _stream_delta(line):
+    """Text carried by one streamed line: OpenAI-style SSE (`data: {...}`) or Ollama's native NDJSON."""
+    if line.startswith(b"data:"):
+        line = line[5:].strip()
+        if line == b"[DONE]":
+            return None
+    elif not line.startswith(b"{"):
+        return ""  # SSE comments, keep-alives
+    chunk = json.loads(line)
+    choices = chunk.get("choices")
+    if choices:
+        return (choices[0].get("delta") or choices[0].get("message") or {}).get("content") or ""
+    if "message" in chunk:
+        return chunk["message"].get("content") or ""
+    return chunk.get("response") or ""
+
+
+def iter_chat_completion(payload, url=None, timeout=None):
+    """
+    Yield the text deltas of a `stream: true` chat completion. Closing the generator early
+    closes the HTTP response, which makes Ollama abort the generation.
+    """
+    timeout = timeout or (OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+
+    def open_stream():
+        res = get_session().post(url or OLLAMA_CHAT_URL, json=dict(payload, stream=True), timeout=timeout, stream=True)
+        try:
+            res.raise_for_status()
+        except Exception:
+            res.close()
+            raise
+        return res
+
+    # Only opening the stream is retried; once tokens flow, a failure is reported to the caller
+    with inflight_slots(), _timed("stream"), _with_retries(open_stream) as res:
+        try:
+            for line in res.iter_lines():
+                delta = _stream_delta(line.strip()) if line else ""
+                if delta is None:
+                    return
+                if delta:
+                    yield delta
+        except requests.RequestException as exc:
+            breaker.record_failure()
+            raise TransientLLMError(f"Ollama stream failed: {exc}") from exc
+
+
+def stream_chat_completion(payload, url=None, timeout=None, stop=None):
+    """
+    Like chat_completion, but streamed: each delta is passed to `stop(delta)` and the
+    generation is cut off once it returns True. Returns the content received so far.
+    """
+    parts = []
+    deltas = iter_chat_completion(payload, url, timeout)
+    try:
+        for delta in deltas:
+            parts.append(delta)
+            if stop is not None and stop(delta):
+                break
+    finally:
+        deltas.close()
+    return "".join(parts)
+
+
+# ✅ Async client for the ASGI routes: one httpx.AsyncClient and semaphore per event loop
+_async_state = weakref.WeakKeyDictionary()
+
+
+def _get_async_state():
+    loop = asyncio.get_running_loop()
+    state = _async_state.get(loop)
+    if state is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT, pool=None),
+            limits=httpx.Limits(max_connections=OLLAMA_MAX_INFLIGHT, max_keepalive_connections=OLLAMA_POOL_SIZE),
+        )
+        state = _async_state[loop] = (client, asyncio.Semaphore(OLLAMA_MAX_INFLIGHT))
+    return state
+
+
+def get_async_client():
+    return _get_async_state()[0]
+
+
+async def _async_with_retries(call):
+    """Async twin of _with_retries; backoff sleeps do not block the event loop."""
+    for attempt in range(OLLAMA_RETRIES + 1):
+        probe = breaker.before_call()
+        try:
+            result = await call()
+        except Exception as exc:
+            if not is_transient(exc):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt >= OLLAMA_RETRIES or breaker.is_open():
+                raise TransientLLMError(f"Ollama request failed: {exc}") from exc
+            record_retry("client")
+            await asyncio.sleep(backoff_delay(attempt))
+        except BaseException:
+            if probe:
+                breaker.release_probe()  # e.g. a cancelled stream relay; otherwise the breaker stays half-open
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+async def async_post_json(url, payload, timeout=None):
+    client, inflight = _get_async_state()
+
+    async def call():
+        async with inflight:
+            with _timed("json"):
+                res = await client.post(url, json=payload, timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+                res.raise_for_status()
+        return res.json()
+
+    return await _async_with_retries(call)
+
+
+async def async_chat_completion(payload, url=None, timeout=None):
+    """Async twin of chat_completion; at most OLLAMA_MAX_INFLIGHT calls wait on Ollama at once."""
+    data = await async_post_json(url or OLLAMA_CHAT_URL, payload, timeout)
+    return data["choices"][0]["message"]["content"]
+
+
+async def async_iter_chat_completion(payload, url=None, timeout=None):
+    """Async twin of iter_chat_completion; holds one OLLAMA_MAX_INFLIGHT slot until the stream ends."""
+    client, inflight = _get_async_state()
+
+    async def open_stream():
+        request = client.build_request("POST", url or OLLAMA_CHAT_URL, json=dict(payload, stream=True),
+                                       timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+        res = await client.send(request, stream=True)
+        try:
+            res.raise_for_status()
+        except Exception:
+            await res.aclose()
+            raise
+        return res
+
+    async with inflight:
+        with _timed("stream"):
+            res = await _async_with_retries(open_stream)
+            try:
+                async for line in res.aiter_lines():
+                    line = line.strip()
+                    delta = _stream_delta(line.encode("utf-8")) if line else ""
+                    if delta is None:
+                        return
+                    if delta:
+                        yield delta
+            except httpx.TransportError as exc:
+                breaker.record_failure()
+                raise TransientLLMError(f"Ollama stream failed: {exc}") from exc
+            finally:
+                await res.aclose()
+
+
+async def aclose_async_client():
+    state = _async_state.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state[0].aclose()
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+from log_reader import iter_log_entries, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# ✅ Sidecar index for JSONL logs: one fixed-size record per line
+# (byte offset, line length, timestamp, score, model hash), kept next to the log as "<log>.idx"
+INDEX_MAGIC = b"MPALIDX1"
+HEADER = struct.Struct("<8sIQ")        # magic, crc32 of the log's first line, length of that line
+RECORD = struct.Struct("<QIddQ")       # offset, length, epoch seconds, score, model hash
+EPOCH = datetime(1970, 1, 1)
+NAN = float("nan")
+
+# Buffered writers in several processes can flush a few seconds out of order,
+# so time lookups start this many seconds early and filter exactly afterwards
+LOG_INDEX_SKEW = float(os.getenv("LOG_INDEX_SKEW", "10"))
+
+
+def model_hash(model):
+    return int.from_bytes(hashlib.blake2b(str(model).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def to_epoch(dt):
+    return (dt - EPOCH).total_seconds()
+
+
+def _first_line_signature(path):
+    with open(path, "rb") as f:
+        line = f.readline()
+    if not line.endswith(b"\n"):
+        return 0, 0
+    return zlib.crc32(line), len(line)
+
+
+def _record_for(offset, line):
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        entry = None
+    if not isinstance(entry, dict):
+        return RECORD.pack(offset, len(line), NAN, NAN, 0)
+    ts = parse_timestamp(entry.get("timestamp"))
+    try:
+        score = float(entry.get("score", 0))
+    except (TypeError, ValueError):
+        score = NAN
+    return RECORD.pack(offset, len(line), to_epoch(ts) if ts else NAN, score, model_hash(entry.get("model")))
+
+
+class LogIndex:
+    """
+    Append-maintained byte-offset index of a JSONL log.
+    `refresh()` indexes lines appended since the last call and rebuilds the sidecar
+    when it is missing, corrupt or belongs to a different (rotated/truncated) log file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._lock = threading.Lock()
+        self._signature = None
+        self._reset_order()
+
+    def _reset_order(self):
+        self._checked = 0
+        self._max_epoch = -math.inf
+        self._monotonic = True
+
+    # --- maintenance -------------------------------------------------------
+
+    def refresh(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                return 0
+            try:
+                signature = _first_line_signature(self.path)
+                if signature != self._signature:
+                    self._signature = signature
+                    self._reset_order()
+                if not self._is_current(signature):
+                    self._rebuild(signature)
+                else:
+                    self._catch_up()
+            except OSError:
+                logger.exception("Failed to refresh log index %s", self.index_path)
+            return len(self)
+
+    def _is_current(self, signature):
+        try:
+            with open(self.index_path, "rb") as f:
+                header = f.read(HEADER.size)
+                if len(header) != HEADER.size:
+                    return False
+                magic, crc, first_len = HEADER.unpack(header)
+                if magic != INDEX_MAGIC or (crc, first_len) != signature:
+                    return False
+                size = os.fstat(f.fileno()).st_size - HEADER.size
+                if size % RECORD.size:
+                    return False
+                if size:
+                    f.seek(HEADER.size + size - RECORD.size)
+                    offset, length, _, _, _ = RECORD.unpack(f.read(RECORD.size))
+                    if offset + length > os.path.getsize(self.path):
+                        return False
+        except OSError:
+            return False
+        return True
+
+    def _scan(self, start):
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written tail line
+                if line.strip():
+                    records.append(_record_for(offset, line))
+                offset += len(line)
+        return records
+
+    def _rebuild(self, signature):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(INDEX_MAGIC, *signature))
+            f.write(b"".join(self._scan(0)))
+        os.replace(tmp_path, self.index_path)
+
+    def _catch_up(self):
+        with open(self.index_path, "r+b") as f:
+            count = (os.fstat(f.fileno()).st_size - HEADER.size) // RECORD.size
+            start = 0
+            if count:
+                f.seek(HEADER.size + (count - 1) * RECORD.size)
+                offset, length, _, _, _ = RECORD.unpack(f.read(RECORD.size))
+                start = offset + length
+            if start >= os.path.getsize(self.path):
+                return
+            records = self._scan(start)
+            if records:
+                # Records land at fixed positions, so concurrent refreshers write identical bytes
+                f.seek(HEADER.size + count * RECORD.size)
+                f.write(b"".join(records))
+
+    # --- queries -----------------------------------------------------------
+
+    def __len__(self):
+        try:
+            return max(0, (os.path.getsize(self.index_path) - HEADER.size) // RECORD.size)
+        except OSError:
+            return 0
+
+    def open(self):
+        return IndexView(self.index_path)
+
+    def monotonic(self):
+        """
+        False once a timestamp falls more than LOG_INDEX_SKEW behind an earlier one, as naive
+        local timestamps do when DST ends. Time lookups by binary search are only valid while True.
+        Checked incrementally, so each call only reads the records added since the last one.
+        """
+        with self._lock:
+            if not self._monotonic:
+                return False
+            try:
+                view = self.open()
+            except OSError:
+                return False
+            with view:
+                if view.count < self._checked:
+                    self._reset_order()
+                for i in range(self._checked, view.count):
+                    epoch = view.record(i)[2]
+                    if epoch != epoch:
+                        continue
+                    if epoch < self._max_epoch - LOG_INDEX_SKEW:
+                        self._monotonic = False
+                        break
+                    self._max_epoch = max(self._max_epoch, epoch)
+                self._checked = view.count
+            return self._monotonic
+
+
+class IndexView:
+    """Read-only mmap view over the records of an index file."""
+
+    def __init__(self, index_path):
+        self._file = open(index_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.count = max(0, (size - HEADER.size) // RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    def record(self, i):
+        """Return (offset, length, epoch, score, model_hash) of record `i`."""
+        return RECORD.unpack_from(self._map, HEADER.size + i * RECORD.size)
+
+    def _bisect(self, field, value):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = self.record(mid)[field]
+            if key != key:  # NaN timestamp: treat as earlier than anything
+                lo = mid + 1
+            elif key < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def first_at_offset(self, offset):
+        """Index of the first record whose line starts at or after byte `offset`."""
+        return self._bisect(0, offset)
+
+    def first_at_time(self, epoch):
+        """Index of the first record at or after `epoch` (minus LOG_INDEX_SKEW), by binary search."""
+        return self._bisect(2, epoch - LOG_INDEX_SKEW)
+
+
+def iter_indexed_entries(path, after=0, log_filter=None, index=None):
+    """
+    Like log_reader.iter_log_entries, but uses the sidecar index to seek to the
+    requested window and to skip lines whose model/score/time cannot match.
+    Yields (next_offset, entry) for candidate lines; callers still apply `log_filter`.
+    Time-based seeking is skipped when the timestamps are not in order (see LogIndex.monotonic).
+    """
+    index = index or get_log_index(path)
+    if not index.refresh():
+        # Empty log, or the sidecar could not be written: fall back to a linear scan
+        yield from iter_log_entries(path, after)
+        return
+    with index.open() as view, open(path, "rb") as f:
+        if not len(view):
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = view.first_at_offset(max(0, after))
+            since = until = wanted_model = None
+            ordered = log_filter is not None and index.monotonic()
+            if log_filter is not None:
+                if log_filter.since is not None and ordered:
+                    since = to_epoch(log_filter.since)
+                    start = max(start, view.first_at_time(since))
+                if log_filter.until is not None and ordered:
+                    until = to_epoch(log_filter.until) + LOG_INDEX_SKEW
+                if log_filter.model is not None:
+                    wanted_model = model_hash(log_filter.model)
+            for i in range(start, len(view)):
+                offset, length, epoch, score, model = view.record(i)
+                if until is not None and epoch == epoch and epoch > until:
+                    return
+                if log_filter is not None and not _may_match(log_filter, wanted_model, epoch, score, model):
+                    continue
+                try:
+                    entry = json.loads(data[offset:offset + length])
+                except ValueError:
+                    continue
+                yield offset + length, entry
+        finally:
+            data.close()
+
+
+def _may_match(log_filter, wanted_model, epoch, score, model):
+    if wanted_model is not None and model != wanted_model:
+        return False
+    if log_filter.min_score is not None and not score >= log_filter.min_score:
+        return False
+    if log_filter.max_score is not None and not score <= log_filter.max_score:
+        return False
+    if log_filter.since is not None and not math.isnan(epoch) and epoch < to_epoch(log_filter.since):
+        return False
+    return True
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_log_index(path):
+    """Shared index per log file path for this process."""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LogIndex(path)
+        return index
+
+
+if __name__ == "__main__":
+    # python log_index.py logs.jsonl logs/evaluations.jsonl  -> (re)build and report
+    for log_path in sys.argv[1:] or ["logs.jsonl", os.path.join("logs", "evaluations.jsonl")]:
+        print(f"{log_path}: {get_log_index(log_path).refresh()} records indexed")
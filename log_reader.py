@@ -0,0 +1,112 @@
+import json
+import os
+from datetime import datetime, timezone
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO-8601 timestamp (as written by the loggers) into naive UTC, or return None.
+    Values with an offset are converted to UTC; values without one are taken to be UTC already.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class LogFilter:
+    """Server-side filter on model, score range and time window."""
+
+    def __init__(self, model=None, min_score=None, max_score=None, since=None, until=None):
+        self.model = model
+        self.min_score = min_score
+        self.max_score = max_score
+        self.since = since
+        self.until = until
+
+    def matches(self, entry):
+        if self.model is not None and entry.get("model") != self.model:
+            return False
+        if self.min_score is not None or self.max_score is not None:
+            try:
+                score = float(entry.get("score", 0))
+            except (TypeError, ValueError):
+                return False
+            if self.min_score is not None and score < self.min_score:
+                return False
+            if self.max_score is not None and score > self.max_score:
+                return False
+        if self.since is not None or self.until is not None:
+            ts = parse_timestamp(entry.get("timestamp"))
+            if ts is None:
+                return False
+            if self.since is not None and ts < self.since:
+                return False
+            if self.until is not None and ts > self.until:
+                return False
+        return True
+
+
+def iter_log_entries(path, after=0, log_filter=None):
+    """
+    Stream entries of a JSONL log starting at byte offset `after`.
+    Yields (next_offset, entry) one line at a time; `next_offset` is the cursor to resume from.
+    `log_filter` is accepted for parity with log_index.iter_indexed_entries; callers apply it.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        offset = max(0, after)
+        if offset:
+            # A cursor that does not sit on a line boundary is moved to the next full line
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                offset += len(f.readline())
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if not line.endswith(b"\n"):
+                # Partially written tail line; it will be picked up by the next read
+                return
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            yield offset, entry
+
+
+def read_log_page(path, after=0, limit=100, log_filter=None, source=iter_log_entries):
+    """
+    Return (entries, next_cursor, has_more) holding at most `limit` entries in memory.
+    `has_more` is only True when another matching entry exists, so an exactly full last page ends the listing.
+    """
+    entries = []
+    cursor = max(0, after)
+    for offset, entry in source(path, after, log_filter):
+        if log_filter is not None and not log_filter.matches(entry):
+            cursor = offset
+            continue
+        if len(entries) >= limit:
+            return entries, cursor, True
+        entries.append(entry)
+        cursor = offset
+    return entries, cursor, False
+
+
+def stream_log_entries(path, after=0, limit=None, log_filter=None, source=iter_log_entries):
+    """Generator of matching entries, never holding more than one line in memory."""
+    count = 0
+    for _, entry in source(path, after, log_filter):
+        if log_filter is not None and not log_filter.matches(entry):
+            continue
+        yield entry
+        count += 1
+        if limit is not None and count >= limit:
+            return
@@ -0,0 +1,289 @@
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from log_index import LOG_INDEX_SKEW, iter_indexed_entries, to_epoch
+from log_reader import parse_timestamp
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# ✅ Rotation settings, overridable from .env (0 disables a threshold)
+LOG_ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", str(50 * 1024 * 1024)))
+LOG_ROTATE_INTERVAL = float(os.getenv("LOG_ROTATE_INTERVAL", "86400"))
+LOG_COMPRESSION = os.getenv("LOG_COMPRESSION", "gzip")  # "gzip" or "zstd"
+LOCK_STALE_AFTER = 300
+ROTATE_SETTLE = 0.2  # seconds the renamed log must stop growing before it is removed
+
+
+def manifest_path(path):
+    return path + ".manifest.json"
+
+
+def load_manifest(path):
+    try:
+        with open(manifest_path(path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault("segments", [])
+    return manifest
+
+
+def _save_manifest(path, manifest):
+    tmp_path = f"{manifest_path(path)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path(path))
+
+
+def active_base_offset(manifest):
+    """Global offset of the first byte of the active (uncompressed) log file."""
+    if not manifest["segments"]:
+        return 0
+    last = manifest["segments"][-1]
+    return last["start"] + last["size"]
+
+
+class _RotationLock:
+    # Lock file created with O_EXCL so it works across processes on Windows and POSIX
+    def __init__(self, path):
+        self.lock_path = path + ".rotate.lock"
+        self.fd = None
+
+    def __enter__(self):
+        try:
+            self.fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(self.lock_path) > LOCK_STALE_AFTER:
+                    os.remove(self.lock_path)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            os.close(self.fd)
+            os.remove(self.lock_path)
+
+
+def _compression():
+    if LOG_COMPRESSION == "zstd":
+        if zstandard is not None:
+            return "zstd"
+        logger.warning("LOG_COMPRESSION=zstd but 'zstandard' is not installed; using gzip")
+    return "gzip"
+
+
+def _open_segment(path, compression):
+    if compression == "zstd":
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _compress(src, compression):
+    dest = src + (".zst" if compression == "zstd" else ".gz")
+    count = size = 0
+    first_ts = last_ts = None
+    earliest = latest = None
+    with open(src, "rb") as f_in:
+        if compression == "zstd":
+            f_out = zstandard.ZstdCompressor().stream_writer(open(dest + ".tmp", "wb"), closefd=True)
+        else:
+            f_out = gzip.open(dest + ".tmp", "wb")
+        with f_out:
+            for line in f_in:
+                if not line.endswith(b"\n"):
+                    break  # a write still in progress; it is carried over with the tail
+                f_out.write(line)
+                size += len(line)
+                if not line.strip():
+                    continue
+                count += 1
+                try:
+                    ts = json.loads(line).get("timestamp")
+                except (ValueError, AttributeError):
+                    continue
+                # Earliest and latest rather than first and last line: local timestamps
+                # go back when DST ends, and the window check needs true bounds
+                parsed = parse_timestamp(ts)
+                if parsed is None:
+                    continue
+                if earliest is None or parsed < earliest:
+                    earliest, first_ts = parsed, ts
+                if latest is None or parsed > latest:
+                    latest, last_ts = parsed, ts
+    os.replace(dest + ".tmp", dest)
+    return dest, size, count, first_ts, last_ts
+
+
+def _append_range(src, start, end, dest):
+    with open(src, "rb") as f_in, open(dest, "ab") as f_out:
+        f_in.seek(start)
+        f_out.write(f_in.read(end - start))
+
+
+def _move_tail(src, offset, dest):
+    """
+    Move what other processes appended to `src` after `offset` into `dest`, until `src` has not
+    grown for ROTATE_SETTLE seconds. Writers in other processes (Flask, gunicorn workers, Celery)
+    do not take the rotation lock; a batch they opened before the rename lands in the renamed file.
+    Whole lines are moved as they appear, so a half-written one is not interleaved with new appends.
+    """
+    moved, last_size = offset, None
+    while True:
+        size = os.path.getsize(src)
+        if size == last_size:
+            if size > moved:
+                _append_range(src, moved, size, dest)  # quiet for a full period: nothing else is coming
+            return
+        last_size = size
+        with open(src, "rb") as f:
+            f.seek(moved)
+            complete = f.read(size - moved).rfind(b"\n") + 1
+        if complete:
+            _append_range(src, moved, moved + complete, dest)
+            moved += complete
+        time.sleep(ROTATE_SETTLE)
+
+
+def maybe_rotate(path, max_bytes=LOG_ROTATE_BYTES, interval=LOG_ROTATE_INTERVAL):
+    """
+    Roll the active log into a compressed segment once it reaches `max_bytes`
+    or has been active for `interval` seconds. Returns True if a rotation happened.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    manifest = load_manifest(path)
+    if "active_since" not in manifest:
+        manifest["active_since"] = time.time()
+        _save_manifest(path, manifest)
+    too_big = max_bytes and size >= max_bytes
+    too_old = interval and size and time.time() - manifest["active_since"] >= interval
+    if not (too_big or too_old):
+        return False
+
+    with _RotationLock(path) as locked:
+        if not locked:
+            return False
+        # Re-read under the lock: another process may have rotated already
+        manifest = load_manifest(path)
+        try:
+            if not os.path.getsize(path):
+                return False
+        except OSError:
+            return False
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        closed = f"{path}.{stamp}"
+        os.replace(path, closed)
+        compression = _compression()
+        # The segment size is what was actually compressed from the renamed file, not a stat taken
+        # before the rename: appends in between would otherwise shift every later offset
+        segment, size, count, first_ts, last_ts = _compress(closed, compression)
+        _move_tail(closed, size, path)
+        os.remove(closed)
+        manifest["segments"].append({
+            "file": os.path.basename(segment),
+            "compression": compression,
+            "start": active_base_offset(manifest),
+            "size": size,
+            "count": count,
+            "first_timestamp": first_ts,
+            "last_timestamp": last_ts,
+        })
+        manifest["active_since"] = time.time()
+        _save_manifest(path, manifest)
+        try:
+            os.remove(path + ".idx")
+        except OSError:
+            pass
+        logger.info("Rotated %s into %s (%d entries)", path, segment, count)
+        return True
+
+
+def _segment_outside_window(segment, log_filter):
+    if log_filter is None:
+        return False
+    first = parse_timestamp(segment.get("first_timestamp"))
+    last = parse_timestamp(segment.get("last_timestamp"))
+    # Same out-of-order slack as the index, since writers flush a little out of order
+    if log_filter.since is not None and last is not None and to_epoch(last) + LOG_INDEX_SKEW < to_epoch(log_filter.since):
+        return True
+    if log_filter.until is not None and first is not None and to_epoch(first) - LOG_INDEX_SKEW > to_epoch(log_filter.until):
+        return True
+    return False
+
+
+def _iter_segment(path, segment, after):
+    seg_path = os.path.join(os.path.dirname(path), segment["file"])
+    offset = segment["start"]
+    with _open_segment(seg_path, segment.get("compression", "gzip")) as f:
+        # Compressed streams cannot seek cheaply, so skip whole lines until the cursor
+        for line in f:
+            start, offset = offset, offset + len(line)
+            if start < after or not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            yield offset, entry
+
+
+def iter_segmented_entries(path, after=0, log_filter=None):
+    """
+    Stream entries across closed segments and the active log, in write order.
+    Offsets are global (segment start + position), so cursors stay valid across rotations.
+    """
+    manifest = load_manifest(path)
+    after = max(0, after)
+    for segment in manifest["segments"]:
+        if segment["start"] + segment["size"] <= after or _segment_outside_window(segment, log_filter):
+            continue
+        try:
+            yield from _iter_segment(path, segment, after)
+        except OSError:
+            logger.exception("Failed to read log segment %s", segment["file"])
+    base = active_base_offset(manifest)
+    for offset, entry in iter_indexed_entries(path, max(0, after - base), log_filter):
+        yield base + offset, entry
+
+
+_last_check = {}
+_check_lock = threading.Lock()
+
+
+def rotate_if_due(path, every=5.0):
+    """Cheap wrapper for the writer thread: checks thresholds at most once per `every` seconds."""
+    now = time.monotonic()
+    with _check_lock:
+        if now - _last_check.get(path, 0) < every:
+            return False
+        _last_check[path] = now
+    try:
+        return maybe_rotate(path)
+    except OSError:
+        logger.exception("Failed to rotate %s", path)
+        return False
+
+
+if __name__ == "__main__":
+    # python log_segments.py logs.jsonl  -> force a rotation of the given logs
+    for log_path in sys.argv[1:] or ["logs.jsonl", os.path.join("logs", "evaluations.jsonl")]:
+        print(f"{log_path}: {'rotated' if maybe_rotate(log_path, max_bytes=1) else 'nothing to rotate'}")
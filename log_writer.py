@@ -0,0 +1,152 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from log_index import get_log_index
+from log_segments import rotate_if_due
+
+logger = logging.getLogger(__name__)
+
+# ✅ Defaults, overridable from .env
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_OVERFLOW_POLICY = os.getenv("LOG_OVERFLOW_POLICY", "block")  # "block" or "drop"
+LOG_BLOCK_TIMEOUT = float(os.getenv("LOG_BLOCK_TIMEOUT", "5.0"))
+LOG_INDEX_ENABLED = os.getenv("LOG_INDEX", "1") != "0"  # keep "<log>.idx" up to date after each batch
+
+
+class BufferedLogWriter:
+    """
+    Appends JSONL lines to a file from a background thread.
+    Callers only push into a bounded in-memory ring buffer; the writer thread
+    drains it in batches when `batch_size` lines are pending or every `flush_interval` seconds.
+    When the buffer is full, policy "block" waits up to `block_timeout` for room and
+    policy "drop" discards the oldest pending line.
+    """
+
+    def __init__(self, path, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL,
+                 max_queue=LOG_QUEUE_SIZE, policy=LOG_OVERFLOW_POLICY, block_timeout=LOG_BLOCK_TIMEOUT):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max(1, max_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.written = 0
+        self.dropped = 0
+        self._reset()
+
+    def _reset(self):
+        # Called again in a forked child: locks and threads do not survive fork()
+        self._pid = os.getpid()
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._pending_flush = 0
+        self._in_flight = 0
+        self._closed = False
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"log-writer:{self.path}", daemon=True)
+            self._thread.start()
+
+    def append(self, line):
+        self.append_many([line])
+
+    def append_many(self, lines):
+        with self._cond:
+            self._ensure_thread()
+            for line in lines:
+                if len(self._buffer) >= self.max_queue:
+                    if self.policy == "block":
+                        self._cond.notify_all()
+                        self._cond.wait_for(lambda: len(self._buffer) < self.max_queue, timeout=self.block_timeout)
+                    if len(self._buffer) >= self.max_queue:
+                        self._buffer.popleft()
+                        self.dropped += 1
+                self._buffer.append(line)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until everything appended so far is on disk (or `timeout` expires)."""
+        with self._cond:
+            if self._pid != os.getpid() or self._thread is None:
+                return True
+            self._pending_flush += 1
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._buffer and not self._in_flight, timeout=timeout)
+            self._pending_flush -= 1
+            return done
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while (not self._closed and len(self._buffer) < self.batch_size
+                       and not (self._pending_flush and self._buffer)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed and not self._buffer:
+                    return
+                batch = list(self._buffer)
+                self._buffer.clear()
+                self._in_flight = len(batch)
+                self._cond.notify_all()
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        try:
+            # Rotation runs under the same lock, so no append from this process races the rename
+            with self._write_lock:
+                # One write per batch keeps lines from interleaving with other processes' appends
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in batch))
+                self.written += len(batch)
+                rotate_if_due(self.path)
+            if LOG_INDEX_ENABLED:
+                get_log_index(self.path).refresh()
+        except Exception:
+            logger.exception("Failed to write %d log lines to %s", len(batch), self.path)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(path):
+    """Shared writer per log file path for this process."""
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = BufferedLogWriter(path)
+        return writer
+
+
+@atexit.register
+def flush_all_writers():
+    for writer in list(_writers.values()):
+        writer.close()
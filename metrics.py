@@ -0,0 +1,121 @@
+"""
+Prometheus metrics shared by the Flask app, the ASGI routes and the Celery worker.
+
+Each process only sees its own samples. To expose the worker's metrics through Flask's
+`/metrics`, point PROMETHEUS_MULTIPROC_DIR at the same empty directory in every process
+before it starts (run_all.bat does this); samples are then written there and merged on scrape.
+"""
+import contextlib
+import os
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from tracing import start_span
+
+load_dotenv()  # prometheus_client picks its storage from PROMETHEUS_MULTIPROC_DIR at import time
+
+# ✅ Metrics settings, overridable from .env
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Time to build the HTTP response", ["method", "route"],
+                         buckets=HTTP_BUCKETS)
+
+TASK_QUEUE_WAIT = Histogram("celery_task_queue_wait_seconds", "Time from publish (or ETA) to a worker starting the task",
+                            ["task"], buckets=LLM_BUCKETS)
+TASK_RUNTIME = Histogram("celery_task_runtime_seconds", "Task execution time on the worker", ["task", "state"],
+                         buckets=LLM_BUCKETS)
+
+LLM_LATENCY = Histogram("ollama_request_duration_seconds", "Ollama call latency per attempt", ["mode", "outcome"],
+                        buckets=LLM_BUCKETS)
+LLM_RETRIES = Counter("ollama_retries_total", "Retries of transient Ollama failures", ["level"])
+
+STAGE_LATENCY = Histogram("evaluation_stage_duration_seconds", "Post-processing time per evaluation stage", ["stage"],
+                          buckets=STAGE_BUCKETS)
+CACHE_LOOKUPS = Counter("evaluation_cache_lookups_total", "Result cache lookups", ["result"])
+REJECTIONS = Counter("evaluation_rejections_total", "Evaluations rejected or failed, by category", ["category"])
+
+
+def observe_request(method, route, status, seconds):
+    HTTP_REQUESTS.labels(method, route, str(status)).inc()
+    HTTP_LATENCY.labels(method, route).observe(seconds)
+
+
+@contextlib.contextmanager
+def observe_stage(stage):
+    """Times one evaluation stage for the histogram and records it as a trace span."""
+    start = time.perf_counter()
+    try:
+        with start_span(f"evaluation.{stage}"):
+            yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def record_cache_lookup(hit, approximate=False):
+    CACHE_LOOKUPS.labels("similar" if hit and approximate else "hit" if hit else "miss").inc()
+
+
+def record_rejection(category):
+    REJECTIONS.labels(category).inc()
+
+
+def record_retry(level):
+    LLM_RETRIES.labels(level).inc()
+
+
+def task_started(task_name, published_at=None, eta=None):
+    """
+    Called from task_prerun; `published_at` is the epoch stamp added in before_task_publish.
+    Returns the start time to pass to task_finished (the caller keeps it on the task request,
+    so a task that never reaches postrun leaves nothing behind).
+    """
+    if published_at is not None:
+        ready_at = float(published_at)
+        if eta:
+            # Retries and countdowns are not queue wait: count from when the task became due
+            with contextlib.suppress(TypeError, ValueError):
+                ready_at = max(ready_at, _epoch(eta))
+        TASK_QUEUE_WAIT.labels(task_name).observe(max(0.0, time.time() - ready_at))
+    return time.perf_counter()
+
+
+def task_finished(task_name, start, state):
+    if start is not None:
+        TASK_RUNTIME.labels(task_name, state or "UNKNOWN").observe(time.perf_counter() - start)
+
+
+def _epoch(eta):
+    if isinstance(eta, str):
+        eta = datetime.fromisoformat(eta)
+    if eta.tzinfo is None:
+        eta = eta.replace(tzinfo=timezone.utc)
+    return eta.timestamp()
+
+
+def render_metrics():
+    """(body, content_type) for /metrics; merges every process's samples in multiprocess mode."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
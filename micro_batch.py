@@ -0,0 +1,150 @@
+"""
+Producer-side aggregator for evaluate_batch_with_llama.
+
+Submissions get their task id immediately; prompts are held for up to LLM_BATCH_WAIT_MS
+(or until LLM_BATCH_SIZE are waiting) and then sent to the worker as one batch task.
+
+Offline regression run over a prompt set:
+
+    python micro_batch.py prompts_sets/prompts_medical_good.json
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from celery import states
+
+from celery_worker import LLM_BATCH_SIZE, evaluate_batch_with_llama, evaluate_with_llama
+
+# ✅ Micro-batch settings, overridable from .env
+LLM_MICRO_BATCH = os.getenv("LLM_MICRO_BATCH", "0") == "1"  # route /api/async_evaluate through the batcher
+LLM_BATCH_WAIT_MS = float(os.getenv("LLM_BATCH_WAIT_MS", "50"))
+
+
+class MicroBatcher:
+    """Collects submissions for up to `max_wait` seconds or `max_size` items, then calls `launch(items)`."""
+
+    def __init__(self, launch, max_size=LLM_BATCH_SIZE, max_wait=LLM_BATCH_WAIT_MS / 1000, on_error=None):
+        self.launch = launch
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self.on_error = on_error
+        self._reset()
+
+    def _reset(self):
+        # Called again in a forked child: locks and threads do not survive fork()
+        self._pid = os.getpid()
+        self._items = []
+        self._deadline = None
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="llm-micro-batch", daemon=True)
+            self._thread.start()
+
+    def submit(self, prompt, bypass_cache=False, task_id=None):
+        task_id = task_id or str(uuid.uuid4())
+        batch = None
+        with self._cond:
+            self._ensure_thread()
+            self._items.append([task_id, prompt, bool(bypass_cache)])
+            if len(self._items) >= self.max_size:
+                batch = self._take()
+            elif len(self._items) == 1:
+                self._deadline = time.monotonic() + self.max_wait
+                self._cond.notify()
+        if batch:
+            self._launch(batch)
+        return task_id
+
+    def flush(self):
+        with self._cond:
+            batch = self._take()
+        if batch:
+            self._launch(batch)
+
+    def _take(self):
+        batch, self._items, self._deadline = self._items, [], None
+        return batch
+
+    def _launch(self, batch):
+        try:
+            self.launch(batch)
+        except Exception as e:
+            if self.on_error is None:
+                raise
+            self.on_error(batch, e)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                batch = self._take()
+            try:
+                self._launch(batch)
+            except Exception:
+                pass  # nothing to report to from the timer thread without on_error
+
+
+def _launch_batch(items):
+    evaluate_batch_with_llama.apply_async((items,))
+
+
+def _fail_batch(items, exc):
+    # The broker refused the batch: fail every task id so pollers stop waiting
+    for task_id, _, _ in items:
+        evaluate_with_llama.backend.mark_as_failure(task_id, exc)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_micro_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(_launch_batch, on_error=_fail_batch)
+                atexit.register(_batcher.flush)
+    return _batcher
+
+
+def run_prompt_set(path, timeout=600):
+    """Submit every prompt in a prompt set through the batcher and wait for all results."""
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    prompts = [item["prompt"] if isinstance(item, dict) else str(item) for item in items]
+
+    batcher = get_micro_batcher()
+    task_ids = [batcher.submit(prompt) for prompt in prompts]
+    batcher.flush()
+
+    results = []
+    deadline = time.monotonic() + timeout
+    for prompt, task_id in zip(prompts, task_ids):
+        async_result = evaluate_with_llama.AsyncResult(task_id)
+        while async_result.state not in states.READY_STATES and time.monotonic() < deadline:
+            time.sleep(0.5)
+        results.append({"prompt": prompt, "task_id": task_id, "state": async_result.state,
+                        "result": async_result.result if async_result.state == states.SUCCESS else None})
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    print(json.dumps(run_prompt_set(sys.argv[1]), indent=2, ensure_ascii=False, default=str))
@@ -0,0 +1,180 @@
+"""
+Shared phrase matching for the rejection and harm checks.
+
+All phrase lists are compiled into one Aho-Corasick automaton, so a single pass over the
+lowercased text reports every category with a match, and the cost grows with the text length
+rather than the number of phrases. Matching is plain substring matching, like `phrase in text`.
+The automaton comes from `pyahocorasick` when it is installed (several times faster), otherwise
+from the pure-Python implementation here.
+
+Lists can be overridden from PHRASES_FILE, a JSON object of category -> list of phrases;
+categories it leaves out keep the defaults below. The file is re-read when its mtime changes
+(checked at most every PHRASES_RELOAD_INTERVAL seconds); an invalid file keeps the last good lists.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:  # optional C automaton (pyahocorasick); the pure-Python one below is the fallback
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
+# ✅ Phrase list settings, overridable from .env
+PHRASES_FILE = os.getenv("PHRASES_FILE", "phrases.json")
+PHRASES_RELOAD_INTERVAL = float(os.getenv("PHRASES_RELOAD_INTERVAL", "2"))
+
+POLICY = "policy"  # the model refused on policy grounds (raw model output)
+REJECTION = "rejection"  # the evaluation says the prompt is not a usable medical prompt
+HARM_FLAG = "harm_flag"  # suggestions of a zero-score evaluation point at harmful content
+UNSAFE_SUGGESTION = "unsafe_suggestion"  # suggestions of a zero-score evaluation call the prompt unsafe
+HARMFUL_PROMPT = "harmful_prompt"  # prompts triage refuses without calling the model
+
+DEFAULT_PHRASES = {
+    POLICY: [
+        "not allowed", "against policy", "not permitted", "cannot help with",
+        "violates", "against ethical", "not appropriate", "i cannot assist",
+        "safety guidelines", "not medically appropriate", "i'm sorry, but i can't",
+    ],
+    REJECTION: [
+        "not medically relevant", "not a medical prompt", "this is not a medical",
+        "invalid prompt", "please provide a medical", "please provide a more specific and clinically relevant prompt",
+        "please rephrase the prompt to include a clear clinical context and specific instructions",
+        "please rephrase the prompt to include a clear clinical context and specific questions",
+        "please provide a more specific and clear prompt to ensure safety and clinical relevance",
+    ],
+    HARM_FLAG: ["harmful", "dangerous", "unsafe", "triggering", "kill", "suicide", "hurt"],
+    UNSAFE_SUGGESTION: ["harmful", "triggering", "dangerous", "illegal", "unsafe"],
+    HARMFUL_PROMPT: [
+        "kill yourself", "kill myself", "how to commit suicide", "advice for suicide",
+        "ways to harm", "harm someone", "hurt someone", "poison someone", "dangerous advice",
+    ],
+}
+
+
+class PhraseMatcher:
+    """Case-insensitive multi-category substring matcher (Aho-Corasick, compiled to a DFA)."""
+
+    def __init__(self, phrase_sets):
+        self.phrase_sets = {category: tuple(dict.fromkeys(p.lower() for p in phrases if p))
+                            for category, phrases in phrase_sets.items()}
+        self._all = frozenset(category for category, phrases in self.phrase_sets.items() if phrases)
+        self._automaton = None
+        if ahocorasick is not None:
+            by_phrase = {}
+            for category, phrases in self.phrase_sets.items():
+                for phrase in phrases:
+                    by_phrase.setdefault(phrase, set()).add(category)
+            if by_phrase:
+                self._automaton = ahocorasick.Automaton()
+                for phrase, categories in by_phrase.items():
+                    self._automaton.add_word(phrase, frozenset(categories))
+                self._automaton.make_automaton()
+        else:
+            self._build_dfa()
+
+    def _build_dfa(self):
+        goto, outputs = [{}], [set()]
+        for category, phrases in self.phrase_sets.items():
+            for phrase in phrases:
+                state = 0
+                for ch in phrase:
+                    if ch not in goto[state]:
+                        goto.append({})
+                        outputs.append(set())
+                        goto[state][ch] = len(goto) - 1
+                    state = goto[state][ch]
+                outputs[state].add(category)
+
+        # Breadth-first, so a state's failure target is finished before the state itself;
+        # folding the failure transitions in turns the trie into a DFA with one lookup per character
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] |= outputs[fail[state]]
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0)
+                queue.append(child)
+        self._delta = delta
+        self._outputs = [frozenset(out) or None for out in outputs]
+
+    def categories(self, text):
+        """The set of categories with at least one phrase in `text`, found in one pass."""
+        found = set()
+        everything = self._all
+        if ahocorasick is not None:
+            if self._automaton is not None:
+                for _, categories in self._automaton.iter(str(text).lower()):
+                    found |= categories
+                    if found == everything:
+                        break
+            return found
+        delta, outputs = self._delta, self._outputs
+        state = 0
+        for ch in str(text).lower():
+            state = delta[state].get(ch, 0)
+            out = outputs[state]
+            if out is not None:
+                found |= out
+                if found == everything:
+                    break
+        return found
+
+    def matches(self, text, category):
+        return category in self.categories(text)
+
+
+def load_phrase_sets(path=PHRASES_FILE):
+    """DEFAULT_PHRASES with the categories from `path` swapped in; raises ValueError for a malformed file."""
+    phrase_sets = {category: list(phrases) for category, phrases in DEFAULT_PHRASES.items()}
+    if not path or not os.path.exists(path):
+        return phrase_sets
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not all(
+            isinstance(phrases, list) and all(isinstance(p, str) for p in phrases) for phrases in data.values()):
+        raise ValueError(f"{path} must map each category to a list of strings")
+    phrase_sets.update(data)
+    return phrase_sets
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+_checked_at = 0.0
+_loaded_mtime = None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_phrase_matcher():
+    """Process-wide matcher, rebuilt when PHRASES_FILE changes."""
+    global _matcher, _checked_at, _loaded_mtime
+    if _matcher is not None and time.monotonic() - _checked_at < PHRASES_RELOAD_INTERVAL:
+        return _matcher
+    with _matcher_lock:
+        if _matcher is None or time.monotonic() - _checked_at >= PHRASES_RELOAD_INTERVAL:
+            _checked_at = time.monotonic()
+            mtime = _mtime(PHRASES_FILE) if PHRASES_FILE else None
+            if _matcher is None or mtime != _loaded_mtime:
+                try:
+                    _matcher = PhraseMatcher(load_phrase_sets(PHRASES_FILE))
+                except (OSError, ValueError):
+                    logger.exception("Failed to load phrase lists from %s", PHRASES_FILE)
+                    if _matcher is None:
+                        _matcher = PhraseMatcher(DEFAULT_PHRASES)
+                _loaded_mtime = mtime
+    return _matcher
@@ -5,14 +5,22 @@ cd /d %~dp0
 echo 🔄 Activating virtual environment...
 CALL .\venv\Scripts\activate
 
+:: One setting drives both Ollama's parallel slots and the Celery worker's thread count
+if "%OLLAMA_NUM_PARALLEL%"=="" set OLLAMA_NUM_PARALLEL=4
+
+:: Worker and Flask write metrics to one shared directory so /metrics shows both; start it empty
+if "%PROMETHEUS_MULTIPROC_DIR%"=="" set PROMETHEUS_MULTIPROC_DIR=%~dp0metrics_data
+if exist "%PROMETHEUS_MULTIPROC_DIR%" rmdir /s /q "%PROMETHEUS_MULTIPROC_DIR%"
+mkdir "%PROMETHEUS_MULTIPROC_DIR%"
+
 echo 🧠 Starting Ollama (port 11434)...
 START "Ollama Server" cmd /k "ollama serve"
 
 :: Wait a bit to avoid port race
 timeout /t 2 >nul
 
-echo ⚙️ Starting Celery worker (Redis backend)...
-START "Celery Worker" cmd /k "celery -A celery_worker.celery worker --loglevel=info --pool=solo"
+echo ⚙️ Starting Celery worker (Redis backend, %OLLAMA_NUM_PARALLEL% threads)...
+START "Celery Worker" cmd /k "celery -A celery_worker.celery worker --loglevel=info --pool=threads --concurrency=%OLLAMA_NUM_PARALLEL%"
 
 :: Optional wait before Flask
 timeout /t 1 >nul
@@ -0,0 +1,240 @@
+import re
+import numpy as np
+
+# ✅ Regex rubric used by the fast local evaluator (weights sum to 1.0)
+CRITERIA = {
+    "clinical_clarity": {"keywords": ("patient", "symptom", "diagnosis", "condition", "history"), "weight": 0.25},
+    "specificity": {"keywords": ("step-by-step", "list", "rank", "compare", "outline", "guide"), "weight": 0.20},
+    "safety": {"keywords": ("risk", "contraindication", "warning", "side effect", "precaution"), "weight": 0.30},
+    "instructional_style": {"keywords": ("guide", "steps", "structured", "instructions", "metaphor", "tip"), "weight": 0.15},
+    "medical_term": {"keywords": ("diabetes", "hypertension", "cholesterol", "asthma", "insulin", "medication"), "weight": 0.10},
+}
+
+CRITERIA_KEYS = tuple(CRITERIA)
+SUGGESTIONS = {key: f"Consider strengthening: {key.replace('_', ' ').title()}" for key in CRITERIA_KEYS}
+
+# Integer points per criterion, so batch totals are exact instead of summed floats
+POINTS = np.array([round(CRITERIA[key]["weight"] * 100) for key in CRITERIA_KEYS], dtype=np.int64)
+_BITS = np.left_shift(1, np.arange(len(CRITERIA_KEYS)), dtype=np.int64)
+
+# Bytes translation table that turns every ASCII non-word character into a space,
+# so that splitting yields exactly the \w+ runs that \b...\b would match on
+_WORD_BYTES = {c for c in range(128) if chr(c).isalnum() or c == ord('_')}
+_DELIMS = bytes.maketrans(bytes(range(256)), bytes(c if c in _WORD_BYTES else 32 for c in range(256)))
+
+
+def _compile(criteria):
+    # A keyword may belong to several criteria ("guide"), so map each one to all of them
+    owners = {}
+    for key, rule in criteria.items():
+        for word in rule["keywords"]:
+            owners.setdefault(word.lower(), set()).add(key)
+    owners = {word: frozenset(keys) for word, keys in owners.items()}
+
+    # Longest first so the alternation never stops at a shorter keyword prefix
+    words = sorted(owners, key=len, reverse=True)
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(w) for w in words) + r')\b', re.IGNORECASE)
+
+    tokens = {w.encode(): keys for w, keys in owners.items() if re.fullmatch(r'\w+', w)}
+    phrases = tuple(
+        (w.encode(), re.compile(rb'\b' + re.escape(w.encode()) + rb'\b'), keys)
+        for w, keys in owners.items() if w.encode() not in tokens
+    )
+    return pattern, owners, tokens, phrases
+
+
+_PATTERN, _OWNERS, _TOKENS, _PHRASES = _compile(CRITERIA)
+_TOKEN_SET = frozenset(_TOKENS)
+
+
+def _code(keys):
+    return sum(1 << CRITERIA_KEYS.index(key) for key in keys)
+
+
+def _tables_by_length(tokens):
+    # Single-word keywords grouped by length as sorted fixed-width arrays, for np.searchsorted
+    tables = {}
+    for length in sorted({len(word) for word in tokens}):
+        words = sorted(word for word in tokens if len(word) == length)
+        tables[length] = (np.array(words, dtype=f"S{length}"), np.array([_code(tokens[w]) for w in words], dtype=np.int64))
+    return tables
+
+
+def _shapes(tables, max_length):
+    # (length, first byte, last byte) of every keyword: one lookup discards most words before any comparison
+    shapes = np.zeros((max_length + 2, 256, 256), dtype=bool)
+    for length, (keywords, _) in tables.items():
+        words = np.frombuffer(keywords.tobytes(), dtype=np.uint8).reshape(-1, length)
+        shapes[length, words[:, 0], words[:, -1]] = True
+    return shapes
+
+
+_TOKEN_TABLES = _tables_by_length(_TOKENS)
+_MAX_TOKEN = max(_TOKEN_TABLES, default=0)
+_TOKEN_SHAPES = _shapes(_TOKEN_TABLES, _MAX_TOKEN)
+# Phrases that start and end on a word character are matched without the regex (see _ascii_codes)
+_PHRASE_CODES = tuple(
+    (phrase, None if re.fullmatch(rb'\w(?:.*\w)?', phrase, re.DOTALL) else pattern, _code(keys))
+    for phrase, pattern, keys in _PHRASES
+)
+
+
+def _scan_unicode(prompt):
+    hits = set()
+    for match in _PATTERN.finditer(prompt):
+        owners = _OWNERS.get(match.group(0).lower())
+        if owners is None:
+            # Unicode case folding can match spellings that lower() does not map back (e.g. "ſ")
+            owners = next(keys for word, keys in _OWNERS.items() if re.fullmatch(re.escape(word), match.group(0), re.IGNORECASE))
+        hits |= owners
+        if len(hits) == len(CRITERIA_KEYS):
+            break
+    return hits
+
+
+def criteria_hits(prompt):
+    """Return the set of criteria matched by ``prompt`` in a single pass over the text."""
+    if not prompt.isascii():
+        return _scan_unicode(prompt)
+    text = prompt.encode('ascii').lower()
+    hits = set()
+    for word in _TOKEN_SET.intersection(text.translate(_DELIMS).split()):
+        hits |= _TOKENS[word]
+    for phrase, pattern, keys in _PHRASES:
+        if phrase in text and not keys <= hits and pattern.search(text):
+            hits |= keys
+    return hits
+
+
+def regex_evaluate_prompt(prompt):
+    hits = criteria_hits(prompt)
+    results = {}
+    total = 0
+    suggestions = []
+    for key in CRITERIA_KEYS:
+        if key in hits:
+            results[key] = True
+            total += CRITERIA[key]["weight"]
+        else:
+            results[key] = False
+            suggestions.append(SUGGESTIONS[key])
+    score = round(total * 100)
+    return score, results, suggestions
+
+
+def _ascii_codes(blob, starts):
+    """
+    Criteria bitmask per prompt of `blob`, the lowercased ASCII prompts joined by NUL bytes
+    (non-word, so neither a keyword nor a word boundary can straddle two prompts); `starts`
+    holds the offset of each prompt. Every prompt is matched at once with array operations.
+    """
+    codes = np.zeros(len(starts), dtype=np.int64)
+    raw = np.frombuffer(blob, dtype=np.uint8)
+    chars = np.frombuffer(blob.translate(_DELIMS), dtype=np.uint8)
+    in_word = chars != 32
+    word_starts = np.flatnonzero(in_word & np.concatenate(([True], ~in_word[:-1])))
+    word_ends = np.flatnonzero(in_word & np.concatenate((~in_word[1:], [True]))) + 1
+
+    lengths = np.minimum(word_ends - word_starts, _MAX_TOKEN + 1)
+    shaped = _TOKEN_SHAPES[lengths, chars[word_starts], chars[word_ends - 1]]
+    candidate_starts, candidate_lengths = word_starts[shaped], lengths[shaped]
+    found_at, found_codes = [], []
+    for length, (keywords, keyword_codes) in _TOKEN_TABLES.items():
+        candidates = candidate_starts[candidate_lengths == length]
+        if not len(candidates):
+            continue
+        words = chars[candidates[:, None] + np.arange(length)].view(f"S{length}").ravel()
+        slots = np.minimum(np.searchsorted(keywords, words), len(keywords) - 1)
+        found = keywords[slots] == words
+        found_at.append(candidates[found])
+        found_codes.append(keyword_codes[slots[found]])
+
+    for phrase, pattern, code in _PHRASE_CODES:
+        if phrase not in blob:
+            continue
+        if pattern is not None:
+            offsets = np.array([match.start() for match in pattern.finditer(blob)], dtype=np.int64)
+        else:
+            # Word-bounded phrase: compare its bytes at every word start with the same first byte
+            offsets = word_starts[(raw[word_starts] == phrase[0]) & (word_starts + len(phrase) <= len(raw))]
+            window = raw[offsets[:, None] + np.arange(len(phrase))]
+            offsets = offsets[(window == np.frombuffer(phrase, dtype=np.uint8)).all(axis=1)]
+            ends = offsets + len(phrase)
+            offsets = offsets[(ends == len(raw)) | (chars[np.minimum(ends, len(raw) - 1)] == 32)]
+        found_at.append(offsets)
+        found_codes.append(np.full(len(offsets), code, dtype=np.int64))
+
+    if found_at:
+        rows = np.searchsorted(starts, np.concatenate(found_at), side="right") - 1
+        found_codes = np.concatenate(found_codes)
+        # One bit at a time, so repeated rows in the fancy-indexed |= all set the same bit
+        for bit in _BITS.tolist():
+            codes[rows[(found_codes & bit) != 0]] |= bit
+    return codes
+
+
+def _offsets(texts):
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)) + 1
+    return np.concatenate(([0], np.cumsum(lengths[:-1]))) if len(texts) else lengths
+
+
+def hit_codes(prompts):
+    """Criteria bitmask per prompt (bit i set when CRITERIA_KEYS[i] matched)."""
+    prompts = list(prompts)
+    joined = "\0".join(prompts)
+    if joined.isascii():
+        return _ascii_codes(joined.encode("ascii").lower(), _offsets(prompts))
+    # Mixed batch: ASCII prompts still go through the array path, the rest through the regex
+    codes = np.zeros(len(prompts), dtype=np.int64)
+    ascii_rows = [row for row, prompt in enumerate(prompts) if prompt.isascii()]
+    texts = [prompts[row] for row in ascii_rows]
+    codes[ascii_rows] = _ascii_codes("\0".join(texts).encode("ascii").lower(), _offsets(texts))
+    for row, prompt in enumerate(prompts):
+        if not prompt.isascii():
+            codes[row] = _code(_scan_unicode(prompt))
+    return codes
+
+
+def hit_matrix(prompts):
+    """Boolean matrix of shape (len(prompts), len(CRITERIA_KEYS)) with one row per prompt."""
+    return (hit_codes(prompts)[:, None] & _BITS) != 0
+
+
+def batch_evaluate_prompts(prompts):
+    """
+    Score many prompts at once with the regex rubric.
+    Returns (results, stats) where each result matches the /api/evaluate response body.
+    """
+    codes = hit_codes(prompts)
+    matrix = (codes[:, None] & _BITS) != 0
+    scores = matrix @ POINTS
+
+    # Only 2**5 hit patterns exist, so build criteria/suggestions once per distinct pattern
+    patterns = {}
+    for code in np.unique(codes).tolist():
+        row = [bool(code & (1 << i)) for i in range(len(CRITERIA_KEYS))]
+        patterns[code] = (
+            dict(zip(CRITERIA_KEYS, row)),
+            [SUGGESTIONS[key] for key, hit in zip(CRITERIA_KEYS, row) if not hit],
+        )
+
+    results = []
+    for score, code in zip(scores.tolist(), codes.tolist()):
+        criteria, suggestions = patterns[code]
+        results.append({
+            "score": score,
+            "criteria_scores": dict(criteria),
+            "suggestions": list(suggestions),
+        })
+
+    stats = {"count": len(prompts)}
+    if len(prompts):
+        stats.update({
+            "mean_score": round(float(scores.mean()), 2),
+            "median_score": float(np.median(scores)),
+            "min_score": int(scores.min()),
+            "max_score": int(scores.max()),
+            "std_score": round(float(scores.std()), 2),
+            "criteria_hit_rate": dict(zip(CRITERIA_KEYS, np.round(matrix.mean(axis=0), 4).tolist())),
+        })
+    return results, stats
@@ -0,0 +1,388 @@
+"""
+Near-duplicate result cache: MinHash signatures + LSH banding over normalized prompts.
+
+The exact cache (llm_cache) misses prompts that differ only in case, punctuation, spacing or
+a word or two. This index maps such prompts to the exact-cache key of an earlier evaluation
+whose estimated Jaccard similarity (over 5-byte shingles) is at least SIMILARITY_THRESHOLD;
+the caller serves that evaluation marked `"approximate": true`.
+
+Lookups are a handful of binary searches over sorted band-key arrays, so they stay well under
+a millisecond at hundreds of thousands of entries (under 1 KB of RAM per entry). The index
+is saved to SIMILARITY_INDEX_PATH (.npz) on exit and at most every SIMILARITY_SAVE_INTERVAL
+seconds, and reloaded on start. Processes sharing the file merge their entries into it under a
+lock file instead of overwriting each other. Benchmark: python benchmarks/bench_similarity_cache.py
+"""
+import atexit
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+# ✅ Similarity cache settings, overridable from .env
+SIMILARITY_CACHE = os.getenv("SIMILARITY_CACHE", "1") == "1"
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.9"))
+SIMILARITY_NUM_PERM = int(os.getenv("SIMILARITY_NUM_PERM", "128"))
+SIMILARITY_BANDS = int(os.getenv("SIMILARITY_BANDS", "16"))  # 16 bands x 8 rows: candidates from Jaccard ~0.7 up
+SIMILARITY_SHINGLE = int(os.getenv("SIMILARITY_SHINGLE", "5"))  # bytes per shingle
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "200000"))
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", os.path.join("logs", "similarity_index.npz"))  # "" = memory only
+SIMILARITY_SAVE_INTERVAL = float(os.getenv("SIMILARITY_SAVE_INTERVAL", "300"))
+
+SEED = 20240611  # fixed so signatures stay comparable across processes and saved indexes
+MERGE_EVERY = 8192  # band keys buffered in a dict before being merged into the sorted arrays
+SAVE_LOCK_TIMEOUT = 5.0
+SAVE_LOCK_STALE_AFTER = 60
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def normalize_for_similarity(text):
+    """Case-, punctuation- and whitespace-insensitive form of a prompt."""
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+def _context_salt(context):
+    return int.from_bytes(hashlib.blake2b(str(context).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SimilarityIndex:
+    """
+    Maps prompts to a value (an exact-cache key) by MinHash similarity. Thread-safe.
+
+    `context` partitions the index (model, instruction version, temperature): prompts only
+    match entries added under the same context.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, num_perm=SIMILARITY_NUM_PERM, bands=SIMILARITY_BANDS,
+                 shingle=SIMILARITY_SHINGLE, max_entries=SIMILARITY_MAX_ENTRIES):
+        if num_perm % bands:
+            raise ValueError("SIMILARITY_NUM_PERM must be a multiple of SIMILARITY_BANDS")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.max_entries = max_entries
+        rng = np.random.default_rng(SEED)
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._shingle_mix = rng.integers(1, 2 ** 63, size=shingle, dtype=np.uint64) | np.uint64(1)
+        self._row_mix = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self._band_salt = rng.integers(0, 2 ** 63, size=bands, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._capacity = 1024
+        # Stored signatures only need to compare equal; 16 bits each adds ~1/65536 to the estimate
+        self._sigs = np.zeros((self._capacity, self.num_perm), dtype=np.uint16)
+        self._band_keys = np.zeros((self._capacity, self.bands), dtype=np.uint64)
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._values = []
+        self._count = 0  # ids handed out so far
+        self._live = 0
+        self._oldest = 0
+        self._sorted_keys = np.zeros(0, dtype=np.uint64)
+        self._sorted_ids = np.zeros(0, dtype=np.int64)
+        self._pending = {}
+        self._pending_count = 0
+        self._discarded = set()  # values dropped since the last save, so merging does not revive them
+        self.dirty = False
+
+    def __len__(self):
+        return self._live
+
+    # ✅ Signatures
+    def shingle_hashes(self, text):
+        """32-bit hashes of the `shingle`-byte windows of the normalized UTF-8 text (repeats included)."""
+        data = np.frombuffer(normalize_for_similarity(text).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+        if len(data) < self.shingle:
+            data = np.pad(data, (0, self.shingle - len(data)))
+        n = len(data) - self.shingle + 1
+        hashes = data[:n] * self._shingle_mix[0]
+        for i in range(1, self.shingle):
+            hashes += data[i:i + n] * self._shingle_mix[i]
+        return hashes >> np.uint64(32)
+
+    def signature(self, text):
+        # Multiply-shift hashing: one wrapping multiply-add per permutation, top 32 bits kept
+        hashes = self.shingle_hashes(text)
+        return ((np.multiply.outer(hashes, self._a) + self._b) >> np.uint64(32)).min(axis=0)
+
+    def band_keys(self, signature, context=""):
+        rows = signature.reshape(self.bands, self.rows)
+        keys = (rows * self._row_mix).sum(axis=1)  # uint64 arithmetic wraps, which is what we want here
+        return keys ^ self._band_salt ^ np.uint64(_context_salt(context))
+
+    # ✅ Index maintenance
+    def add(self, text, value, context=""):
+        signature = self.signature(text)
+        keys = self.band_keys(signature, context)
+        with self._lock:
+            if self._count == self._capacity:
+                self._grow()
+            entry = self._count
+            self._sigs[entry] = signature.astype(np.uint16)
+            self._band_keys[entry] = keys
+            self._alive[entry] = True
+            self._values.append(value)
+            self._count += 1
+            self._live += 1
+            for key in keys.tolist():
+                self._pending.setdefault(key, []).append(entry)
+            self._pending_count += self.bands
+            if self._pending_count >= MERGE_EVERY:
+                self._merge_pending()
+            while self._live > self.max_entries:
+                self._discard(self._oldest)
+            self.dirty = True
+        return entry
+
+    def discard(self, entry, value):
+        """
+        Forget an entry, e.g. one whose value expired from the exact cache. `value` must still be
+        the one stored there: ids from an earlier query() are renumbered if the index compacts.
+        """
+        with self._lock:
+            if 0 <= entry < self._count and self._values[entry] == value:
+                self._discard(entry)
+                self._discarded.add(value)
+
+    def _discard(self, entry):
+        if 0 <= entry < self._count and self._alive[entry]:
+            self._alive[entry] = False
+            self._values[entry] = None
+            self._live -= 1
+            self.dirty = True
+        while self._oldest < self._count and not self._alive[self._oldest]:
+            self._oldest += 1
+        if self._count > 4096 and self._live < self._count // 2:
+            self._compact()
+
+    def _grow(self):
+        self._capacity *= 2
+        self._sigs = np.resize(self._sigs, (self._capacity, self.num_perm))
+        self._band_keys = np.resize(self._band_keys, (self._capacity, self.bands))
+        alive = np.zeros(self._capacity, dtype=bool)
+        alive[:self._count] = self._alive[:self._count]
+        self._alive = alive
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
+        keys = np.fromiter((k for k, ids in self._pending.items() for _ in ids), dtype=np.uint64, count=self._pending_count)
+        ids = np.fromiter((i for ids in self._pending.values() for i in ids), dtype=np.int64, count=self._pending_count)
+        order = np.argsort(keys, kind="stable")
+        positions = np.searchsorted(self._sorted_keys, keys[order])
+        self._sorted_keys = np.insert(self._sorted_keys, positions, keys[order])
+        self._sorted_ids = np.insert(self._sorted_ids, positions, ids[order])
+        self._pending = {}
+        self._pending_count = 0
+
+    def _compact(self):
+        """Drop discarded entries and renumber the rest."""
+        keep = np.flatnonzero(self._alive[:self._count])
+        sigs, band_keys = self._sigs[keep], self._band_keys[keep]
+        values = [self._values[i] for i in keep.tolist()]
+        self._clear()
+        self._load_entries(sigs, band_keys, values)
+        self.dirty = True
+
+    def _load_entries(self, sigs, band_keys, values):
+        count = len(values)
+        self._capacity = max(1024, 1 << count.bit_length())
+        self._sigs = np.zeros((self._capacity, self.num_perm), dtype=np.uint16)
+        self._band_keys = np.zeros((self._capacity, self.bands), dtype=np.uint64)
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._sigs[:count], self._band_keys[:count], self._alive[:count] = sigs, band_keys, True
+        self._values = list(values)
+        self._count = self._live = count
+        flat = band_keys.ravel()
+        order = np.argsort(flat, kind="stable")
+        self._sorted_keys = flat[order]
+        self._sorted_ids = np.repeat(np.arange(count, dtype=np.int64), self.bands)[order]
+
+    # ✅ Lookups
+    def query(self, text, context="", limit=3):
+        """[(similarity, value, entry)] for entries at or above the threshold, most similar first."""
+        signature = self.signature(text)
+        keys = self.band_keys(signature, context)
+        with self._lock:
+            lo = np.searchsorted(self._sorted_keys, keys, side="left")
+            hi = np.searchsorted(self._sorted_keys, keys, side="right")
+            found = [self._sorted_ids[start:end] for start, end in zip(lo.tolist(), hi.tolist()) if end > start]
+            for key in keys.tolist():
+                ids = self._pending.get(key)
+                if ids:
+                    found.append(np.asarray(ids, dtype=np.int64))
+            if not found:
+                return []
+            candidates = np.unique(np.concatenate(found))
+            candidates = candidates[self._alive[candidates]]
+            if not len(candidates):
+                return []
+            similarity = (self._sigs[candidates] == signature.astype(np.uint16)).mean(axis=1)
+            order = np.argsort(-similarity, kind="stable")[:limit]
+            return [(float(similarity[i]), self._values[candidates[i]], int(candidates[i]))
+                    for i in order.tolist() if similarity[i] >= self.threshold]
+
+    def stats(self):
+        return {"entries": self._live, "threshold": self.threshold, "num_perm": self.num_perm,
+                "bands": self.bands, "shingle": self.shingle}
+
+    # ✅ Persistence
+    def _params(self):
+        return np.array([self.num_perm, self.bands, self.shingle, SEED], dtype=np.int64)
+
+    def save(self, path):
+        """
+        Write the index atomically to `path` (.npz), merged with what other processes saved there:
+        their entries come first (treated as older) and the result is trimmed to `max_entries`.
+        Returns False, keeping the index dirty, if the lock file stays busy.
+        """
+        with self._lock:
+            keep = np.flatnonzero(self._alive[:self._count])
+            sigs, band_keys = self._sigs[keep], self._band_keys[keep]
+            values = [str(self._values[i]) for i in keep.tolist()]
+            discarded, self._discarded = self._discarded, set()
+            self.dirty = False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _SaveLock(path) as locked:
+            if not locked:
+                with self._lock:
+                    self._discarded |= discarded
+                    self.dirty = True
+                return False
+            saved = self._read(path)
+            if saved is not None:
+                ours = set(values) | discarded
+                theirs = [i for i, value in enumerate(saved[2]) if value not in ours]
+                sigs = np.concatenate([saved[0][theirs], sigs])
+                band_keys = np.concatenate([saved[1][theirs], band_keys])
+                values = [saved[2][i] for i in theirs] + values
+            start = max(0, len(values) - self.max_entries)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, params=self._params(), signatures=sigs[start:], band_keys=band_keys[start:],
+                         values=np.array([value.encode("utf-8") for value in values[start:]], dtype=np.bytes_))
+            os.replace(tmp, path)
+        return True
+
+    def _read(self, path):
+        """(signatures, band_keys, values) saved at `path`, or None if missing or built with other settings."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if not np.array_equal(data["params"], self._params()):
+                    return None
+                return (data["signatures"].astype(np.uint16), data["band_keys"].astype(np.uint64),
+                        [v.decode("utf-8") for v in data["values"].tolist()])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def load(self, path):
+        """Replace the contents with a saved index; returns False if it is missing or built with other settings."""
+        saved = self._read(path)
+        if saved is None:
+            return False
+        sigs, band_keys, values = saved
+        with self._lock:
+            self._clear()
+            self._load_entries(sigs, band_keys, values)
+            while self._live > self.max_entries:
+                self._discard(self._oldest)
+        return True
+
+
+class _SaveLock:
+    # Lock file created with O_EXCL (as for log rotation), waited on for up to SAVE_LOCK_TIMEOUT
+    def __init__(self, path):
+        self.lock_path = path + ".lock"
+        self.fd = None
+
+    def __enter__(self):
+        deadline = time.monotonic() + SAVE_LOCK_TIMEOUT
+        while True:
+            try:
+                self.fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > SAVE_LOCK_STALE_AFTER:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    pass
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            os.close(self.fd)
+            os.remove(self.lock_path)
+
+
+_index = None
+_index_lock = threading.Lock()
+_last_save = time.monotonic()
+
+
+def get_similarity_index():
+    """Process-wide index, loaded from SIMILARITY_INDEX_PATH and saved back on exit."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SimilarityIndex()
+                if SIMILARITY_INDEX_PATH:
+                    index.load(SIMILARITY_INDEX_PATH)
+                    atexit.register(save_similarity_index)
+                _index = index
+    return _index
+
+
+def save_similarity_index(force=True):
+    global _last_save
+    if _index is None or not SIMILARITY_INDEX_PATH or not _index.dirty:
+        return
+    if not force and time.monotonic() - _last_save < SIMILARITY_SAVE_INTERVAL:
+        return
+    _last_save = time.monotonic()
+    try:
+        _index.save(SIMILARITY_INDEX_PATH)
+    except OSError:
+        pass  # persistence is best effort; the index still works in memory
+
+
+def _enabled(cache):
+    # With the result cache off (NullCache) every indexed key would point at nothing
+    return SIMILARITY_CACHE and cache.backend != "off"
+
+
+def find_similar(cache, prompt, context):
+    """
+    (result, similarity) for the closest near-duplicate whose evaluation is still in `cache`,
+    or (None, None). Entries whose exact-cache value has expired are dropped on the way.
+    """
+    if not _enabled(cache):
+        return None, None
+    index = get_similarity_index()
+    for similarity, key, entry in index.query(prompt, context):
+        result = cache.get(key, counter="similar")
+        if result is not None:
+            return result, similarity
+        index.discard(entry, key)
+    return None, None
+
+
+def remember_similar(cache, prompt, key, context):
+    """Index `prompt` so near-duplicates can reuse the evaluation stored under exact-cache `key`."""
+    if not _enabled(cache):
+        return
+    get_similarity_index().add(prompt, key, context)
+    save_similarity_index(force=False)
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+import redis
+
+from llm_cache import normalize_prompt
+
+# ✅ Single-flight settings, overridable from .env
+SINGLE_FLIGHT_BACKEND = os.getenv("SINGLE_FLIGHT_BACKEND", "auto")  # "auto", "memory", "redis" or "off"
+SINGLE_FLIGHT_REDIS_URL = os.getenv("SINGLE_FLIGHT_REDIS_URL") or os.getenv("CELERY_RESULT_BACKEND", "")
+SINGLE_FLIGHT_TTL = int(os.getenv("SINGLE_FLIGHT_TTL", "300"))  # upper bound on how long a claim lives
+KEY_PREFIX = "singleflight:"
+
+
+def flight_key(*parts):
+    raw = "\x1f".join(normalize_prompt(part) for part in map(str, parts))
+    return KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryFlightStore:
+    """Claims held in this process only (dedups double-clicks within one Flask worker)."""
+
+    def __init__(self):
+        self._claims = {}  # key -> (task_id, expires); insertion order follows expiry since the TTL is fixed
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        # Expired claims are dropped here, so one entry per distinct prompt is not kept forever
+        while self._claims:
+            key, (_, expires) = next(iter(self._claims.items()))
+            if expires > now:
+                break
+            del self._claims[key]
+
+    def claim(self, key, task_id, ttl):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            current = self._claims.get(key)
+            if current is not None and current[1] > now:
+                return False
+            self._claims.pop(key, None)  # re-inserted at the end, keeping the dict in expiry order
+            self._claims[key] = (task_id, now + ttl)
+            return True
+
+    def get(self, key):
+        with self._lock:
+            current = self._claims.get(key)
+            return current[0] if current is not None and current[1] > time.monotonic() else None
+
+    def replace(self, key, old_task_id, task_id, ttl):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            current = self._claims.get(key)
+            if current is not None and current[0] != old_task_id and current[1] > now:
+                return False
+            self._claims.pop(key, None)
+            self._claims[key] = (task_id, now + ttl)
+            return True
+
+    def release(self, key, task_id):
+        with self._lock:
+            if self._claims.get(key, (None,))[0] == task_id:
+                del self._claims[key]
+
+
+class RedisFlightStore:
+    """Claims shared by every Flask process through SET NX EX."""
+
+    _REPLACE = """
+    local current = redis.call('GET', KEYS[1])
+    if current and current ~= ARGV[1] then return 0 end
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+    """
+    _RELEASE = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+    return 0
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._replace = self.client.register_script(self._REPLACE)
+        self._release = self.client.register_script(self._RELEASE)
+
+    def claim(self, key, task_id, ttl):
+        return bool(self.client.set(key, task_id, nx=True, ex=ttl))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def replace(self, key, old_task_id, task_id, ttl):
+        return bool(self._replace(keys=[key], args=[old_task_id, task_id, ttl]))
+
+    def release(self, key, task_id):
+        self._release(keys=[key], args=[task_id])
+
+
+class SingleFlight:
+    """
+    Coalesces identical submissions: while a task for `key` is still pending,
+    new submissions get the existing task id instead of launching another one.
+    """
+
+    def __init__(self, store, ttl=SINGLE_FLIGHT_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def submit(self, key, launch, is_pending):
+        """
+        `launch(task_id)` starts the work under a pre-generated id; `is_pending(task_id)`
+        reports whether a previously claimed task is still queued or running.
+        Returns (task_id, attached) where `attached` is True for a coalesced submission.
+        """
+        if self.store is not None:
+            try:
+                return self._submit(key, launch, is_pending)
+            except redis.RedisError:
+                pass  # coalescing is an optimization; never block a submission on it
+        task_id = str(uuid.uuid4())
+        launch(task_id)
+        return task_id, False
+
+    def _submit(self, key, launch, is_pending):
+        for _ in range(3):
+            task_id = str(uuid.uuid4())
+            claimed = self.store.claim(key, task_id, self.ttl)
+            if not claimed:
+                existing = self.store.get(key)
+                if existing is None:
+                    continue  # claim expired between calls; try again
+                if is_pending(existing):
+                    return existing, True
+                # The previous flight already landed: take over the key for a new one
+                claimed = self.store.replace(key, existing, task_id, self.ttl)
+                if not claimed:
+                    continue
+            try:
+                launch(task_id)
+            except Exception:
+                self.store.release(key, task_id)
+                raise
+            return task_id, False
+        raise redis.RedisError("Could not claim a single-flight key")
+
+    def release(self, key, task_id):
+        if self.store is not None:
+            self.store.release(key, task_id)
+
+
+_flight = None
+_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Process-wide coalescer chosen by SINGLE_FLIGHT_BACKEND ("auto" uses Redis when configured)."""
+    global _flight
+    if _flight is None:
+        with _flight_lock:
+            if _flight is None:
+                backend = SINGLE_FLIGHT_BACKEND
+                if backend == "auto":
+                    backend = "redis" if SINGLE_FLIGHT_REDIS_URL.startswith(("redis://", "rediss://")) else "memory"
+                if backend == "redis":
+                    store = RedisFlightStore(SINGLE_FLIGHT_REDIS_URL)
+                elif backend == "off":
+                    store = None
+                else:
+                    store = MemoryFlightStore()
+                _flight = SingleFlight(store)
+    return _flight
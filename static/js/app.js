@@ -123,59 +123,102 @@ async function evaluateWithBackend(prompt) {
   });
   if (!response.ok) throw new Error(`Submit error: ${response.status}`);
   const { task_id } = await response.json();
-  return pollTaskStatus(task_id);
+  // Status requests carry the submit's trace context so they land in the same trace
+  return waitForTask(task_id, response.headers.get('traceparent'));
 }
 
-async function pollTaskStatus(taskId) {
-  const maxAttempts = 30;
-  const interval = 2000;
-  const delay = ms => new Promise(r => setTimeout(r, ms));
-  await delay(1000);
+// Returns the final value for a task response, or undefined while the task is still running
+function handleTaskResponse(status, json) {
+  if (status === 422) {
+    const fallback = "⚠️ Prompt rejected. Please rephrase using a clear, safe, and medically relevant instruction.";
+    const reason = json?.reason || "";
+    const error = json?.error || "";
 
-  for (let attempt = 0; attempt < maxAttempts; attempt++) {
-    try {
-      const res = await fetch(`/api/task/${taskId}`);
-      const json = await res.json();
+    let message = fallback;
 
-      if (res.status === 422) {
-        const fallback = "⚠️ Prompt rejected. Please rephrase using a clear, safe, and medically relevant instruction.";
-        const reason = json?.reason || "";
-        const error = json?.error || "";
+    if (error === "non_medical_prompt") {
+      if (reason.toLowerCase().includes("harmful") || reason.toLowerCase().includes("kill") || reason.toLowerCase().includes("unsafe")) {
+        message = "🚫 This prompt was flagged as harmful or unsafe. Please rephrase with respectful and medically safe language.";
+      } else {
+        message = "⚠️ Prompt rejected for being non-medical or too vague. Add clinical details and clear instructions.";
+      }
+    } else if (error === "Exception during evaluation" && reason.includes("Missing top-level fields")) {
+      message = "🚫 This prompt was flagged as harmful or unsafe. Please rephrase with respectful and medically safe language.";
+    } else {
+      if (reason) message = `⚠️ ${reason}`;
+    }
 
-        let message = fallback;
+    showErrorMessage(message, "Prompt Rejected");
+    clearResults();
+    document.getElementById('result')?.classList.add('hidden');
+    document.getElementById('improvePromptBtn').disabled = true;
+    return json;
+  }
 
-        if (error === "non_medical_prompt") {
-          if (reason.toLowerCase().includes("harmful") || reason.toLowerCase().includes("kill") || reason.toLowerCase().includes("unsafe")) {
-            message = "🚫 This prompt was flagged as harmful or unsafe. Please rephrase with respectful and medically safe language.";
-          } else {
-            message = "⚠️ Prompt rejected for being non-medical or too vague. Add clinical details and clear instructions.";
-          }
-        } else if (error === "Exception during evaluation" && reason.includes("Missing top-level fields")) {
-          message = "🚫 This prompt was flagged as harmful or unsafe. Please rephrase with respectful and medically safe language.";
-        } else {
-          if (reason) message = `⚠️ ${reason}`;
-        }
+  if (json.status === "completed" && json.result) {
+    return json.result;
+  }
 
-        showErrorMessage(message, "Prompt Rejected");
-        clearResults();
-        document.getElementById('result')?.classList.add('hidden');
-        document.getElementById('improvePromptBtn').disabled = true;
-        return json;
-      }
+  if (json.status === "completed" && json.result && json.result.error) {
+    // Backend returned completed but with an error
+    showErrorMessage(json.result.reason || "Prompt rejected.", "Prompt Rejected");
+    clearResults();
+    document.getElementById('result')?.classList.add('hidden');
+    document.getElementById('improvePromptBtn').disabled = true;
+    return json;
+  }
+}
 
-      if (json.status === "completed" && json.result) {
-        return json.result;
-      }
+// Prefer the SSE stream; fall back to polling when EventSource or the stream is unavailable
+async function waitForTask(taskId, traceparent) {
+  if (window.EventSource) {
+    try {
+      return await streamTaskEvents(taskId, traceparent);
+    } catch (error) {
+      if (!error.fallbackToPolling) throw error;
+    }
+  }
+  return pollTaskStatus(taskId, traceparent);
+}
+
+function streamTaskEvents(taskId, traceparent) {
+  return new Promise((resolve, reject) => {
+    // EventSource cannot set headers, so the trace context goes in the query string
+    const query = traceparent ? `?traceparent=${encodeURIComponent(traceparent)}` : '';
+    const source = new EventSource(`/api/task/${taskId}/events${query}`);
+    let settled = false;
+    const finish = (fn, value) => {
+      if (settled) return;
+      settled = true;
+      source.close();
+      fn(value);
+    };
+    const fallBack = () => finish(reject, Object.assign(new Error("Task event stream unavailable"), { fallbackToPolling: true }));
+
+    source.addEventListener('result', event => {
+      const json = JSON.parse(event.data);
+      const outcome = handleTaskResponse(json.http_status, json);
+      if (outcome !== undefined) return finish(resolve, outcome);
+      showErrorMessage(`⚠️ ${json.error || "Evaluation failed."}`, "Backend Error");
+      finish(reject, new Error(json.error || "Evaluation failed"));
+    });
+    source.addEventListener('timeout', fallBack);
+    source.onerror = fallBack;
+  });
+}
 
+async function pollTaskStatus(taskId, traceparent) {
+  const maxAttempts = 30;
+  const interval = 2000;
+  const delay = ms => new Promise(r => setTimeout(r, ms));
+  await delay(1000);
 
-      if (json.status === "completed" && json.result && json.result.error) {
-        // Backend returned completed but with an error
-        showErrorMessage(json.result.reason || "Prompt rejected.", "Prompt Rejected");
-        clearResults();
-        document.getElementById('result')?.classList.add('hidden');
-        document.getElementById('improvePromptBtn').disabled = true;
-        return json;
-      }
+  for (let attempt = 0; attempt < maxAttempts; attempt++) {
+    try {
+      const res = await fetch(`/api/task/${taskId}`, { headers: traceparent ? { traceparent } : {} });
+      const json = await res.json();
+      const outcome = handleTaskResponse(res.status, json);
+      if (outcome !== undefined) return outcome;
 
       if (attempt < maxAttempts - 1) await delay(interval);
     } catch (error) {
@@ -188,6 +231,67 @@ async function pollTaskStatus(taskId) {
   throw new Error("Evaluation timed out");
 }
 
+// ================== PROMPT IMPROVEMENT ==================
+async function fetchImprovedPrompt(prompt) {
+  const res = await fetch('/api/improve_prompt', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ prompt })
+  });
+  const data = await res.json();
+  return data.improved;
+}
+
+// Reads `event:`/`data:` frames from a text/event-stream response body
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
+// Renders tokens into the box as they arrive; the spinner only covers time-to-first-token
+async function streamImprovedPrompt(prompt, optimizedBox) {
+  const res = await fetch('/api/improve_prompt/stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ prompt })
+  });
+  if (!res.ok || !res.body) return fetchImprovedPrompt(prompt);
+
+  let text = '';
+  let improved = '';
+  await readEventStream(res, (event, data) => {
+    if (event === 'token') {
+      if (!text) {
+        document.getElementById('loading').style.display = 'none';
+        optimizedBox?.scrollIntoView({ behavior: 'smooth' });
+      }
+      text += data.text;
+      if (optimizedBox) optimizedBox.value = text.trimStart();
+    } else if (event === 'done' || event === 'error') {
+      improved = data.improved;
+    }
+  });
+  return improved;
+}
+
 // ================== CHART RENDERING ==================
 function renderChart(result) {
   const isDarkMode = document.body.classList.contains('dark-mode');
@@ -396,18 +500,14 @@ window.addEventListener('DOMContentLoaded', () => {
     document.getElementById('loading').style.display = 'block';
 
     try {
-      const res = await fetch('/api/improve_prompt', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ prompt })
-      });
-
-      const data = await res.json();
+      const optimizedBox = document.getElementById('improvedPrompt');
+      const improved = (window.ReadableStream && window.TextDecoder)
+        ? await streamImprovedPrompt(prompt, optimizedBox)
+        : await fetchImprovedPrompt(prompt);
 
-      if (data.improved) {
-        const optimizedBox = document.getElementById('improvedPrompt');
+      if (improved) {
         if (optimizedBox) {
-          optimizedBox.value = data.improved;
+          optimizedBox.value = improved;
           optimizedBox.scrollIntoView({ behavior: 'smooth' });
         }
       } else {
@@ -0,0 +1,245 @@
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+import redis.asyncio
+from celery import states
+
+# ✅ Task event settings, overridable from .env
+TASK_EVENTS_REDIS_URL = os.getenv("TASK_EVENTS_REDIS_URL") or os.getenv("CELERY_RESULT_BACKEND", "")
+TASK_EVENTS_TIMEOUT = float(os.getenv("TASK_EVENTS_TIMEOUT", "60"))  # max lifetime of one SSE stream
+TASK_EVENTS_HEARTBEAT = float(os.getenv("TASK_EVENTS_HEARTBEAT", "15"))  # keep-alive comment interval
+TASK_EVENTS_POLL_INTERVAL = float(os.getenv("TASK_EVENTS_POLL_INTERVAL", "0.5"))  # used when Redis is unavailable
+TASK_REPORT_TTL = int(os.getenv("TASK_REPORT_TTL", "86400"))  # how long a task is remembered as logged
+CHANNEL_PREFIX = "taskevents:"
+REPORTED_PREFIX = "taskreported:"
+MAX_REPORTED_IN_MEMORY = 10000
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def channel_name(task_id):
+    return CHANNEL_PREFIX + task_id
+
+
+def get_redis():
+    """Shared client for task events, or None when no redis:// URL is configured."""
+    global _client
+    if _client is None and TASK_EVENTS_REDIS_URL.startswith(("redis://", "rediss://")):
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(TASK_EVENTS_REDIS_URL, decode_responses=True)
+    return _client
+
+
+def publish_task_event(task_id, state):
+    """Called from Celery signals in the worker; events are best effort and never fail a task."""
+    client = get_redis()
+    if client is None or not task_id:
+        return
+    try:
+        client.publish(channel_name(task_id), json.dumps({"task_id": task_id, "state": state}))
+    except redis.RedisError:
+        pass
+
+
+_reported = OrderedDict()
+_reported_lock = threading.Lock()
+
+
+def first_report(task_id):
+    """True only the first time a finished task is read, so polling and SSE log its result once."""
+    client = get_redis()
+    if client is not None:
+        try:
+            return bool(client.set(REPORTED_PREFIX + task_id, 1, nx=True, ex=TASK_REPORT_TTL))
+        except redis.RedisError:
+            pass
+    # Without Redis, remember recent tasks in this process only
+    with _reported_lock:
+        if task_id in _reported:
+            return False
+        _reported[task_id] = True
+        if len(_reported) > MAX_REPORTED_IN_MEMORY:
+            _reported.popitem(last=False)
+        return True
+
+
+def format_sse(data, event=None):
+    frame = f"event: {event}\n" if event else ""
+    return frame + "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+
+
+def _subscribe(task_id):
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel_name(task_id))
+        return pubsub
+    except redis.RedisError:
+        return None
+
+
+class _EventStream:
+    """
+    State shared by the sync and async SSE loops: which frames to send for a backend
+    snapshot or a pub/sub message, and when to stop, send a heartbeat or re-check the backend.
+    """
+
+    def __init__(self, timeout, heartbeat):
+        self.heartbeat = heartbeat
+        self.deadline = time.monotonic() + timeout
+        self.next_heartbeat = time.monotonic() + heartbeat
+        self.last_state = None
+        self.check_backend = True
+        self.done = False
+
+    def on_snapshot(self, state, body, status):
+        if state in states.READY_STATES:
+            self.done = True
+            return [format_sse({**body, "http_status": status}, "result")]
+        # An untracked task reads PENDING until it finishes; don't undo a pushed "started"
+        if state != self.last_state and (self.last_state is None or state != states.PENDING):
+            self.last_state = state
+            return [format_sse(body, "status")]
+        return []
+
+    def on_tick(self):
+        """Frames due now, and how long to wait for the next message."""
+        now = time.monotonic()
+        if now >= self.deadline:
+            self.done = True
+            return [format_sse({"status": "timeout"}, "timeout")], 0
+        frames = []
+        if now >= self.next_heartbeat:
+            self.next_heartbeat = now + self.heartbeat
+            frames.append(": keep-alive\n\n")
+        return frames, min(self.deadline, self.next_heartbeat) - now
+
+    def on_message(self, message):
+        if message is None:
+            self.check_backend = True  # heartbeat: re-check in case an event was missed
+            return []
+        event_state = json.loads(message["data"]).get("state")
+        if event_state in states.READY_STATES:
+            self.check_backend = True  # the worker stores the result before it publishes
+            return []
+        self.check_backend = False
+        if event_state != self.last_state:
+            self.last_state = event_state
+            return [format_sse({"status": event_state.lower()}, "status")]
+        return []
+
+
+def iter_task_events(task_id, snapshot, timeout=TASK_EVENTS_TIMEOUT, heartbeat=TASK_EVENTS_HEARTBEAT):
+    """
+    SSE frames for one task. `snapshot()` returns (state, body, http_status) from the result backend.
+    Emits `status` events on state changes and one `result` event carrying the final body,
+    then ends. Without Redis it falls back to checking the backend every TASK_EVENTS_POLL_INTERVAL.
+    """
+    # Subscribe before the first snapshot so a task finishing in between is not missed
+    pubsub = _subscribe(task_id)
+    stream = _EventStream(timeout, heartbeat)
+    try:
+        yield "retry: 2000\n\n"
+        while True:
+            if stream.check_backend:
+                yield from stream.on_snapshot(*snapshot())
+                if stream.done:
+                    return
+            frames, wait = stream.on_tick()
+            yield from frames
+            if stream.done:
+                return
+            if pubsub is None:
+                time.sleep(min(wait, TASK_EVENTS_POLL_INTERVAL))
+                stream.check_backend = True
+                continue
+            try:
+                message = pubsub.get_message(timeout=wait)
+            except redis.RedisError:
+                pubsub = None
+                stream.check_backend = True
+                continue
+            yield from stream.on_message(message)
+    finally:
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except redis.RedisError:
+                pass
+
+
+_async_client = None
+
+
+def get_async_redis():
+    """asyncio client for task events (one per process, used from the ASGI event loop)."""
+    global _async_client
+    if _async_client is None and TASK_EVENTS_REDIS_URL.startswith(("redis://", "rediss://")):
+        _async_client = redis.asyncio.Redis.from_url(TASK_EVENTS_REDIS_URL, decode_responses=True)
+    return _async_client
+
+
+async def aclose_async_redis():
+    global _async_client
+    if _async_client is not None:
+        client, _async_client = _async_client, None
+        await client.aclose()
+
+
+async def _async_subscribe(task_id):
+    client = get_async_redis()
+    if client is None:
+        return None
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        await pubsub.subscribe(channel_name(task_id))
+        return pubsub
+    except (redis.RedisError, OSError):
+        await pubsub.aclose()
+        return None
+
+
+async def aiter_task_events(task_id, snapshot, timeout=TASK_EVENTS_TIMEOUT, heartbeat=TASK_EVENTS_HEARTBEAT):
+    """iter_task_events for the ASGI app: `snapshot` is awaited and Redis is read without blocking a thread."""
+    pubsub = await _async_subscribe(task_id)
+    stream = _EventStream(timeout, heartbeat)
+    try:
+        yield "retry: 2000\n\n"
+        while True:
+            if stream.check_backend:
+                for frame in stream.on_snapshot(*await snapshot()):
+                    yield frame
+                if stream.done:
+                    return
+            frames, wait = stream.on_tick()
+            for frame in frames:
+                yield frame
+            if stream.done:
+                return
+            if pubsub is None:
+                await asyncio.sleep(min(wait, TASK_EVENTS_POLL_INTERVAL))
+                stream.check_backend = True
+                continue
+            try:
+                message = await pubsub.get_message(timeout=wait)
+            except (redis.RedisError, OSError):
+                await pubsub.aclose()
+                pubsub = None
+                stream.check_backend = True
+                continue
+            for frame in stream.on_message(message):
+                yield frame
+    finally:
+        if pubsub is not None:
+            with contextlib.suppress(redis.RedisError, OSError):
+                await pubsub.aclose()
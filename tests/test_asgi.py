@@ -0,0 +1,44 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asgi import PooledWsgiToAsgi  # noqa: E402
+
+
+def slow_wsgi_app(environ, start_response):
+    time.sleep(0.5)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [threading.current_thread().name.encode()]
+
+
+async def call(app, path="/"):
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": [], "server": ("test", 80), "client": ("test", 1234),
+             "scheme": "http", "http_version": "1.1"}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+
+
+def test_flask_routes_run_concurrently():
+    app = PooledWsgiToAsgi(slow_wsgi_app, ThreadPoolExecutor(max_workers=4))
+
+    async def main():
+        return await asyncio.gather(*(call(app) for _ in range(4)))
+
+    started = time.perf_counter()
+    threads = asyncio.run(main())
+    assert time.perf_counter() - started < 1.5
+    assert len(set(threads)) == 4
@@ -0,0 +1,223 @@
+import json
+import math
+import os
+import random
+import sys
+
+import json5
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from json_extract import (  # noqa: E402
+    IncrementalJSONExtractor, auto_close_json, clean_llm_output, extract_json_text, parse_llm_json, repair_llm_json,
+)
+
+
+def legacy_parse(text):
+    # The clean/repair/auto-close + json5 chain parse_llm_json replaced
+    return json5.loads(auto_close_json(repair_llm_json(clean_llm_output(text))))
+
+
+def legacy_parse_list(text):
+    start, end = text.find("["), text.rfind("]")
+    return json5.loads(auto_close_json(repair_llm_json(text[start:end + 1])))
+
+
+def _same(a, b):
+    # NaN != NaN, so compare the canonical JSON text instead
+    return json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+
+
+def _load_corpus():
+    with open(os.path.join(ROOT, "benchmarks", "data", "llm_outputs.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# Samples the legacy chain parses differently on purpose: truncated strings are dropped instead of
+# cutting the object at the last "}", and text after the first object no longer breaks parsing
+DIVERGENT = {"truncated", "truncated_in_list", "missing_commas", "trailing_chatter"}
+
+
+@pytest.mark.parametrize("sample", _load_corpus(), ids=lambda sample: sample["name"])
+def test_corpus_matches_legacy_chain(sample):
+    new = parse_llm_json(sample["output"])
+    assert isinstance(new, dict)
+    if sample["name"] not in DIVERGENT:
+        assert _same(new, legacy_parse(sample["output"]))
+
+
+def _random_string(rng):
+    # No digits right before a closing quote: the legacy repair_llm_json inserts a comma there
+    alphabet = "abcdefghij klmnop QRSTUV .,;?!-'()/é–ü\n\t\\\""
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) + rng.choice("xyz")
+
+
+def _random_value(rng, depth=0):
+    roll = rng.random()
+    if depth < 3 and roll < 0.15:
+        return {_random_string(rng): _random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    if depth < 3 and roll < 0.3:
+        return [_random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return rng.choice([
+        rng.randint(-1000, 1000), round(rng.uniform(-100, 100), 3), True, False, None, _random_string(rng),
+    ])
+
+
+def _random_result(rng):
+    return {
+        "score": rng.randint(0, 100),
+        "criteria": {name: rng.randint(0, 30) for name in ("safety", "clinical_clarity", "specificity")},
+        "suggestions": [_random_string(rng) for _ in range(rng.randint(1, 3))],
+        "extra": _random_value(rng),
+    }
+
+
+def _render(rng, value):
+    text = json.dumps(value, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+    style = rng.choice(["plain", "fenced", "prose", "triple", "trailing_commas"])
+    if style == "fenced":
+        return f"```json\n{text}\n```"
+    if style == "prose":
+        return f"Here is the evaluation:\n{text}"
+    if style == "triple":
+        return f'"""\n{text}\n"""'
+    if style == "trailing_commas":
+        return text.replace("}", ",}").replace("]", ",]").replace("{,}", "{}").replace("[,]", "[]")
+    return text
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_fuzzed_outputs_match_legacy_chain(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        value = _random_result(rng)
+        text = _render(rng, value)
+        new = parse_llm_json(text)
+        assert _same(new, value), text
+        assert _same(new, legacy_parse(text)), text
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_fuzzed_lists_match_legacy_chain(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        value = [_random_result(rng) for _ in range(rng.randint(0, 3))]
+        text = _render(rng, value)
+        new = parse_llm_json(text, root="[")
+        assert _same(new, value), text
+        assert _same(new, legacy_parse_list(text)), text
+
+
+@pytest.mark.parametrize("token, expected", [
+    (".5", 0.5), ("+5", 5), ("5.", 5.0), ("-.25", -0.25), ("0x1F", 31), ("-0x10", -16), ("1e3", 1000.0),
+    ("NaN", float("nan")), ("Infinity", float("inf")), ("-Infinity", float("-inf")), ("+Infinity", float("inf")),
+])
+def test_json5_numbers_stay_numeric(token, expected):
+    text = f'{{"score": {token}, "suggestions": ["Add age."]}}'
+    parsed = parse_llm_json(text)
+    assert _same(parsed, legacy_parse(text))
+    assert type(parsed["score"]) is type(expected)
+    assert _same(parsed["score"], expected)
+
+
+@pytest.mark.parametrize("token", ["0x", "1.2.3", "5abc", "Nope", "--5", "+"])
+def test_non_numbers_become_strings(token):
+    assert parse_llm_json(f'{{"value": {token}}}') == {"value": token}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"score": 80, "suggestions": ["Add age.", "Spec', {"score": 80, "suggestions": ["Add age."]}),
+    ('{"score": 80, "suggestions": ["Add age."], "note": "cut', {"score": 80, "suggestions": ["Add age."]}),
+    ('{"score": 80, "note": "cut', {"score": 80}),
+    ('{"score": 80, "suggestions": ["Add age.", ', {"score": 80, "suggestions": ["Add age."]}),
+    ('{"score": 80, "criteria": {"safety": 30, "clar', {"score": 80, "criteria": {"safety": 30}}),
+    ('{"score": 80, "criteria": {"safety": ', {"score": 80, "criteria": {"safety": None}}),
+    ('{"score": 8', {"score": 8}),
+    ("{'score': 80, 'suggestions': ['Add age.', 'Spec", {"score": 80, "suggestions": ["Add age."]}),
+    ('{"score": 80, "note": """cut', {"score": 80}),
+    ("```json\n{\"score\": 80, \"suggestions\": [\"Add age.\"", {"score": 80, "suggestions": ["Add age."]}),
+])
+def test_truncated_output_drops_cut_off_strings(text, expected):
+    assert parse_llm_json(text) == expected
+
+
+def test_every_prefix_keeps_only_complete_strings():
+    value = {"score": 78, "criteria": {"safety": 25, "specificity": 15},
+             "suggestions": ["Specify the patient age", "Name the guideline"]}
+    text = json.dumps(value)
+    complete = {"score", "criteria", "safety", "specificity", "suggestions"} | set(value["suggestions"])
+
+    def strings(node):
+        if isinstance(node, dict):
+            for key, item in node.items():
+                yield key
+                yield from strings(item)
+        elif isinstance(node, list):
+            for item in node:
+                yield from strings(item)
+        elif isinstance(node, str):
+            yield node
+
+    for cut in range(1, len(text) + 1):
+        parsed = parse_llm_json(text[:cut])
+        assert set(strings(parsed)) <= complete, text[:cut]
+    assert parse_llm_json(text) == value
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('[{"a": 1}, {"b": 2}', [{"a": 1}, {"b": 2}]),
+    ('Result:\n```json\n[{"a": 1}]\n```', [{"a": 1}]),
+    ('["Add age.", "Spec', ["Add age."]),
+    ('[1, 2, [3', [1, 2, [3]]),
+    ('[]', []),
+])
+def test_list_root(text, expected):
+    assert parse_llm_json(text, root="[") == expected
+
+
+def test_list_root_skips_leading_object():
+    # With root="[" the first "[" starts the result even when an object comes first
+    assert parse_llm_json('{"a": [1, 2]}', root="[") == [1, 2]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": "Mention 2"}', {"a": "Mention 2"}),   # legacy repair_llm_json turned this into "Mention 2,\n"
+    ('{"a": 1}\nNote: {b} first.', {"a": 1}),
+    ('{"a": 1 "b": 2}', {"a": 1, "b": 2}),
+    ('{a: 1, b: True, c: None}', {"a": 1, "b": True, "c": None}),
+    ('{"a": "line\nbreak"}', {"a": "line\nbreak"}),
+    ('{"a" 1}', {"a": 1}),
+    ('{"a": 1 /* note */, "b": 2}', {"a": 1, "b": 2}),
+    ('no json here', None),
+])
+def test_repairs_beyond_legacy_chain(text, expected):
+    if expected is None:
+        with pytest.raises(ValueError):
+            parse_llm_json(text)
+    else:
+        assert parse_llm_json(text) == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_chunked_feed_matches_single_pass(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        text = _render(rng, _random_result(rng)) + "\ntrailing {chatter}"
+        extractor = IncrementalJSONExtractor()
+        pos = 0
+        while pos < len(text) and not extractor.done:
+            step = rng.randint(1, 8)
+            extractor.feed(text[pos:pos + step])
+            pos += step
+        assert extractor.finish() == extract_json_text(text), text
+
+
+def test_text_mid_stream_is_valid_json():
+    extractor = IncrementalJSONExtractor()
+    assert extractor.text() == ""
+    assert not extractor.feed('{"score": 80, "suggestions": ["Add')
+    assert json.loads(extractor.text()) == {"score": 80, "suggestions": []}
+    assert extractor.feed(' age."]}')
+    assert math.isclose(json.loads(extractor.text())["score"], 80)
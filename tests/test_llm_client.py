@@ -0,0 +1,69 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_client  # noqa: E402
+from llm_client import CircuitBreaker, CircuitOpenError  # noqa: E402
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    breaker = CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    return breaker
+
+
+def test_cancelled_async_probe_releases_half_open_breaker(half_open):
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.sleep(60)
+
+    async def main():
+        probe = asyncio.create_task(llm_client._async_with_retries(hang))
+        await started.wait()
+        with pytest.raises(CircuitOpenError):
+            await llm_client._async_with_retries(hang)  # only one probe at a time
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "ok"
+
+        return await llm_client._async_with_retries(ok)
+
+    assert asyncio.run(main()) == "ok"
+    assert half_open.state == "closed"
+
+
+def test_interrupted_sync_probe_releases_half_open_breaker(half_open):
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        llm_client._with_retries(interrupted)
+    assert llm_client._with_retries(lambda: "ok") == "ok"
+    assert half_open.state == "closed"
+
+
+def test_slot_wait_times_out_with_busy_error(monkeypatch):
+    monkeypatch.setattr(llm_client, "OLLAMA_SLOT_TIMEOUT", 0.05)
+    llm_client.set_slot_limit(1)
+    try:
+        with llm_client.inflight_slots():
+            with pytest.raises(llm_client.LLMBusyError):
+                with llm_client.inflight_slots():
+                    pass
+        with llm_client.inflight_slots():
+            pass  # the slot was given back
+    finally:
+        llm_client.set_slot_limit(0)
+    assert llm_client.breaker.state == "closed"
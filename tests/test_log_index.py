@@ -0,0 +1,30 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_index import LogIndex, iter_indexed_entries  # noqa: E402
+from log_reader import LogFilter  # noqa: E402
+
+# Naive local time around the end of DST: the clock goes back from 01:59 to 01:00
+STAMPS = ["2026-10-25T01:30:00", "2026-10-25T01:50:00", "2026-10-25T01:10:00", "2026-10-25T01:40:00"]
+
+
+def _window(path, **window):
+    log_filter = LogFilter(**{k: datetime.fromisoformat(v) for k, v in window.items()})
+    return [entry["timestamp"] for _, entry in iter_indexed_entries(path, log_filter=log_filter, index=LogIndex(path))
+            if log_filter.matches(entry)]
+
+
+def test_time_window_survives_clock_going_back(tmp_path):
+    path = str(tmp_path / "logs.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps({"timestamp": ts, "score": 50}) + "\n" for ts in STAMPS))
+
+    index = LogIndex(path)
+    index.refresh()
+    assert not index.monotonic()
+    assert _window(path, since="2026-10-25T01:35:00") == [STAMPS[1], STAMPS[3]]
+    assert _window(path, until="2026-10-25T01:20:00") == [STAMPS[2]]
@@ -0,0 +1,39 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_reader import LogFilter, parse_timestamp, read_log_page  # noqa: E402
+
+
+def test_offsets_are_converted_to_utc():
+    assert parse_timestamp("2026-05-01T12:00:00+02:00") == datetime(2026, 5, 1, 10, 0)
+    assert parse_timestamp("2026-05-01T10:00:00Z") == datetime(2026, 5, 1, 10, 0)
+    assert parse_timestamp("2026-05-01T10:00:00") == datetime(2026, 5, 1, 10, 0)
+    assert parse_timestamp("not a time") is None
+
+
+def _write_log(path, stamps):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps({"timestamp": ts, "score": 50}) + "\n" for ts in stamps))
+
+
+def test_exactly_full_last_page_has_no_more(tmp_path):
+    path = str(tmp_path / "logs.jsonl")
+    _write_log(path, [f"2026-05-01T10:00:0{i}+00:00" for i in range(4)])
+
+    entries, cursor, has_more = read_log_page(path, limit=2)
+    assert len(entries) == 2 and has_more
+    entries, cursor, has_more = read_log_page(path, after=cursor, limit=2)
+    assert len(entries) == 2 and not has_more
+    assert read_log_page(path, after=cursor, limit=2) == ([], cursor, False)
+
+
+def test_since_filter_with_offset_selects_the_same_instant(tmp_path):
+    path = str(tmp_path / "logs.jsonl")
+    _write_log(path, ["2026-05-01T09:59:00+00:00", "2026-05-01T10:01:00+00:00"])
+    log_filter = LogFilter(since=parse_timestamp("2026-05-01T12:00:00+02:00"))
+    entries, _, _ = read_log_page(path, log_filter=log_filter)
+    assert [entry["timestamp"] for entry in entries] == ["2026-05-01T10:01:00+00:00"]
@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_segments  # noqa: E402
+from log_segments import iter_segmented_entries, load_manifest, maybe_rotate  # noqa: E402
+
+
+def _line(i):
+    return json.dumps({"timestamp": f"2026-01-01T00:00:{i:02d}", "n": i}) + "\n"
+
+
+def test_append_racing_rotation_keeps_offsets(tmp_path, monkeypatch):
+    path = str(tmp_path / "logs.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(_line(i) for i in range(3)))
+
+    compress = log_segments._compress
+
+    def late_append(src, compression):
+        # Another process's batch lands in the renamed file after the rename
+        with open(src, "a", encoding="utf-8") as f:
+            f.write(_line(3) + _line(4)[:10])
+        return compress(src, compression)
+
+    monkeypatch.setattr(log_segments, "_compress", late_append)
+    assert maybe_rotate(path, max_bytes=1)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(_line(4)[10:] + _line(5))
+
+    segment = load_manifest(path)["segments"][0]
+    assert segment["size"] == len("".join(_line(i) for i in range(4)))
+    entries = list(iter_segmented_entries(path))
+    assert [entry["n"] for _, entry in entries] == list(range(6))
+    offsets = [offset for offset, _ in entries]
+    assert offsets == [sum(len(_line(j)) for j in range(i + 1)) for i in range(6)]
+
+
+def test_batches_written_while_moving_the_tail_are_kept(tmp_path, monkeypatch):
+    path = str(tmp_path / "logs.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(_line(i) for i in range(2)))
+
+    compress = log_segments._compress
+    writers = []
+
+    def slow_writer(src, compression):
+        # A writer that opened the log before the rename and writes while the tail is being moved
+        f = open(src, "a", encoding="utf-8")
+        result = compress(src, compression)
+        timer = threading.Timer(0.05, lambda: (f.write(_line(2)), f.close()))
+        timer.start()
+        writers.append(timer)
+        return result
+
+    monkeypatch.setattr(log_segments, "_compress", slow_writer)
+    assert maybe_rotate(path, max_bytes=1)
+    writers[0].join()
+    assert [entry["n"] for _, entry in iter_segmented_entries(path)] == [0, 1, 2]
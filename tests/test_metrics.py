@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import celery_worker  # noqa: E402
+import metrics  # noqa: E402
+
+
+def _runtime_count(task_name):
+    return sum(sample.value for metric in metrics.TASK_RUNTIME.collect() for sample in metric.samples
+               if sample.name.endswith("_count") and sample.labels["task"] == task_name)
+
+
+def test_task_runtime_is_timed_from_the_request(monkeypatch):
+    monkeypatch.setitem(celery_worker.celery.conf, "task_always_eager", True)
+    monkeypatch.setitem(celery_worker.celery.conf, "task_store_eager_result", False)
+
+    @celery_worker.celery.task(name="tests.noop")
+    def noop():
+        return 1
+
+    assert noop.apply().get() == 1
+    assert _runtime_count("tests.noop") == 1
+    assert not hasattr(metrics, "_task_started")
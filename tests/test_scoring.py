@@ -0,0 +1,133 @@
+import glob
+import json
+import os
+import random
+import re
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scoring import (  # noqa: E402
+    CRITERIA, CRITERIA_KEYS, batch_evaluate_prompts, criteria_hits, hit_codes, hit_matrix, regex_evaluate_prompt,
+)
+
+
+# The per-criterion regexes the rubric was originally evaluated with, one re.search each
+REFERENCE = {
+    key: re.compile(r'\b(' + '|'.join(re.escape(word) for word in rule["keywords"]) + r')\b', re.IGNORECASE)
+    for key, rule in CRITERIA.items()
+}
+
+
+def reference_hits(prompt):
+    return {key for key, pattern in REFERENCE.items() if pattern.search(prompt)}
+
+
+def reference_evaluate(prompt):
+    hits = reference_hits(prompt)
+    total = sum(CRITERIA[key]["weight"] for key in CRITERIA_KEYS if key in hits)
+    suggestions = [f"Consider strengthening: {key.replace('_', ' ').title()}" for key in CRITERIA_KEYS if key not in hits]
+    return round(total * 100), {key: key in hits for key in CRITERIA_KEYS}, suggestions
+
+
+def assert_batch_matches_reference(prompts):
+    expected = [reference_evaluate(prompt) for prompt in prompts]
+    matrix = hit_matrix(prompts)
+    assert matrix.shape == (len(prompts), len(CRITERIA_KEYS))
+    codes = hit_codes(prompts).tolist()
+    results, stats = batch_evaluate_prompts(prompts)
+    assert stats["count"] == len(prompts)
+    for row, (prompt, (score, criteria, suggestions)) in enumerate(zip(prompts, expected)):
+        assert dict(zip(CRITERIA_KEYS, matrix[row].tolist())) == criteria, prompt
+        assert codes[row] == sum(1 << i for i, key in enumerate(CRITERIA_KEYS) if criteria[key]), prompt
+        assert results[row] == {"score": score, "criteria_scores": criteria, "suggestions": suggestions}, prompt
+        assert criteria_hits(prompt) == reference_hits(prompt), prompt
+        assert regex_evaluate_prompt(prompt) == (score, criteria, suggestions), prompt
+
+
+def _prompt_sets():
+    prompts = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "prompts_sets", "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            for item in json.load(f):
+                prompts.append(item["prompt"] if isinstance(item, dict) else item)
+    return prompts
+
+
+def test_prompt_sets_match_reference():
+    prompts = _prompt_sets()
+    assert prompts
+    assert_batch_matches_reference(prompts)
+
+
+def _fuzz_prompts(rng, count):
+    keywords = [word for rule in CRITERIA.values() for word in rule["keywords"]]
+    pieces = keywords + [
+        "Patient", "STEPS", "side-effect", "side  effect", "sideeffect", "step-by-stepx", "xrisk", "risk_",
+        "guide2", "tip.", "list,", "(asthma)", "ſtep-by-ſtep", "Rİsk", "é", "naïve", "\0", "\t", "\n", "-", "_",
+        "'", "", "the", "and", "diagnose", "histories", "medications", "warnings",
+    ]
+    separators = [" ", "", "-", "_", ".", "\0", "\n", "é"]
+    prompts = []
+    for _ in range(count):
+        words = rng.choices(pieces, k=rng.randint(0, 8))
+        prompts.append("".join(word + rng.choice(separators) for word in words))
+    return prompts
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fuzzed_batches_match_reference(seed):
+    rng = random.Random(seed)
+    prompts = _fuzz_prompts(rng, 300)
+    assert_batch_matches_reference(prompts)
+    ascii_only = [prompt for prompt in prompts if prompt.isascii()]
+    assert_batch_matches_reference(ascii_only)
+
+
+@pytest.mark.parametrize("prompt", [
+    "ſtep-by-ſtep plan",   # long s folds to "s" under re.IGNORECASE
+    "Liſt the riſks",
+    "ſide effect",
+    "ſide ſtep",
+    "Step-By-Step",
+    "STEP-BY-STEP",
+    "step-by-stepx",
+    "xstep-by-step",
+    "step-by-step_",
+    "side\0effect",
+    "side effect\0",
+    "\0risk\0",
+    "",
+    "\0",
+    "é risk",
+    "riské",
+    "éguide",
+    "naïve patient",
+    "side effects",
+    "side  effect",
+    "guide",
+])
+def test_edge_cases_match_reference(prompt):
+    assert_batch_matches_reference([prompt])
+
+
+def test_nul_joined_batch_boundaries():
+    # Adjacent prompts are joined with NUL internally; nothing may match across the join
+    prompts = ["guide side", "effect", "side", "effect please", "step-by-", "step", "ris", "k", "risk", "", "\0"]
+    assert_batch_matches_reference(prompts)
+    assert hit_codes(["side", "effect"]).tolist() == [0, 0]
+    assert hit_codes(["list", "x"]).tolist()[1] == 0
+
+
+def test_mixed_ascii_and_unicode_batch_keeps_row_order():
+    prompts = ["risk", "ſtep-by-ſtep", "patient", "é", "side effect", "naïve asthma", ""]
+    assert_batch_matches_reference(prompts)
+
+
+def test_empty_batch():
+    assert hit_codes([]).tolist() == []
+    assert hit_matrix([]).shape == (0, len(CRITERIA_KEYS))
+    assert batch_evaluate_prompts([]) == ([], {"count": 0})
@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import similarity_cache  # noqa: E402
+from llm_cache import LRUCache, NullCache  # noqa: E402
+from similarity_cache import SimilarityIndex, find_similar, remember_similar  # noqa: E402
+
+PROMPT = "Outline the first-line management of hypertension in a 64-year-old patient with diabetes."
+
+
+def test_processes_merge_saved_entries(tmp_path):
+    path = str(tmp_path / "similarity_index.npz")
+    first, second = SimilarityIndex(), SimilarityIndex()
+    first.add(PROMPT, "key-a")
+    first.add("List red-flag symptoms of migraine for a nursing handout.", "key-gone")
+    second.add("Compare dosing considerations for insulin in type 2 diabetes.", "key-b")
+    assert first.save(path) and second.save(path)
+
+    entry = first.query("List red-flag symptoms of migraine for a nursing handout.")[0][2]
+    first.discard(entry, "key-gone")
+    assert first.save(path)
+
+    restored = SimilarityIndex()
+    assert restored.load(path)
+    assert restored.query(PROMPT.upper())[0][1] == "key-a"
+    assert restored.query("compare dosing considerations for insulin in type 2 diabetes")[0][1] == "key-b"
+    assert not restored.query("List red-flag symptoms of migraine for a nursing handout.")
+
+
+def test_index_is_skipped_without_a_result_cache(monkeypatch):
+    index = SimilarityIndex()
+    monkeypatch.setattr(similarity_cache, "_index", index)
+    monkeypatch.setattr(similarity_cache, "SIMILARITY_INDEX_PATH", "")
+    remember_similar(NullCache(), PROMPT, "key-a", "ctx")
+    assert len(index) == 0
+
+    cache = LRUCache()
+    cache.set("key-a", {"score": 80})
+    remember_similar(cache, PROMPT, "key-a", "ctx")
+    assert find_similar(NullCache(), PROMPT, "ctx") == (None, None)
+    result, similarity = find_similar(cache, PROMPT + "!", "ctx")
+    assert result == {"score": 80} and similarity >= 0.9
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["similar_hits"]) == (0, 0, 1)
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import single_flight  # noqa: E402
+from single_flight import MemoryFlightStore  # noqa: E402
+
+
+def test_memory_store_drops_expired_claims(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(single_flight.time, "monotonic", lambda: now[0])
+    store = MemoryFlightStore()
+    for i in range(100):
+        assert store.claim(f"key-{i}", f"task-{i}", ttl=10)
+    assert not store.claim("key-0", "other", ttl=10)
+
+    now[0] += 11
+    assert store.claim("fresh", "task-fresh", ttl=10)
+    assert list(store._claims) == ["fresh"]
+    assert store.get("key-0") is None
+    assert store.replace("fresh", "task-fresh", "task-next", ttl=10)
+    assert not store.replace("fresh", "task-fresh", "task-late", ttl=10)
+    assert store.get("fresh") == "task-next"
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+
+from celery import states
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asgi  # noqa: E402
+import task_events  # noqa: E402
+from task_events import first_report  # noqa: E402
+
+
+def test_events_route_is_served_without_flask(monkeypatch):
+    snapshots = iter([
+        (states.PENDING, {"status": "pending"}, 202),
+        (states.SUCCESS, {"status": "completed", "result": {"score": 80}}, 200),
+    ])
+    monkeypatch.setattr(task_events, "get_async_redis", lambda: None)
+    monkeypatch.setattr(task_events, "TASK_EVENTS_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(asgi, "task_status_payload", lambda task_id: next(snapshots))
+
+    async def no_flask(scope, receive, send):
+        raise AssertionError("the events stream must not go through Flask")
+
+    monkeypatch.setattr(asgi, "wsgi_application", no_flask)
+    scope = {"type": "http", "method": "GET", "path": "/api/task/abc/events", "query_string": b"", "headers": []}
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(60)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.application(scope, receive, send))
+    body = b"".join(message.get("body", b"") for message in sent[1:]).decode()
+    assert sent[0]["status"] == 200
+    assert "event: status" in body
+    assert 'event: result\ndata: {"status": "completed", "result": {"score": 80}, "http_status": 200}' in body
+
+
+def test_first_report_is_true_once(monkeypatch):
+    monkeypatch.setattr(task_events, "get_redis", lambda: None)
+    assert first_report("task-1")
+    assert not first_report("task-1")
+    assert first_report("task-2")
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import triage  # noqa: E402
+from triage import TIER_LLM, TIER_REGEX, medical_term_count, triage_prompt  # noqa: E402
+
+
+@pytest.mark.parametrize("prompt", [
+    "Write a fluent treaty summary about mlflow and bpm tempo for a sickle-shaped painting",
+    "Stating the chronicle of the hospitality cardigan doctorate, in a hearty bloody livery",
+    "A surge of nursery rhymes about the medici and the paint on the bloodhound's lungeing whip",
+])
+def test_short_stems_do_not_match_inside_words(prompt):
+    assert medical_term_count(prompt) == 0
+
+
+@pytest.mark.parametrize("prompt, count", [
+    ("Outline ibuprofen dosing in a 40-year-old patient with gout.", 2),
+    ("Treat flu in children: 5 mg/kg or 10 ml?", 4),
+    ("Patients with COVID-19, chest x-ray findings and antihypertensive statins for high BP", 6),
+])
+def test_medical_terms_and_inflections_are_counted(prompt, count):
+    assert medical_term_count(prompt) == count
+
+
+def test_non_medical_prompt_skips_the_regex_shortcut(monkeypatch):
+    monkeypatch.setattr(triage, "TRIAGE_MIN_MEDICAL_TERMS", 1)
+    # Scores well on the rubric keywords, but nothing in it is medical vocabulary
+    prompt = "Give a structured step-by-step guide with a risk warning and precaution tips to list and compare treaty steps"
+    assert triage_prompt(prompt) == (TIER_LLM, None)
+    assert triage_prompt(prompt + " for a patient with asthma")[0] == TIER_REGEX
@@ -0,0 +1,198 @@
+import copy
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validators import RUBRIC_SCHEMA, compile_validator, validate_medical_prompt_result, validate_medical_prompt_results  # noqa: E402
+
+
+def hand_validator(parsed, tolerance=1):
+    # The hand-written validator the compiled one replaced, kept verbatim as the reference
+    if not isinstance(parsed, dict):
+        return False, "Result is not a valid JSON object."
+
+    if "error" in parsed:
+        allowed_errors = {
+            "Prompt is not medically relevant.",
+            "Prompt blocked due to safety concerns.",
+        }
+        if parsed.get("error") in allowed_errors:
+            return True, ""
+        return False, f"Unrecognized error message: {parsed.get('error')}"
+
+    for key in ("score", "criteria", "suggestions"):
+        if key not in parsed:
+            return False, f"Missing top-level field: '{key}'."
+
+    criteria = parsed.get("criteria")
+    if not isinstance(criteria, dict):
+        return False, "Field 'criteria' must be a dict."
+
+    expected = {
+        "safety": 30,
+        "clinical_clarity": 25,
+        "specificity": 20,
+        "instructional_style": 15,
+        "medical_terminology": 10,
+    }
+    total = 0
+    for name, max_val in expected.items():
+        if name not in criteria:
+            return False, f"Missing criterion: '{name}'."
+        val = criteria.get(name)
+        try:
+            val = int(float(val))
+        except (TypeError, ValueError):
+            return False, f"Invalid score for '{name}': {val} (must be 0–{max_val})."
+        if not (0 <= val <= max_val):
+            return False, f"Invalid score for '{name}': {val} (must be 0–{max_val})."
+        criteria[name] = val
+        total += val
+
+    score = parsed.get("score")
+    try:
+        score = int(score)
+    except (TypeError, ValueError):
+        return False, "Field 'score' must be an integer."
+    if abs(score - total) > tolerance:
+        return False, f"Reported score {score} does not match sum {total} (tolerance {tolerance})."
+
+    suggestions = parsed.get("suggestions")
+    if not isinstance(suggestions, list):
+        return False, "Field 'suggestions' must be a list."
+    if not suggestions:
+        return False, "Suggestions list cannot be empty."
+    for idx, s in enumerate(suggestions):
+        if not (isinstance(s, str) and s.strip()):
+            return False, f"Suggestion at index {idx} must be a non-empty string."
+
+    return True, ""
+
+
+def _outcome(validate, parsed, tolerance):
+    # Both the verdict and the in-place normalization of criteria must agree
+    parsed = copy.deepcopy(parsed)
+    try:
+        result = validate(parsed, tolerance)
+    except Exception as exc:  # e.g. int(float("inf")) raises OverflowError in both
+        result = type(exc)
+    return result, parsed
+
+
+def assert_matches_hand(parsed, tolerance=1):
+    assert _outcome(validate_medical_prompt_result, parsed, tolerance) == _outcome(hand_validator, parsed, tolerance), parsed
+
+
+def _valid():
+    return {
+        "score": 80,
+        "criteria": {"safety": 30, "clinical_clarity": 20, "specificity": 15, "instructional_style": 10,
+                     "medical_terminology": 5},
+        "suggestions": ["Add the patient's age."],
+    }
+
+
+@pytest.mark.parametrize("parsed", [
+    [],
+    [_valid()],
+    "[",
+    None,
+    42,
+    "",
+    {},
+    {"error": "Prompt is not medically relevant."},
+    {"error": "Prompt blocked due to safety concerns.", "score": "x"},
+    {"error": "nope"},
+    {"error": None},
+    {"error": ("Prompt is not medically relevant.",)},
+    {"error": ["Prompt is not medically relevant."]},
+    {"score": 1, "criteria": {}},
+    {"criteria": {}, "suggestions": []},
+    {"score": 1, "criteria": [], "suggestions": ["x"]},
+    _valid(),
+])
+def test_edge_structures_match_hand_validator(parsed):
+    assert_matches_hand(parsed)
+
+
+@pytest.mark.parametrize("value", [
+    True, False, 0, 30, 31, -1, 29.9, 30.5, -0.5, "25", "25.7", "1e1", " 7 ", "", "abc", None, [], {},
+    float("nan"), float("inf"), 10 ** 30, "٣",
+])
+def test_criterion_values_match_hand_validator(value):
+    parsed = _valid()
+    parsed["criteria"]["safety"] = value
+    assert_matches_hand(parsed)
+
+
+@pytest.mark.parametrize("score", [80, 79, 81, 78, 82, "80", 80.9, "80.5", None, True, [], "", float("nan")])
+@pytest.mark.parametrize("tolerance", [0, 1, 2])
+def test_score_and_tolerance_match_hand_validator(score, tolerance):
+    parsed = _valid()
+    parsed["score"] = score
+    assert_matches_hand(parsed, tolerance)
+
+
+@pytest.mark.parametrize("suggestions", [[], ["ok"], ["ok", ""], ["ok", "  "], ["ok", None], [1], "ok", None, ("ok",)])
+def test_suggestions_match_hand_validator(suggestions):
+    parsed = _valid()
+    parsed["suggestions"] = suggestions
+    assert_matches_hand(parsed)
+
+
+def _fuzz_value(rng):
+    return rng.choice([
+        rng.randint(-5, 35), rng.uniform(-5, 35), str(rng.randint(-5, 35)), f"{rng.uniform(0, 30):.2f}",
+        None, True, "x", [], float("nan"),
+    ])
+
+
+def _fuzz_result(rng):
+    parsed = _valid()
+    for name in list(parsed["criteria"]):
+        roll = rng.random()
+        if roll < 0.05:
+            del parsed["criteria"][name]
+        elif roll < 0.4:
+            parsed["criteria"][name] = _fuzz_value(rng)
+    if rng.random() < 0.3:
+        parsed["score"] = rng.choice([sum(v for v in parsed["criteria"].values() if type(v) is int), _fuzz_value(rng)])
+    if rng.random() < 0.2:
+        parsed["suggestions"] = rng.choice([[], ["a", ""], ["a", None], "a", ["a", "b"]])
+    if rng.random() < 0.05:
+        del parsed[rng.choice(RUBRIC_SCHEMA["required"])]
+    if rng.random() < 0.05:
+        parsed["error"] = rng.choice(RUBRIC_SCHEMA["allowed_errors"] + ("other",))
+    if rng.random() < 0.05:
+        parsed = [parsed]
+    return parsed
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_fuzzed_results_match_hand_validator(seed):
+    rng = random.Random(seed)
+    results = [_fuzz_result(rng) for _ in range(500)]
+    for parsed in results:
+        assert_matches_hand(parsed, rng.randint(0, 2))
+
+
+def test_batch_mode_matches_single_calls():
+    rng = random.Random(7)
+    results = [_fuzz_result(rng) for _ in range(100)]
+    results = [parsed for parsed in results if _outcome(hand_validator, parsed, 1)[0] is not OverflowError]
+    expected = [hand_validator(copy.deepcopy(parsed)) for parsed in results]
+    assert validate_medical_prompt_results(copy.deepcopy(results)) == expected
+
+
+def test_compile_validator_follows_schema():
+    schema = dict(RUBRIC_SCHEMA, criteria={"safety": 60, "clarity": 40})
+    validate = compile_validator(schema)
+    parsed = {"score": 70, "criteria": {"safety": "50.5", "clarity": 20}, "suggestions": ["x"]}
+    assert validate(parsed) == (True, "")
+    assert parsed["criteria"] == {"safety": 50, "clarity": 20}
+    assert validate({"score": 0, "criteria": {"safety": 0}, "suggestions": ["x"]}) == (False, "Missing criterion: 'clarity'.")
+    assert "'clarity'" in validate.source
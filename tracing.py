@@ -0,0 +1,214 @@
+"""
+Lightweight request tracing: Flask route → Celery task → Ollama call → parse/validate.
+
+A trace id is created (or taken from an incoming `traceparent` header) at the HTTP route,
+travels to the worker in the Celery message headers, and every stage records a span.
+Finished spans go to a local file, so no collector has to be running:
+
+    TRACING_EXPORTER=jsonl  one flat span object per line (easy to load with pandas/jq)
+    TRACING_EXPORTER=otlp   one OTLP/JSON `resourceSpans` document per line, the format the
+                            OpenTelemetry collector's file exporter and `otlpjsonfile` receiver use
+"""
+import contextlib
+import contextvars
+import json
+import os
+import secrets
+import time
+
+from log_writer import get_log_writer
+
+# ✅ Tracing settings, overridable from .env
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "off")  # "off", "jsonl" or "otlp"
+TRACING_FILE = os.getenv("TRACING_FILE", os.path.join("logs", "traces.jsonl"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "medical-prompt-assistant")
+
+TRACEPARENT_HEADER = "traceparent"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name, trace_id=None, parent_id=None, kind="internal", start_ns=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, exc):
+        self.status = "error"
+        self.attributes["error.type"] = type(exc).__name__
+        self.attributes["error.message"] = str(exc)[:500]
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self, end_ns=None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            get_exporter().export(self)
+
+
+class NullExporter:
+    def export(self, span):
+        pass
+
+
+class JsonlSpanExporter:
+    def __init__(self, path=TRACING_FILE):
+        self.path = path
+
+    def export(self, span):
+        get_log_writer(self.path).append(json.dumps({
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "kind": span.kind,
+            "service": TRACING_SERVICE_NAME,
+            "start": span.start_ns / 1e9,
+            "duration_ms": (span.end_ns - span.start_ns) / 1e6,
+            "status": span.status,
+            "attributes": span.attributes,
+        }, ensure_ascii=False, default=str))
+
+
+class OtlpFileSpanExporter(JsonlSpanExporter):
+    KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+
+    def export(self, span):
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": self.KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in span.attributes.items()],
+            "status": {"code": 2 if span.status == "error" else 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        get_log_writer(self.path).append(json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", TRACING_SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [otlp_span]}],
+        }]}, ensure_ascii=False))
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+EXPORTERS = {"off": NullExporter, "jsonl": JsonlSpanExporter, "otlp": OtlpFileSpanExporter}
+
+_exporter = None
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        if TRACING_EXPORTER not in EXPORTERS:
+            raise ValueError(f"Unknown TRACING_EXPORTER: {TRACING_EXPORTER}")
+        _exporter = EXPORTERS[TRACING_EXPORTER]()
+    return _exporter
+
+
+def set_exporter(exporter):
+    """Plug in any object with `export(span)`, e.g. an adapter to a real OpenTelemetry SDK."""
+    global _exporter
+    _exporter = exporter
+
+
+def tracing_enabled():
+    return not isinstance(get_exporter(), NullExporter)
+
+
+def parse_traceparent(value):
+    """(trace_id, parent_span_id) from a W3C traceparent header, or (None, None)."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None, None
+    return parts[1], parts[2]
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_attribute(key, value):
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute(key, value)
+
+
+def current_traceparent():
+    span = _current_span.get()
+    return span.traceparent if span is not None else None
+
+
+def begin_span(name, traceparent=None, kind="internal", start_ns=None, **attributes):
+    """
+    Start a span and make it current; returns (span, token). The parent is `traceparent`
+    when given, otherwise the current span. Pair with `finish_span` when a `with` block
+    does not fit (Flask request hooks, Celery signals).
+    """
+    if traceparent is not None:
+        trace_id, parent_id = parse_traceparent(traceparent)
+    else:
+        parent = _current_span.get()
+        trace_id, parent_id = (parent.trace_id, parent.span_id) if parent is not None else (None, None)
+    span = Span(name, trace_id, parent_id, kind, start_ns, attributes)
+    return span, _current_span.set(span)
+
+
+def finish_span(span, token, exc=None):
+    if exc is not None:
+        span.record_error(exc)
+    span.end()
+    with contextlib.suppress(ValueError):
+        _current_span.reset(token)  # a token from another context (e.g. a finished thread) cannot be reset
+
+
+@contextlib.contextmanager
+def start_span(name, kind="internal", **attributes):
+    if not tracing_enabled():
+        yield None
+        return
+    span, token = begin_span(name, kind=kind, **attributes)
+    try:
+        yield span
+    except Exception as exc:
+        span.record_error(exc)
+        raise
+    finally:
+        finish_span(span, token)
+
+
+def record_span(name, start_ns, end_ns, traceparent=None, kind="internal", **attributes):
+    """Record an already finished interval, e.g. the time a task sat in the broker."""
+    if not tracing_enabled():
+        return
+    span, token = begin_span(name, traceparent, kind, start_ns, **attributes)
+    _current_span.reset(token)
+    span.end(end_ns)
@@ -0,0 +1,101 @@
+import copy
+import os
+import re
+
+from phrase_match import HARMFUL_PROMPT, get_phrase_matcher
+from scoring import CRITERIA_KEYS, SUGGESTIONS, criteria_hits
+
+# ✅ Tiered evaluation settings, overridable from .env
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "1") != "0"
+TRIAGE_FAST_SCORE = int(os.getenv("TRIAGE_FAST_SCORE", "60"))  # regex score that is trusted without the LLM (>100 disables)
+TRIAGE_MIN_MEDICAL_TERMS = int(os.getenv("TRIAGE_MIN_MEDICAL_TERMS", "1"))  # fewer medical terms = no regex shortcut (0 disables)
+
+TIER_REJECTED = "rejected"
+TIER_REGEX = "regex"
+TIER_LLM = "llm"
+
+# Medical vocabulary that makes a prompt eligible for the regex shortcut. This is a keyword list, not
+# a classifier, so a prompt without any of it is sent to the model rather than rejected.
+# Stems match as word prefixes, so they are kept to 6+ characters that few ordinary words start with;
+# shorter or ambiguous terms ("treat" -> "treaty", "flu" -> "fluent") are whole words with their inflections
+MEDICAL_STEMS = (
+    "patient", "diagnos", "symptom", "disease", "syndrom", "disorder", "therap", "medicat", "clinic",
+    "prescri", "pharmac", "physician", "healthcare", "cardio", "infect", "vaccin", "asthma", "diabet",
+    "hypertens", "antihypertens", "hyperlipid", "cholesterol", "insulin", "metformin", "warfarin", "opioid", "antibiot",
+    "antimicrob", "cancer", "oncolog", "pulmonar", "kidney", "nephro", "hepati", "hepato", "osteopor",
+    "pregnan", "pediatr", "paediatr", "illness", "fractur", "seizur", "allerg", "ketoacid", "inhibitor",
+    "contraindicat", "depressi", "anxiety", "psychia", "psycho", "radiolog", "influenza", "bacteri",
+    "dementia", "alzheim", "arthrit", "migrain", "headache", "dermatol", "nutrition", "vitamin", "antibod",
+    "immuno", "hormon", "thyroid", "sepsis", "pneumon",
+)
+MEDICAL_WORDS = (
+    "treat", "treats", "treated", "treating", "treatment", "treatments",
+    "medic", "medics", "medical", "medically", "medicine", "medicines", "medicinal",
+    "drug", "drugs", "dose", "doses", "dosed", "dosage", "dosages", "dosing",
+    "surgery", "surgeries", "surgeon", "surgeons", "surgical", "surgically",
+    "nurse", "nurses", "nursing", "doctor", "doctors", "health", "healthy",
+    "hospital", "hospitals", "hospitalized", "hospitalised", "hospitalization", "hospitalisation",
+    "heart", "hearts", "cardiac", "blood", "bp", "pain", "pains", "painful", "cough", "coughs", "coughing",
+    "fever", "fevers", "feverish", "tumor", "tumors", "tumour", "tumours", "lung", "lungs", "renal",
+    "nephritis", "liver", "copd", "embolism", "embolisms", "embolus", "emboli", "embolic",
+    "statin", "statins", "sick", "sickness", "injury", "injuries", "injured", "wound", "wounds",
+    "stroke", "strokes", "smoking", "mental", "mentally", "depressed", "x-ray", "x-rays", "ecg", "ekg", "mri",
+    "acute", "chronic", "chronically", "covid", "virus", "viruses", "viral", "flu", "rash", "rashes",
+    "obese", "obesity", "immune", "immunity", "immunization", "immunisation",
+    "anemia", "anemic", "anaemia", "anaemic", "mg", "mcg", "ml",
+)
+
+
+def _alternation(terms):
+    return "|".join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True))
+
+
+_MEDICAL = re.compile(r"\b(?:" + _alternation(MEDICAL_STEMS) + r")|\b(?:" + _alternation(MEDICAL_WORDS) + r")\b",
+                      re.IGNORECASE)
+
+# Rubric points per criterion; the regex rubric uses the same weights as the LLM rubric
+CRITERIA_POINTS = {"safety": 30, "clinical_clarity": 25, "specificity": 20, "instructional_style": 15, "medical_term": 10}
+LLM_CRITERIA_NAMES = {"medical_term": "medical_terminology"}
+
+FULL_MARKS_SUGGESTION = "Covers every rubric area; add patient-specific details for a more tailored answer."
+
+REJECTIONS = {
+    "harmful": {"error": "non_medical_prompt", "reason": "Harmful or unsafe content detected", "tier": TIER_REJECTED},
+}
+
+
+def medical_term_count(prompt):
+    return len(_MEDICAL.findall(prompt))
+
+
+def regex_result(prompt, hits):
+    """Regex hits in the same shape as an LLM evaluation, so the front end renders it unchanged."""
+    criteria = {LLM_CRITERIA_NAMES.get(key, key): CRITERIA_POINTS[key] if key in hits else 0 for key in CRITERIA_KEYS}
+    return {
+        "score": sum(criteria.values()),
+        "criteria": criteria,
+        "suggestions": [SUGGESTIONS[key] for key in CRITERIA_KEYS if key not in hits] or [FULL_MARKS_SUGGESTION],
+        "prompt": prompt,
+        "tier": TIER_REGEX,
+    }
+
+
+def triage_prompt(prompt):
+    """
+    Cheap screens that run before the LLM. Returns (tier, result): a rejection (only on an
+    explicit harm phrase) or regex result when the prompt can be answered locally, or
+    (TIER_LLM, None) to escalate.
+    """
+    if not TRIAGE_ENABLED:
+        return TIER_LLM, None
+    # Prompts asking for harm are refused outright, whatever else they contain
+    if get_phrase_matcher().matches(prompt, HARMFUL_PROMPT):
+        return TIER_REJECTED, copy.deepcopy(REJECTIONS["harmful"])
+    # Too little recognised vocabulary to trust the regex rubric: let the model judge relevance
+    if TRIAGE_MIN_MEDICAL_TERMS and medical_term_count(prompt) < TRIAGE_MIN_MEDICAL_TERMS:
+        return TIER_LLM, None
+
+    hits = criteria_hits(prompt)
+    if sum(CRITERIA_POINTS[key] for key in hits) >= TRIAGE_FAST_SCORE:
+        return TIER_REGEX, regex_result(prompt, hits)
+    return TIER_LLM, None
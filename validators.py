@@ -1,72 +1,121 @@
-def validate_medical_prompt_result(parsed, tolerance=1):
-    """
-    Validates LLM evaluation output for correct structure, types, and scoring.
-    Returns (True, "") if valid, (False, "reason") if not.
-    Accepts structured scores OR error objects.
-    """
+# ✅ Rubric result schema; compile_validator turns it into validate_medical_prompt_result
+RUBRIC_SCHEMA = {
+    "allowed_errors": ("Prompt is not medically relevant.", "Prompt blocked due to safety concerns."),
+    "required": ("score", "criteria", "suggestions"),
+    "criteria": {  # name -> maximum points
+        "safety": 30,
+        "clinical_clarity": 25,
+        "specificity": 20,
+        "instructional_style": 15,
+        "medical_terminology": 10,
+    },
+}
 
+_HEADER = """\
+def validate(parsed, tolerance=1):
     # 1. Top-level type check
     if not isinstance(parsed, dict):
         return False, "Result is not a valid JSON object."
 
     # 2. Accept error-based rejections
     if "error" in parsed:
-        allowed_errors = {
-            "Prompt is not medically relevant.",
-            "Prompt blocked due to safety concerns.",
-        }
-        if parsed.get("error") in allowed_errors:
+        if parsed.get("error") in ALLOWED_ERRORS:
             return True, ""
         return False, f"Unrecognized error message: {parsed.get('error')}"
 
-    # 3. Must have all 3 required keys for evaluation result
-    for key in ("score", "criteria", "suggestions"):
-        if key not in parsed:
-            return False, f"Missing top-level field: '{key}'."
+    # 3. Required top-level fields
+"""
+
+_REQUIRED = """\
+    if {key!r} not in parsed:
+        return False, {message!r}
+"""
+
+_CRITERIA = """\
 
     # 4. Criteria type and structure
     criteria = parsed.get("criteria")
     if not isinstance(criteria, dict):
         return False, "Field 'criteria' must be a dict."
-
-    expected = {
-        "safety": 30,
-        "clinical_clarity": 25,
-        "specificity": 20,
-        "instructional_style": 15,
-        "medical_terminology": 10,
-    }
     total = 0
-    for name, max_val in expected.items():
-        if name not in criteria:
-            return False, f"Missing criterion: '{name}'."
-        val = criteria.get(name)
+"""
+
+# Plain ints already in range skip the int(float()) round trip, which would return them unchanged
+_CRITERION = """\
+    if {name!r} not in criteria:
+        return False, {missing!r}
+    val = criteria.get({name!r})
+    if type(val) is not int or not 0 <= val <= {max_val}:
         try:
             val = int(float(val))
         except (TypeError, ValueError):
-            return False, f"Invalid score for '{name}': {val} (must be 0–{max_val})."
-        if not (0 <= val <= max_val):
-            return False, f"Invalid score for '{name}': {val} (must be 0–{max_val})."
-        criteria[name] = val
-        total += val
+            return False, {invalid!r} + format(val) + {limits!r}
+        if not 0 <= val <= {max_val}:
+            return False, {invalid!r} + format(val) + {limits!r}
+        criteria[{name!r}] = val
+    total += val
+"""
+
+_FOOTER = """\
 
     # 5. Score validation
     score = parsed.get("score")
-    try:
-        score = int(score)
-    except (TypeError, ValueError):
-        return False, "Field 'score' must be an integer."
+    if type(score) is not int:
+        try:
+            score = int(score)
+        except (TypeError, ValueError):
+            return False, "Field 'score' must be an integer."
     if abs(score - total) > tolerance:
         return False, f"Reported score {score} does not match sum {total} (tolerance {tolerance})."
 
-    # 6. Suggestions
+    # 6. Suggestions; the index is only looked up once a bad one is found
     suggestions = parsed.get("suggestions")
     if not isinstance(suggestions, list):
         return False, "Field 'suggestions' must be a list."
     if not suggestions:
         return False, "Suggestions list cannot be empty."
+    for s in suggestions:
+        if not (isinstance(s, str) and s.strip()):
+            break
+    else:
+        return True, ""
     for idx, s in enumerate(suggestions):
         if not (isinstance(s, str) and s.strip()):
             return False, f"Suggestion at index {idx} must be a non-empty string."
-
     return True, ""
+"""
+
+
+def compile_validator(schema):
+    """
+    Generate a validator specialized to `schema`, with every criterion check unrolled and its
+    messages pre-built. The generated code is kept on the function's `source` attribute.
+    """
+    source = _HEADER
+    for key in schema["required"]:
+        source += _REQUIRED.format(key=key, message=f"Missing top-level field: '{key}'.")
+    source += _CRITERIA
+    for name, max_val in schema["criteria"].items():
+        source += _CRITERION.format(name=name, max_val=int(max_val), missing=f"Missing criterion: '{name}'.",
+                                    invalid=f"Invalid score for '{name}': ", limits=f" (must be 0–{max_val}).")
+    source += _FOOTER
+    namespace = {"ALLOWED_ERRORS": frozenset(schema["allowed_errors"])}
+    exec(compile(source, "<validate_medical_prompt_result>", "exec"), namespace)
+    validate = namespace["validate"]
+    validate.source = source
+    return validate
+
+
+validate_medical_prompt_result = compile_validator(RUBRIC_SCHEMA)
+validate_medical_prompt_result.__name__ = "validate_medical_prompt_result"
+validate_medical_prompt_result.__doc__ = """
+    Validates LLM evaluation output for correct structure, types, and scoring.
+    Returns (True, "") if valid, (False, "reason") if not.
+    Accepts structured scores OR error objects. Normalizes criterion scores to ints in place.
+    """
+
+
+def validate_medical_prompt_results(results, tolerance=1):
+    """Batch mode: one (is_valid, reason) tuple per result, in order."""
+    validate = validate_medical_prompt_result
+    return [validate(result, tolerance) for result in results]